@@ -0,0 +1,589 @@
+"""
+End-to-end alert latency benchmark for lambda_function
+
+Replays synthetic CloudWatch alarm events through lambda_handler against local
+fake Sheets/Twilio endpoints and reports time-to-first-call, handler duration
+and call throughput as JSON, so results can be diffed between releases.
+
+    python alert_benchmark.py --invocations 200 --batch-size 5 --rate 20
+    python alert_benchmark.py --http --twilio-latency 300,900 --output bench.json
+    python alert_benchmark.py --http --batch-size 20 --twilio-rate-limit 5 --call-rate 5
+    python alert_benchmark.py --twilio-latency 2000,8000 --channel-latency 100,400
+    python alert_benchmark.py --cold-start 10
+    python alert_benchmark.py --parser 5000 --parser-corpus tests/alarm_names.tsv
+    python alert_benchmark.py --sheet-memory 20000
+    python alert_benchmark.py --snapshot 20000
+"""
+import argparse
+import json
+import gc
+import logging
+import os
+import random
+import statistics
+import tempfile
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import lambda_function as lf
+
+# Dispatch configurations to compare: (name, CONTACT_SHEET_MODE, CALL_DISPATCH_MODE)
+MODES = [
+    ('serial', 'server', 'serial'),
+    ('concurrent', 'server', 'concurrent'),
+    ('full-sheet+concurrent', 'full', 'concurrent'),
+]
+
+
+class FakeContext:
+    """
+    Minimal Lambda context with a real deadline
+    """
+
+    def __init__(self, timeout_ms):
+        self.function_name = 'alert-benchmark'
+        self.aws_request_id = f'bench-{random.getrandbits(32):08x}'
+        self._deadline = time.monotonic() + timeout_ms / 1000.0
+
+    def get_remaining_time_in_millis(self):
+        return max(0, int((self._deadline - time.monotonic()) * 1000))
+
+
+class RecordingDialer:
+    """
+    Wraps the configured dialer and notes when each invocation's first call was accepted
+    Calls are attributed to invocations by phone number, see expect()
+    """
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.first_call_at = {}
+        self.calls = 0
+        self.accepted = 0
+        self.throttled = 0
+        self._owner = {}
+        self._lock = threading.Lock()
+
+    def expect(self, invocation_id, phones):
+        with self._lock:
+            for phone in phones:
+                self._owner[phone] = invocation_id
+
+    def place_call(self, to_number, message, contact_name, contact_type, timeout=lf.CALL_TIMEOUT):
+        result = self.inner.place_call(to_number, message, contact_name, contact_type, timeout=timeout)
+        accepted_at = time.perf_counter()
+        with self._lock:
+            self.calls += 1
+            if 'retry_after' in result:
+                self.throttled += 1
+            if result['success']:
+                self.accepted += 1
+                self.first_call_at.setdefault(self._owner.get(to_number), accepted_at)
+        return result
+
+
+class RecordingChannel:
+    """
+    Wraps a notification channel and notes when each invocation's first notification was sent
+    """
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.name = inner.name
+        self.timeout = inner.timeout
+        self.first_sent_at = {}
+        self._owner = {}
+        self._lock = threading.Lock()
+
+    def expect(self, invocation_id, server_names):
+        with self._lock:
+            for server_name in server_names:
+                self._owner[server_name] = invocation_id
+
+    def send(self, alert, timeout):
+        result = self.inner.send(alert, timeout)
+        sent_at = time.perf_counter()
+        if result['success']:
+            with self._lock:
+                self.first_sent_at.setdefault(self._owner.get(alert['server_name']), sent_at)
+        return result
+
+
+def make_alarm_event(server_names, state='ALARM'):
+    """
+    SNS event with one CloudWatch alarm record per server
+    """
+    records = []
+    for server_name in server_names:
+        message = {
+            'AlarmName': f'{server_name}-down',
+            'AlarmDescription': f'Benchmark alarm for {server_name}',
+            'NewStateValue': state,
+            'NewStateReason': 'Synthetic benchmark event',
+            'StateChangeTime': time.strftime('%Y-%m-%dT%H:%M:%S.000+0000', time.gmtime()),
+            'Region': 'us-east-1'
+        }
+        records.append({'EventSource': 'aws:sns', 'Sns': {'Message': json.dumps(message)}})
+    return {'Records': records}
+
+
+def percentiles(values):
+    if not values:
+        return {'p50': None, 'p95': None, 'p99': None, 'max': None}
+    ordered = sorted(values)
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))], 2)
+
+    return {'p50': pick(0.50), 'p95': pick(0.95), 'p99': pick(0.99), 'max': round(ordered[-1], 2)}
+
+
+def parse_range(value):
+    parts = [float(v) for v in value.split(',')]
+    return (parts[0], parts[-1])
+
+
+# Local fake HTTP endpoints, used with --http so the real transport is exercised
+
+def start_fake_sheets_server(rows, latency_ms, filtered=True):
+    """
+    Serve the contact rows like the Apps Script endpoint, filtered by ?server_name= unless filtered=False
+    """
+    whole_sheet = json.dumps(rows).encode('utf-8')
+
+    class SheetsHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            time.sleep(random.uniform(*latency_ms) / 1000.0)
+            query = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+            wanted = query.get('server_name', [None])[0]
+            if wanted is None or not filtered:
+                body = whole_sheet
+            else:
+                body = json.dumps([r for r in rows if lf.server_key(r['Server Name']) == lf.server_key(wanted)]).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return _serve(SheetsHandler)
+
+
+def start_fake_twilio_server(latency_ms, throttle_rate=0.0, rate_limit=None):
+    """
+    Accept Twilio call-creation POSTs, answering 429 at throttle_rate or above rate_limit calls/second
+    """
+    state = {'count': 0, 'window_start': time.monotonic(), 'window_count': 0, 'throttled': 0}
+    lock = threading.Lock()
+
+    class TwilioHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            time.sleep(random.uniform(*latency_ms) / 1000.0)
+            with lock:
+                now = time.monotonic()
+                if now - state['window_start'] >= 1.0:
+                    state['window_start'], state['window_count'] = now, 0
+                over_limit = rate_limit is not None and state['window_count'] >= rate_limit
+                throttled = over_limit or random.random() < throttle_rate
+                if throttled:
+                    state['throttled'] += 1
+                else:
+                    state['count'] += 1
+                    state['window_count'] += 1
+                    sid = f"CABENCH{state['count']:08d}"
+            if throttled:
+                body = b'{"code": 20429, "message": "Too Many Requests"}'
+                self.send_response(429)
+                self.send_header('Retry-After', '1')
+            else:
+                body = json.dumps({'sid': sid, 'status': 'queued'}).encode('utf-8')
+                self.send_response(201)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = _serve(TwilioHandler)
+    server.stats = state
+    return server
+
+
+def _serve(handler):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    server.handle_error = lambda request, client_address: None  # clients may hang up mid-response
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    server.base_url = f'http://127.0.0.1:{server.server_port}'
+    return server
+
+
+def configure(args, rows):
+    """
+    Point lambda_function at fake providers, either in-process or over local HTTP
+    """
+    lf.METRICS_ENABLED = False  # EMF lines would interleave with the JSON report on stdout
+    lf.ALERT_SUPPRESSION_BACKEND = 'none'
+    lf.CONTACT_SNAPSHOT_PATH = ''  # every mode starts from an empty contact cache
+    lf.set_suppression_store(None)
+    lf.ESCALATION_MODE = 'immediate'
+    lf.set_escalation_store(lf.SqliteEscalationStore(':memory:'))  # calls queued past the deadline
+    lf.set_call_rate_limit(args.call_rate, args.call_burst)
+
+    servers = []
+    if args.http:
+        sheets = start_fake_sheets_server(rows, parse_range(args.sheets_latency))
+        twilio = start_fake_twilio_server(parse_range(args.twilio_latency), args.twilio_throttle_rate,
+                                          args.twilio_rate_limit)
+        servers = [sheets, twilio]
+        lf.SHEETS_API_URL = sheets.base_url + '/exec'
+        lf.TWILIO_API_BASE = twilio.base_url
+        os.environ.setdefault('TWILIO_ACCOUNT_SID', 'ACbenchmark')
+        os.environ.setdefault('TWILIO_AUTH_TOKEN', 'benchmark')
+        os.environ.setdefault('TWILIO_FROM_NUMBER', '+15005550006')
+        lf.twilio_client_config.cache_clear()
+        contact_source, dialer = lf.SheetsContactSource(), lf.TwilioVoiceDialer()
+    else:
+        contact_source = lf.FakeContactSource(rows, lf.FakeLatency(parse_range(args.sheets_latency), seed=args.seed))
+        dialer = lf.FakeVoiceDialer(lf.FakeLatency(parse_range(args.twilio_latency), args.twilio_error_rate,
+                                                   args.twilio_throttle_rate, seed=args.seed))
+    return contact_source, dialer, servers
+
+
+def run_mode(args, name, sheet_mode, dispatch_mode, contact_source, dialer):
+    """
+    Replay the configured event stream through lambda_handler in one dispatch mode
+    """
+    lf.CONTACT_SHEET_MODE = sheet_mode
+    lf.CALL_DISPATCH_MODE = dispatch_mode
+    lf.clear_contact_cache()
+    lf.clear_call_ledger()
+    recorder = RecordingDialer(dialer)
+    lf.set_providers(contact_source, recorder)
+    channel = None
+    if args.channel_latency:
+        channel = RecordingChannel(lf.FakeChannel('fake', lf.FakeLatency(parse_range(args.channel_latency), seed=args.seed)))
+    lf.set_notification_channels([channel] if channel else [])
+
+    durations, first_call, first_awareness, queued = [], [], [], []
+    lock = threading.Lock()
+    phones = [(lf.clean_phone_number(row['Phone Number']), lf.clean_phone_number(row['Secondary Phone']))
+              for row in lf.generate_fake_contact_rows(args.rows)]
+
+    def invoke(invocation_id):
+        # Consecutive invocations page disjoint servers so calls can be attributed by phone number
+        indexes = [(invocation_id * args.batch_size + j) % args.rows for j in range(args.batch_size)]
+        event = make_alarm_event([f'server-{i}' for i in indexes])
+        recorder.expect(invocation_id, [phone for i in indexes for phone in phones[i]])
+        if channel:
+            channel.expect(invocation_id, [f'server-{i}' for i in indexes])
+        started = time.perf_counter()
+        response = lf.lambda_handler(event, FakeContext(args.lambda_timeout_ms))
+        finished = time.perf_counter()
+        body = json.loads(response['body'])
+        with lock:
+            durations.append((finished - started) * 1000)
+            queued.append(sum(alert.get('calls_queued', 0) for alert in body.get('alerts', [body])))
+            if invocation_id in recorder.first_call_at:
+                first_call.append((recorder.first_call_at[invocation_id] - started) * 1000)
+            # Someone knows about the outage once a call was accepted or a notification was sent
+            notified = [at for at in (recorder.first_call_at.get(invocation_id),
+                                      channel.first_sent_at.get(invocation_id) if channel else None) if at]
+            if notified:
+                first_awareness.append((min(notified) - started) * 1000)
+        return response['statusCode']
+
+    try:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            futures = []
+            for i in range(args.invocations):
+                if args.rate:
+                    # Open-loop arrivals at the requested rate
+                    delay = started + i / args.rate - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                futures.append(pool.submit(invoke, i))
+            statuses = [f.result() for f in futures]
+        elapsed = time.perf_counter() - started
+    finally:
+        lf.set_providers(None, None)
+        lf.set_notification_channels(None)
+
+    return {
+        'mode': name,
+        'contact_sheet_mode': sheet_mode,
+        'call_dispatch_mode': dispatch_mode,
+        'invocations': args.invocations,
+        'errors': sum(1 for status in statuses if status != 200),
+        'time_to_first_call_ms': percentiles(first_call),
+        'time_to_awareness_ms': percentiles(first_awareness),
+        'handler_duration_ms': percentiles(durations),
+        'calls_attempted': recorder.calls,
+        'calls_accepted': recorder.accepted,
+        'calls_throttled': recorder.throttled,
+        'calls_queued': sum(queued),
+        'calls_per_second': round(recorder.accepted / elapsed, 2) if elapsed else None,
+        'wall_time_s': round(elapsed, 3),
+        'mean_handler_ms': round(statistics.fmean(durations), 2) if durations else None
+    }
+
+
+# Runs in a fresh interpreter: time the import of lambda_function and its first invocation
+COLD_START_SCRIPT = """
+import json, logging, sys, time
+started = time.perf_counter()
+import lambda_function as lf
+imported = time.perf_counter()
+logging.getLogger().setLevel(logging.WARNING)
+lf.METRICS_ENABLED = False
+lf.ALERT_SUPPRESSION_BACKEND = 'none'
+lf.CONTACT_SNAPSHOT_PATH = ''
+lf.set_providers(lf.FakeContactSource(lf.generate_fake_contact_rows(10)), lf.FakeVoiceDialer())
+event = {'Records': [{'Sns': {'Message': json.dumps({'AlarmName': 'server-1-down'})}}]}
+invoke_started = time.perf_counter()
+lf.lambda_handler(event, None)
+invoked = time.perf_counter()
+lf.lambda_handler(event, None)
+warm = time.perf_counter()
+print(json.dumps({'import_ms': (imported - started) * 1000,
+                  'first_invocation_ms': (invoked - invoke_started) * 1000,
+                  'warm_invocation_ms': (warm - invoked) * 1000,
+                  'modules_loaded': len(sys.modules)}))
+"""
+
+
+def measure_cold_start(runs):
+    """
+    Import time and first-invocation latency over several fresh interpreters
+    """
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', COLD_START_SCRIPT], capture_output=True, text=True,
+                                check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        samples.append(json.loads(output.stdout.strip().splitlines()[-1]))
+    return {
+        'runs': runs,
+        'import_ms': percentiles([s['import_ms'] for s in samples]),
+        'first_invocation_ms': percentiles([s['first_invocation_ms'] for s in samples]),
+        'warm_invocation_ms': percentiles([s['warm_invocation_ms'] for s in samples]),
+        'modules_loaded': samples[-1]['modules_loaded'] if samples else None
+    }
+
+
+def benchmark_sheet_memory(row_count):
+    """
+    Peak Python memory and time of buffered vs streamed Sheets parsing, for a one-server
+    lookup against an unfiltered sheet and for building the whole-sheet index
+    """
+    rows = lf.generate_fake_contact_rows(row_count)
+    server = start_fake_sheets_server(rows, (0, 0), filtered=False)
+    lf.SHEETS_API_URL = server.base_url + '/exec'
+    lf.set_providers(lf.SheetsContactSource(), None)
+    target = f'server-{row_count // 2}'
+    lookups = [('one-server', lambda: lf.fetch_contacts_from_sheets(target)),
+               ('full-index', lf.fetch_contact_index)]
+
+    results = []
+    try:
+        for name, streaming, grouped in (('buffered', False, False), ('streaming', True, False),
+                                         ('streaming+grouped', True, True)):
+            lf.CONTACT_SHEET_STREAMING, lf.CONTACT_SHEET_GROUPED = streaming, grouped
+            for lookup, fetch in lookups:
+                if grouped and lookup == 'full-index':
+                    continue  # grouping only lets one-server lookups stop early
+                started = time.perf_counter()
+                fetch()
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                # Time and memory are measured in separate runs, tracing slows parsing down
+                gc.collect()
+                tracemalloc.start()
+                fetch()
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                results.append({'parser': name, 'lookup': lookup, 'ms': round(elapsed_ms, 1),
+                                'peak_kb': round(peak / 1024, 1)})
+    finally:
+        server.shutdown()
+        lf.set_providers(None, None)
+        lf.close_http_connections()
+    return {'rows': row_count, 'response_kb': round(len(json.dumps(rows)) / 1024, 1), 'results': results}
+
+
+def benchmark_contact_snapshot(row_count, lookups=2000):
+    """
+    Write, open (with integrity check) and look up an on-disk contact snapshot of row_count rows
+    """
+    index = lf.ContactIndex()
+    index.apply(lf.generate_fake_contact_rows(row_count))
+    now = time.time()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'contacts.snapshot')
+        started = time.perf_counter()
+        lf.write_contact_snapshot(((key, now, contacts) for key, contacts in index.items()), path, complete=True)
+        write_ms = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        snapshot = lf.ContactSnapshot(path)
+        open_ms = (time.perf_counter() - started) * 1000
+
+        rng = random.Random(1)
+        samples = []
+        for _ in range(lookups):
+            key = f'server-{rng.randrange(row_count)}'
+            started = time.perf_counter()
+            snapshot.get(key)
+            samples.append((time.perf_counter() - started) * 1e6)
+        return {
+            'rows': row_count,
+            'file_kb': round(os.path.getsize(path) / 1024, 1),
+            'write_ms': round(write_ms, 2),
+            'open_and_verify_ms': round(open_ms, 2),
+            'lookup_us': percentiles(samples)
+        }
+
+
+def synthetic_alarm_names(count, seed=1):
+    """
+    Alarm names in the formats seen from CloudWatch, for the parser micro-benchmark
+    """
+    rng = random.Random(seed)
+    formats = ['{s}-down', '{s} is down', 'Server: {s}', 'ALARM: {s}-alarm', '{s} Server Down',
+               'alert:{s}-alert', '{s} CPU utilization high', '{s}']
+    servers = max(1, count // 20)  # alarms repeat: a few hundred servers, many firings each
+    return [rng.choice(formats).format(s=f'server-{rng.randrange(servers)}') for _ in range(count)]
+
+
+def benchmark_alarm_parser(names, corpus=None):
+    """
+    Time the compiled alarm-name parser with and without memoization, and check a corpus
+    of 'alarm name<TAB>expected server' lines if given
+    """
+    parser = lf.alarm_name_parser
+    started = time.perf_counter()
+    for name in names:
+        parser.parse(name)
+    uncached = time.perf_counter() - started
+
+    lf.extract_server_name.cache_clear()
+    for name in names:
+        lf.extract_server_name(name)
+    started = time.perf_counter()
+    for name in names:
+        lf.extract_server_name(name)
+    cached = time.perf_counter() - started
+
+    result = {
+        'names': len(names),
+        'uncached_us_per_name': round(uncached / len(names) * 1e6, 3),
+        'cached_us_per_name': round(cached / len(names) * 1e6, 3),
+        'cache': lf.extract_server_name.cache_info()._asdict()
+    }
+    if corpus:
+        mismatches = []
+        checked = 0
+        with open(corpus) as f:
+            for line in f:
+                if not line.strip() or line.startswith('#') or '\t' not in line:
+                    continue
+                alarm_name, expected = line.rstrip('\n').split('\t')[:2]
+                checked += 1
+                actual = lf.extract_server_name(alarm_name)
+                if actual != expected:
+                    mismatches.append({'alarm_name': alarm_name, 'expected': expected, 'actual': actual})
+        result['corpus'] = {'checked': checked, 'mismatches': len(mismatches), 'examples': mismatches[:20]}
+    return result
+
+
+def write_report(report, path=None):
+    output = json.dumps(report, indent=2)
+    if path:
+        with open(path, 'w') as f:
+            f.write(output + '\n')
+    print(output)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--invocations', type=int, default=50)
+    parser.add_argument('--batch-size', type=int, default=1, help='alarm records per SNS event')
+    parser.add_argument('--rate', type=float, default=0, help='invocations per second (0 = back to back)')
+    parser.add_argument('--concurrency', type=int, default=1, help='invocations running at once')
+    parser.add_argument('--rows', type=int, default=500, help='rows in the fake contact sheet')
+    parser.add_argument('--sheets-latency', default='50,200', help='fake Sheets latency range in ms')
+    parser.add_argument('--twilio-latency', default='100,400', help='fake Twilio latency range in ms')
+    parser.add_argument('--twilio-error-rate', type=float, default=0.0)
+    parser.add_argument('--twilio-throttle-rate', type=float, default=0.0)
+    parser.add_argument('--twilio-rate-limit', type=float, help='with --http, calls per second the fake Twilio accepts')
+    parser.add_argument('--call-rate', type=float, default=0, help='client-side call rate limit (0 = unlimited)')
+    parser.add_argument('--call-burst', type=float, default=0, help='client-side call burst size')
+    parser.add_argument('--lambda-timeout-ms', type=int, default=60000)
+    parser.add_argument('--channel-latency', help='add a fake notification channel with this latency range in ms')
+    parser.add_argument('--modes', default=','.join(m[0] for m in MODES), help='comma separated modes to run')
+    parser.add_argument('--http', action='store_true', help='serve the fakes over local HTTP to include the transport')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write the JSON report to this file')
+    parser.add_argument('--cold-start', type=int, metavar='RUNS',
+                        help='only measure import time and first-invocation latency over RUNS fresh interpreters')
+    parser.add_argument('--parser', type=int, metavar='NAMES',
+                        help='only micro-benchmark the alarm-name parser over NAMES synthetic names')
+    parser.add_argument('--parser-corpus', metavar='FILE',
+                        help="with --parser, also check 'alarm name<TAB>expected server' lines from FILE")
+    parser.add_argument('--sheet-memory', type=int, metavar='ROWS',
+                        help='only compare peak memory of buffered and streamed Sheets parsing for a ROWS-row sheet')
+    parser.add_argument('--snapshot', type=int, metavar='ROWS',
+                        help='only time writing, opening and reading a ROWS-row on-disk contact snapshot')
+    args = parser.parse_args(argv)
+
+    if args.parser:
+        return write_report({'benchmark': 'alarm-name-parser',
+                             'results': benchmark_alarm_parser(synthetic_alarm_names(args.parser, args.seed),
+                                                               args.parser_corpus)}, args.output)
+    if args.snapshot:
+        return write_report({'benchmark': 'contact-snapshot', 'results': benchmark_contact_snapshot(args.snapshot)},
+                            args.output)
+    if args.sheet_memory:
+        logging.getLogger().setLevel(logging.WARNING)
+        return write_report({'benchmark': 'sheet-memory', 'results': benchmark_sheet_memory(args.sheet_memory)},
+                            args.output)
+    if args.cold_start:
+        return write_report({'benchmark': 'cold-start', 'results': measure_cold_start(args.cold_start)}, args.output)
+
+    logging.getLogger().setLevel(logging.WARNING)
+    rows = lf.generate_fake_contact_rows(args.rows)
+    contact_source, dialer, servers = configure(args, rows)
+
+    wanted = set(args.modes.split(','))
+    results = [run_mode(args, *mode, contact_source, dialer) for mode in MODES if mode[0] in wanted]
+
+    for server in servers:
+        server.shutdown()
+    lf.close_http_connections()
+
+    report = {
+        'benchmark': 'alert-latency',
+        'scenario': {key: value for key, value in vars(args).items() if key not in ('output', 'modes')},
+        'results': results
+    }
+    return write_report(report, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,296 @@
+"""
+Replay recorded alarm events through lambda_function for offline capacity tests
+
+Reads a JSONL file of recorded SNS/SQS/CloudWatch events, one event per line,
+and feeds them through the handler on their original schedule, compressed by
+--speed, with up to --concurrency invocations at once. Calls go to a dry-run
+dialer and notification channels are faked unless asked otherwise. The report
+gives throughput, per-stage latency histograms, how far invocations fell
+behind the schedule, and the memory high-water mark, as JSON.
+
+    python alert_replay.py storm.jsonl --speed 10 --concurrency 8
+    python alert_replay.py storm.jsonl --speed 0 --concurrency 32 --tracemalloc
+    python alert_replay.py storm.jsonl --contacts contacts.json --dial-latency 200,900 --output replay.json
+
+A line is anything lambda_handler accepts: an SNS or SQS delivery, a bare
+CloudWatch alarm, or either wrapped as {"time": ..., "event": {...}}. An event's
+time comes from "time", then the SNS Timestamp or SQS SentTimestamp, then the
+alarm's StateChangeTime. Lines without one run right after the previous line.
+"""
+import argparse
+import collections
+import json
+import logging
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import lambda_function as lf
+from alert_benchmark import FakeContext, parse_range, percentiles, write_report
+
+# Upper bounds (ms) of the stage latency histogram buckets
+HISTOGRAM_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000)
+
+
+def parse_time(value):
+    """
+    Epoch seconds from epoch seconds/milliseconds or an ISO 8601 string, or None
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value / 1000.0 if value > 1e11 else float(value)
+    try:
+        return parse_time(float(value))
+    except ValueError:
+        pass
+    text = str(value).replace('Z', '+00:00')
+    # CloudWatch writes offsets as +0000
+    if len(text) > 5 and text[-5] in '+-' and text[-4:].isdigit():
+        text = f'{text[:-2]}:{text[-2:]}'
+    try:
+        return datetime.fromisoformat(text).timestamp()
+    except ValueError:
+        return None
+
+
+def event_time(line):
+    """
+    When a recorded event was originally delivered, in epoch seconds, or None
+    """
+    if isinstance(line, dict) and 'time' in line:
+        return parse_time(line['time'])
+    event = lf.unwrap_event(line)
+    if not isinstance(event, dict):
+        return None
+    records = event.get('Records') or []
+    if records:
+        first = records[0]
+        if 'Sns' in first:
+            at = parse_time(first['Sns'].get('Timestamp'))
+        else:
+            at = parse_time((first.get('attributes') or {}).get('SentTimestamp'))
+        if at is not None:
+            return at
+    alarms = lf.parse_alarm_events(event)
+    return parse_time(alarms[0]['timestamp']) if alarms else None
+
+
+def load_events(path, limit=None):
+    """
+    Returns [(original_time, event, server_names)] in file order, skipping lines that are not JSON
+    """
+    events = []
+    with (sys.stdin if path == '-' else open(path)) as f:
+        for number, raw in enumerate(f, 1):
+            if not raw.strip():
+                continue
+            try:
+                line = json.loads(raw)
+            except ValueError as e:
+                logging.warning("Skipping line %s: %s", number, e)
+                continue
+            event = line['event'] if isinstance(line, dict) and 'time' in line and 'event' in line else line
+            servers = [alarm['server_name'] for alarm in lf.parse_alarm_events(event)]
+            events.append((event_time(line), event, servers))
+            if limit and len(events) >= limit:
+                break
+    return events
+
+
+def schedule(events, speed):
+    """
+    Seconds after the start at which each event is replayed
+    """
+    offsets, first, last = [], None, None
+    for at, _, _ in events:
+        if at is None:
+            at = last
+        if at is not None and first is None:
+            first = at
+        last = at
+        offsets.append(0.0 if speed <= 0 or at is None else max(0.0, (at - first) / speed))
+    return offsets
+
+
+def contact_rows_for(server_names):
+    """
+    One synthetic contact sheet row per server, with stable fake phone numbers
+    """
+    rows = []
+    for server_name in sorted(server_names):
+        n = zlib.crc32(server_name.encode('utf-8')) % 10 ** 8
+        rows.append({
+            'Server Name': server_name,
+            'Team': f'team-{n % 10}',
+            'Primary Contact': f'Primary {server_name}',
+            'Phone Number': f'98{n:08d}',
+            'Secondary Contact': f'Secondary {server_name}',
+            'Secondary Phone': f'97{n:08d}',
+            'Escalation Time (mins)': n % 15 + 1
+        })
+    return rows
+
+
+def histogram(values):
+    counts = collections.OrderedDict((f'<={bound}', 0) for bound in HISTOGRAM_BUCKETS_MS)
+    counts[f'>{HISTOGRAM_BUCKETS_MS[-1]}'] = 0
+    for value in values:
+        for bound in HISTOGRAM_BUCKETS_MS:
+            if value <= bound:
+                counts[f'<={bound}'] += 1
+                break
+        else:
+            counts[f'>{HISTOGRAM_BUCKETS_MS[-1]}'] += 1
+    return counts
+
+
+def configure(args, server_names):
+    """
+    Point lambda_function at the replay providers and keep the run from touching anything live by default
+    """
+    lf.METRICS_ENABLED = True  # stage durations come from the invocation metrics
+    lf.CONTACT_SNAPSHOT_PATH = ''  # never overwrite the real snapshot with replay contacts
+    lf.set_escalation_store(lf.SqliteEscalationStore(':memory:'))
+    lf.set_call_store(lf.SqliteCallStore(':memory:'))
+    if args.suppression == 'none':
+        lf.set_suppression_store(None)
+    else:
+        lf.set_suppression_store(lf.MemorySuppressionStore())
+        if args.speed > 0:
+            # Repeats inside the cooldown stay inside it once the timeline is compressed
+            lf.ALARM_DEDUP_WINDOW = lf.ALARM_DEDUP_WINDOW / args.speed
+
+    if args.contacts == 'sheets':
+        contact_source = lf.SheetsContactSource()
+    else:
+        if args.contacts == 'fake':
+            rows = contact_rows_for(server_names)
+        else:
+            with open(args.contacts) as f:
+                rows = json.load(f)
+        contact_source = lf.FakeContactSource(rows, lf.FakeLatency(parse_range(args.sheets_latency), seed=args.seed))
+
+    if args.dialer == 'twilio':
+        dialer = lf.TwilioVoiceDialer()
+        lf.set_notification_channels(None)
+    else:
+        dialer = lf.FakeVoiceDialer(lf.FakeLatency(parse_range(args.dial_latency), args.dial_error_rate, seed=args.seed))
+        # Same channels as configured, none of them sending anything
+        lf.set_notification_channels([lf.FakeChannel(name, lf.FakeLatency(parse_range(args.dial_latency), seed=args.seed))
+                                      for name in lf.NOTIFY_CHANNELS])
+    lf.set_providers(contact_source, dialer)
+    return dialer
+
+
+def replay(args, events, offsets):
+    lock = threading.Lock()
+    lags, totals, statuses = [], [], collections.Counter()
+    stages, counts = collections.defaultdict(list), collections.Counter()
+
+    def invoke(event, due_at):
+        started = time.perf_counter()
+        response, metrics = lf.run_invocation(event, FakeContext(args.lambda_timeout_ms), emit_metrics=False)
+        finished = time.perf_counter()
+        with lock:
+            lags.append((started - due_at) * 1000)
+            totals.append((finished - started) * 1000)
+            statuses[str(response.get('statusCode'))] += 1
+            if metrics is not None:
+                for name, ms in metrics.durations.items():
+                    stages[name].append(ms)
+                counts.update(metrics.counts)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as executor:
+        for (_, event, _), offset in zip(events, offsets):
+            due_at = started + offset
+            delay = due_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(invoke, event, due_at)
+    wall = time.perf_counter() - started
+
+    alarms = counts.get('alarms_received', 0)
+    return {
+        'wall_seconds': round(wall, 3),
+        'timeline_seconds': round(offsets[-1], 3) if offsets else 0,
+        'invocations': len(totals),
+        'status_codes': dict(statuses),
+        'throughput': {
+            'invocations_per_second': round(len(totals) / wall, 2) if wall else None,
+            'alarms_per_second': round(alarms / wall, 2) if wall else None,
+            'calls_per_second': round(counts.get('calls_initiated', 0) / wall, 2) if wall else None
+        },
+        'invocation_ms': dict(percentiles(totals), histogram=histogram(totals)),
+        'schedule_lag_ms': percentiles(lags),
+        'stage_ms': {name: dict(percentiles(values), count=len(values), histogram=histogram(values))
+                     for name, values in sorted(stages.items())},
+        'counts': dict(counts)
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('events', help="JSONL file of recorded events, '-' for stdin")
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='time compression, 1 = real time, 10 = ten times faster, 0 = as fast as possible')
+    parser.add_argument('--concurrency', type=int, default=4, help='invocations running at once')
+    parser.add_argument('--limit', type=int, help='replay only the first N events')
+    parser.add_argument('--contacts', default='fake',
+                        help="'fake' (one synthetic row per replayed server), 'sheets' (live sheet, read only) "
+                             "or a JSON file of sheet rows")
+    parser.add_argument('--sheets-latency', default='0', help='fake contact lookup latency range in ms')
+    parser.add_argument('--dialer', choices=('dry-run', 'twilio'), default='dry-run',
+                        help="'twilio' places real calls and sends real notifications")
+    parser.add_argument('--dial-latency', default='100,400', help='dry-run call and notification latency range in ms')
+    parser.add_argument('--dial-error-rate', type=float, default=0.0)
+    parser.add_argument('--suppression', choices=('memory', 'none'), default='memory',
+                        help='suppress repeated alarms as a warm container would, cooldown scaled by --speed')
+    parser.add_argument('--lambda-timeout-ms', type=int, default=60000)
+    parser.add_argument('--tracemalloc', action='store_true',
+                        help='also report the Python heap high-water mark (slows the replay down)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write the JSON report to this file')
+    args = parser.parse_args(argv)
+
+    logging.getLogger().setLevel(logging.WARNING)
+    events = load_events(args.events, args.limit)
+    if not events:
+        parser.error(f'no events in {args.events}')
+    offsets = schedule(events, args.speed)
+    dialer = configure(args, {server for _, _, servers in events for server in servers})
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    try:
+        results = replay(args, events, offsets)
+    finally:
+        lf.set_providers(None, None)
+        lf.set_notification_channels(None)
+        lf.close_http_connections()
+
+    memory = {'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1)}  # KiB on Linux
+    if args.tracemalloc:
+        memory['python_heap_peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 1024.0 / 1024.0, 2)
+        tracemalloc.stop()
+    results['memory'] = memory
+    if isinstance(dialer, lf.FakeVoiceDialer):
+        results['dry_run_calls'] = dict(collections.Counter(call['outcome'] for call in dialer.calls))
+
+    return write_report({
+        'benchmark': 'alert-replay',
+        'scenario': {key: value for key, value in vars(args).items() if key != 'output'},
+        'events': len(events),
+        'servers': len({server for _, _, servers in events for server in servers}),
+        'results': results
+    }, args.output)
+
+
+if __name__ == '__main__':
+    main()
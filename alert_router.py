@@ -0,0 +1,424 @@
+"""
+Long-running alert router for deployments without SNS and Lambda
+
+Runs the lambda_function handler inside one asyncio process that accepts
+CloudWatch-style alarm JSON over HTTP, queues it and works the queue with a
+fixed pool of workers. The contact cache, the snapshot and the HTTP connection
+pools stay warm for the life of the process, pending escalations are ticked
+on a timer instead of an EventBridge schedule, and queue depth and latency are
+served as JSON for monitoring.
+
+    python alert_router.py --port 8080 --workers 8
+    curl -X POST localhost:8080/alarms -d @alarm.json
+    curl localhost:8080/metrics
+
+POST /alarms takes one alarm, a JSON list of alarms, an SNS notification or an
+SNS/SQS style {"Records": [...]} batch. Alarms are accepted with 202, or
+refused as a whole with 503 and Retry-After when the queue has no room for
+them right now, or 413 when the batch is larger than the whole queue. POST /twilio takes the Twilio <Gather> and status callbacks that API
+Gateway delivers in the Lambda deployment, so TWILIO_ACK_URL can point at the
+router. GET /acks?team=&server=&since= reports mean time-to-acknowledge.
+
+The router listens on 127.0.0.1 unless told otherwise. Set ROUTER_TOKEN before
+exposing it, every route but /healthz and /twilio (which checks the Twilio
+signature) then requires "Authorization: Bearer <token>".
+"""
+import argparse
+import asyncio
+import collections
+import hmac
+import json
+import logging
+import os
+import signal
+import time
+import urllib.parse
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import lambda_function as lf
+
+logger = logging.getLogger('alert_router')
+
+ROUTER_HOST = os.environ.get('ROUTER_HOST', '127.0.0.1')
+ROUTER_TOKEN = os.environ.get('ROUTER_TOKEN', '')  # shared bearer token, required on every route but /healthz and /twilio
+ROUTER_PORT = int(os.environ.get('ROUTER_PORT', '8080'))
+ROUTER_WORKERS = int(os.environ.get('ROUTER_WORKERS', '8'))  # batches handled at the same time
+ROUTER_QUEUE_SIZE = int(os.environ.get('ROUTER_QUEUE_SIZE', '1000'))  # alarms waiting before new ones are refused
+ROUTER_BATCH_SIZE = int(os.environ.get('ROUTER_BATCH_SIZE', '10'))  # queued alarms handed to the handler together
+ROUTER_ALARM_TIMEOUT = float(os.environ.get('ROUTER_ALARM_TIMEOUT', '60'))  # seconds per batch, like the Lambda timeout
+ROUTER_MAX_BODY = int(os.environ.get('ROUTER_MAX_BODY', str(1024 * 1024)))  # bytes per request
+ROUTER_REFRESH_INTERVAL = float(os.environ.get('ROUTER_REFRESH_INTERVAL', str(max(1, lf.CONTACT_CACHE_TTL // 2))))
+ROUTER_TICK_INTERVAL = float(os.environ.get('ROUTER_TICK_INTERVAL', '60'))  # seconds between escalation ticks, 0 disables
+ROUTER_DRAIN_TIMEOUT = float(os.environ.get('ROUTER_DRAIN_TIMEOUT', '30'))  # seconds to finish queued alarms on shutdown
+
+HTTP_REASONS = {200: 'OK', 202: 'Accepted', 204: 'No Content', 400: 'Bad Request', 401: 'Unauthorized', 403: 'Forbidden', 404: 'Not Found', 405: 'Method Not Allowed',
+                411: 'Length Required', 413: 'Payload Too Large', 500: 'Internal Server Error',
+                503: 'Service Unavailable'}
+
+
+class RouterContext:
+    """
+    Lambda-like context whose deadline bounds one batch
+    """
+
+    def __init__(self, timeout):
+        self.function_name = 'alert-router'
+        self.aws_request_id = uuid.uuid4().hex
+        self._deadline = time.monotonic() + timeout
+
+    def get_remaining_time_in_millis(self):
+        return max(0, int((self._deadline - time.monotonic()) * 1000))
+
+
+class LatencyWindow:
+    """
+    Percentiles over the most recent samples
+    """
+
+    def __init__(self, size=2048):
+        self.samples = collections.deque(maxlen=size)
+        self.total = 0
+
+    def add(self, ms):
+        self.samples.append(ms)
+        self.total += 1
+
+    def summary(self):
+        if not self.samples:
+            return {'count': self.total}
+        ordered = sorted(self.samples)
+
+        def pct(p):
+            return round(ordered[min(len(ordered) - 1, int(p / 100.0 * len(ordered)))], 2)
+        return {'count': self.total, 'p50': pct(50), 'p90': pct(90), 'p99': pct(99), 'max': round(ordered[-1], 2)}
+
+
+def records_from_payload(payload):
+    """
+    Turn a posted alarm payload into SNS-style records for lambda_handler
+    Raises ValueError for anything that does not look like an alarm
+    """
+    if isinstance(payload, list):
+        records = []
+        for item in payload:
+            records.extend(records_from_payload(item))
+        return records
+    if not isinstance(payload, dict):
+        raise ValueError('expected a JSON object or list')
+    if isinstance(payload.get('Records'), list):
+        return payload['Records']
+    if payload.get('Type') == 'Notification' and 'Message' in payload:
+        # SNS HTTP(S) subscription delivery
+        return [{'Sns': {'Message': payload['Message']}}]
+    if 'AlarmName' in payload:
+        return [{'Sns': {'Message': json.dumps(payload)}}]
+    raise ValueError('no AlarmName, SNS Message or Records in payload')
+
+
+class AlertRouter:
+    """
+    Queue of alarm records worked by a fixed number of workers, each running the handler in a thread
+    """
+
+    def __init__(self, workers=ROUTER_WORKERS, queue_size=ROUTER_QUEUE_SIZE, batch_size=ROUTER_BATCH_SIZE,
+                 alarm_timeout=ROUTER_ALARM_TIMEOUT):
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.alarm_timeout = alarm_timeout
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        # Two spare threads so callbacks, ticks and refreshes never wait behind busy workers
+        self.executor = ThreadPoolExecutor(max_workers=self.workers + 2, thread_name_prefix='router')
+        self.started = time.time()
+        self.in_flight = 0
+        self.counters = collections.Counter()
+        self.handler_counts = collections.Counter()
+        self.latency = {name: LatencyWindow() for name in ('queue_wait', 'processing', 'end_to_end')}
+        self.stages = collections.defaultdict(LatencyWindow)
+        self._tasks = []
+        self._server = None
+        self._connections = set()
+
+    def enqueue(self, records):
+        """
+        Queue all records or none of them, returns False when the queue has no room
+        """
+        if self.queue.maxsize and self.queue.qsize() + len(records) > self.queue.maxsize:
+            self.counters['alarms_rejected'] += len(records)
+            return False
+        enqueued_at = time.perf_counter()
+        for record in records:
+            self.queue.put_nowait((enqueued_at, record))
+        self.counters['alarms_accepted'] += len(records)
+        return True
+
+    async def start(self, host=ROUTER_HOST, port=ROUTER_PORT):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, self.warm_up)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._every(ROUTER_REFRESH_INTERVAL, lf.refresh_contact_cache)))
+        if ROUTER_TICK_INTERVAL > 0:
+            self._tasks.append(asyncio.create_task(self._every(ROUTER_TICK_INTERVAL, self.escalation_tick)))
+        if not ROUTER_TOKEN and host not in ('127.0.0.1', '::1', 'localhost'):
+            logger.warning("Listening on %s without ROUTER_TOKEN, anyone who can reach it can post alarms", host)
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        logger.info("Alert router listening on %s", ', '.join(str(s.getsockname()) for s in self._server.sockets))
+        return self._server
+
+    async def stop(self, drain_timeout=ROUTER_DRAIN_TIMEOUT):
+        """
+        Stop accepting alarms, finish the queued ones and release pools
+        """
+        if self._server is not None:
+            self._server.close()
+            # Idle keep-alive connections would otherwise hold wait_closed() open
+            for writer in list(self._connections):
+                writer.close()
+            await self._server.wait_closed()
+        try:
+            await asyncio.wait_for(self.queue.join(), drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Shutting down with %s alarms still queued", self.queue.qsize())
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self.executor.shutdown(wait=True)
+        if lf.CONTACT_SNAPSHOT_PATH:
+            lf.save_contact_snapshot()
+        lf.close_http_connections()
+
+    def warm_up(self):
+        """
+        Load contacts before the first alarm arrives: the snapshot, then the whole-sheet index in full mode
+        """
+        lf.get_contact_snapshot()
+        if lf.CONTACT_SHEET_MODE == 'full':
+            lf.get_contacts_from_sheets('')
+
+    def escalation_tick(self):
+        lf.run_invocation({'action': 'escalation_tick'}, RouterContext(self.alarm_timeout), emit_metrics=False)
+
+    async def _every(self, interval, fn):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await loop.run_in_executor(self.executor, fn)
+            except Exception:
+                logger.exception("Periodic %s failed", getattr(fn, '__name__', fn))
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            self.in_flight += len(batch)
+            try:
+                self.record_batch(batch, *await loop.run_in_executor(self.executor, self.process_batch, batch))
+            except Exception:
+                self.counters['batches_failed'] += 1
+                logger.exception("Alarm batch failed")
+            finally:
+                self.in_flight -= len(batch)
+                for _ in batch:
+                    self.queue.task_done()
+
+    def process_batch(self, batch):
+        """
+        Run one handler invocation over a batch of (enqueued_at, record) in a worker thread
+        Returns (started, finished, response, metrics)
+        """
+        started = time.perf_counter()
+        event = {'Records': [record for _, record in batch]}
+        response, metrics = lf.run_invocation(event, RouterContext(self.alarm_timeout), emit_metrics=False)
+        return started, time.perf_counter(), response, metrics
+
+    def record_batch(self, batch, started, finished, response, metrics):
+        """
+        Fold a finished batch into the router metrics, on the event loop so no locking is needed
+        """
+        self.counters['batches_processed'] += 1
+        self.counters['alarms_processed'] += len(batch)
+        if response.get('statusCode') != 200:
+            self.counters['batches_failed'] += 1
+            logger.error("Alarm batch returned %s: %s", response.get('statusCode'), lf.cap(response.get('body')))
+        self.latency['processing'].add((finished - started) * 1000)
+        for enqueued_at, _ in batch:
+            self.latency['queue_wait'].add((started - enqueued_at) * 1000)
+            self.latency['end_to_end'].add((finished - enqueued_at) * 1000)
+        if metrics is not None:
+            for name, ms in metrics.durations.items():
+                self.stages[name].add(ms)
+            self.handler_counts.update(metrics.counts)
+
+    def metrics(self):
+        return {
+            'uptime_seconds': round(time.time() - self.started, 1),
+            'queue_depth': self.queue.qsize(),
+            'queue_capacity': self.queue.maxsize,
+            'in_flight': self.in_flight,
+            'workers': self.workers,
+            'counters': dict(self.counters),
+            'latency_ms': {name: window.summary() for name, window in self.latency.items()},
+            'stage_latency_ms': {name: window.summary() for name, window in sorted(self.stages.items())},
+            'handler_counts': dict(self.handler_counts),
+            'contact_cache': lf.get_contact_cache_stats()
+        }
+
+    async def route(self, method, path, body, query=None, headers=None):
+        """
+        Returns (status, headers, body bytes) for one request
+        """
+        query = query or {}
+        if ROUTER_TOKEN and path not in ('/healthz', '/twilio') and not authorized(headers or {}):
+            return json_response(401, {'error': 'Missing or invalid bearer token'})
+        if path == '/alarms':
+            if method != 'POST':
+                return json_response(405, {'error': 'POST alarms'})
+            try:
+                records = records_from_payload(json.loads(body))
+            except ValueError as e:
+                return json_response(400, {'error': str(e)})
+            if self.queue.maxsize and len(records) > self.queue.maxsize:
+                # Would never fit however long the sender waits, so no Retry-After
+                self.counters['alarms_rejected'] += len(records)
+                return json_response(413, {'error': f'{len(records)} alarms in one request, the queue holds {self.queue.maxsize}'})
+            if not self.enqueue(records):
+                status, headers, content = json_response(503, {'error': 'Queue full', 'queue_depth': self.queue.qsize()})
+                headers['Retry-After'] = '1'
+                return status, headers, content
+            return json_response(202, {'accepted': len(records), 'queue_depth': self.queue.qsize()})
+
+        if path == '/twilio':
+            if method != 'POST':
+                return json_response(405, {'error': 'POST callbacks'})
+            # Shaped like the API Gateway event so the handler can check X-Twilio-Signature
+            event = {'body': body.decode('utf-8', 'replace'), 'headers': headers or {}, 'path': path,
+                     'rawQueryString': urllib.parse.urlencode(query)}
+            response, _ = await asyncio.get_running_loop().run_in_executor(
+                self.executor, lf.run_invocation, event, RouterContext(self.alarm_timeout), False)
+            headers = {'Content-Type': (response.get('headers') or {}).get('Content-Type', 'text/plain')}
+            return response.get('statusCode', 500), headers, str(response.get('body', '')).encode('utf-8')
+
+        if path == '/metrics' and method == 'GET':
+            return json_response(200, self.metrics())
+        if path == '/acks' and method == 'GET':
+            try:
+                since = float(query['since']) if query.get('since') else None
+            except ValueError:
+                return json_response(400, {'error': 'since must be epoch seconds'})
+            report = await asyncio.get_running_loop().run_in_executor(
+                self.executor, lf.acknowledgement_report, query.get('team'), query.get('server'), since)
+            return json_response(200, {'report': report})
+        if path == '/healthz' and method == 'GET':
+            return json_response(200, {'status': 'ok', 'queue_depth': self.queue.qsize()})
+        return json_response(404, {'error': f'No route for {method} {path}'})
+
+    async def _handle_connection(self, reader, writer):
+        """
+        Minimal HTTP/1.1 with keep-alive and Content-Length bodies
+        """
+        self._connections.add(writer)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    await write_response(writer, *json_response(400, {'error': 'Malformed request line'}), keep_alive=False)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                if 'transfer-encoding' in headers:
+                    await write_response(writer, *json_response(411, {'error': 'Content-Length required'}), keep_alive=False)
+                    break
+                try:
+                    length = int(headers.get('content-length') or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    await write_response(writer, *json_response(400, {'error': 'Malformed Content-Length'}), keep_alive=False)
+                    break
+                if length > ROUTER_MAX_BODY:
+                    await write_response(writer, *json_response(413, {'error': f'Body over {ROUTER_MAX_BODY} bytes'}), keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                url = urllib.parse.urlsplit(target)
+                try:
+                    status, response_headers, content = await self.route(method.upper(), url.path, body,
+                                                                         dict(urllib.parse.parse_qsl(url.query)), headers)
+                except Exception as e:
+                    logger.exception("Error handling %s %s", method, target)
+                    status, response_headers, content = json_response(500, {'error': str(e)})
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                await write_response(writer, status, response_headers, content, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._connections.discard(writer)
+            writer.close()
+
+
+def authorized(headers):
+    """
+    Whether the request carries ROUTER_TOKEN as its bearer token
+    """
+    scheme, _, token = headers.get('authorization', '').partition(' ')
+    return scheme.lower() == 'bearer' and hmac.compare_digest(token.strip().encode('utf-8'), ROUTER_TOKEN.encode('utf-8'))
+
+
+def json_response(status, body):
+    return status, {'Content-Type': 'application/json'}, json.dumps(body).encode('utf-8')
+
+
+async def write_response(writer, status, headers, content, keep_alive=True):
+    lines = [f'HTTP/1.1 {status} {HTTP_REASONS.get(status, "Unknown")}', f'Content-Length: {len(content)}',
+             f'Connection: {"keep-alive" if keep_alive else "close"}']
+    lines.extend(f'{name}: {value}' for name, value in headers.items())
+    writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + content)
+    await writer.drain()
+
+
+async def serve(args):
+    router = AlertRouter(args.workers, args.queue_size, args.batch_size, args.alarm_timeout)
+    await router.start(args.host, args.port)
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stopping.set)
+    await stopping.wait()
+
+    logger.info("Shutting down, draining %s queued alarms", router.queue.qsize())
+    await router.stop(args.drain_timeout)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default=ROUTER_HOST)
+    parser.add_argument('--port', type=int, default=ROUTER_PORT)
+    parser.add_argument('--workers', type=int, default=ROUTER_WORKERS)
+    parser.add_argument('--queue-size', type=int, default=ROUTER_QUEUE_SIZE)
+    parser.add_argument('--batch-size', type=int, default=ROUTER_BATCH_SIZE)
+    parser.add_argument('--alarm-timeout', type=float, default=ROUTER_ALARM_TIMEOUT, help='seconds per batch')
+    parser.add_argument('--drain-timeout', type=float, default=ROUTER_DRAIN_TIMEOUT)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(threadName)s %(message)s')
+    asyncio.run(serve(args))
+
+
+if __name__ == '__main__':
+    main()
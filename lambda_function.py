@@ -1,75 +1,708 @@
 import json
 import logging
-import urllib.request
 import urllib.parse
-import urllib.error
 import base64
+import codecs
+import collections
+import functools
+import hashlib
+import heapq
+import hmac
+import http.client
+import itertools
+import mmap
 import os
+import random
+import re
+import select
+import socket
+import ssl
+import string
+import struct
+import threading
+import time
+import zlib
 from datetime import datetime, timezone
+from xml.sax.saxutils import escape as xml_escape
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# Hot-path log hygiene: lazy formatting, size caps, sampled payload dumps and PII redaction
+LOG_REDACT_PII = os.environ.get('LOG_REDACT_PII', 'true').lower() == 'true'
+LOG_FIELD_LIMIT = int(os.environ.get('LOG_FIELD_LIMIT', '1000'))  # characters per logged value
+LOG_PAYLOAD_SAMPLE_RATE = float(os.environ.get('LOG_PAYLOAD_SAMPLE_RATE', '0.05'))  # share of full payload dumps at INFO
+
+# E.164 numbers, also when written with separators: "+919812345678", "+1 (555) 123-4567".
+# Bare digit runs are left alone, they are far more often dates, epochs and durations.
+_phone_pattern = re.compile(r'\+\d[\d\s().-]{6,}\d')
+# Values of phone and contact name fields, e.g. in a raw sheet body: "Phone Number": 9812345678
+_phone_field_pattern = re.compile(r'''(?i)(\b\w*phone(?:[ _]?\w+)?["']?\s*[:=]\s*["']?)(\+?\d[\d\s().-]*\d)''')
+_name_field_pattern = re.compile(r'''(?i)(["'](?:(?:primary|secondary)[ _]contact|contact_name)["']\s*:\s*["'])([^"'\\]*)''')
+
+
+def _mask_digits(text):
+    digits = [c for c in text if c.isdigit()]
+    return '+' * text.startswith('+') + '*' * max(len(digits) - 4, 0) + ''.join(digits[-4:])
+
+
+def _mask_phone(match):
+    text = match.group(0)
+    if sum(c.isdigit() for c in text) < 8:
+        return text  # too short for a phone number
+    return _mask_digits(text)
+
+
+def redact(text):
+    """
+    Mask phone numbers and contact names in a log string, keeping the last four digits of a number
+    """
+    if not LOG_REDACT_PII:
+        return text
+    text = _phone_field_pattern.sub(lambda m: m.group(1) + _mask_digits(m.group(2)), text)
+    text = _name_field_pattern.sub(lambda m: m.group(1) + mask_name(m.group(2)), text)
+    return _phone_pattern.sub(_mask_phone, text)
+
+
+def mask_phone(phone):
+    """
+    Mask a phone number for logs, keeping the last four digits
+    """
+    if not LOG_REDACT_PII or not phone:
+        return phone
+    return _mask_digits(str(phone))
+
+
+def mask_name(name):
+    """
+    Shorten a contact name to its initial for logs
+    """
+    if not LOG_REDACT_PII or not name:
+        return name
+    name = str(name)
+    return f"{name[0]}{'*' * min(len(name) - 1, 5)}"
+
+
+def cap(text, limit=None):
+    limit = LOG_FIELD_LIMIT if limit is None else limit
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}...[{len(text) - limit} more chars]"
+
+
+class LazyPayload:
+    """
+    JSON-dumps an object only if the log record is actually emitted
+    """
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        if isinstance(self.value, (str, bytes)):
+            text = self.value if isinstance(self.value, str) else self.value.decode('utf-8', 'replace')
+        else:
+            text = json.dumps(self.value, default=str)
+        return text
+
+
+class RedactingLogFilter(logging.Filter):
+    """
+    Caps every logged value at LOG_FIELD_LIMIT characters, masks phone numbers,
+    and counts emitted log bytes into the invocation metrics
+    """
+
+    def filter(self, record):
+        message = record.msg if isinstance(record.msg, str) else str(record.msg)
+        if record.args:
+            args = record.args if isinstance(record.args, tuple) else (record.args,)
+            try:
+                message = message % tuple(arg if isinstance(arg, (int, float)) else cap(str(arg)) for arg in args)
+            except (TypeError, ValueError):
+                message = f"{message} {args}"
+        message = redact(cap(message, LOG_FIELD_LIMIT * 4))
+        record.msg, record.args = message, None
+        count_metric('log_bytes', len(message))
+        return True
+
+
+def log_payload(label, value):
+    """
+    Log a large payload: always at DEBUG, otherwise for a sample of invocations at INFO
+    """
+    if logger.isEnabledFor(logging.DEBUG) or (
+            logger.isEnabledFor(logging.INFO) and random.random() < LOG_PAYLOAD_SAMPLE_RATE):
+        logger.info("%s: %s", label, LazyPayload(value))
+
+
+logger.addFilter(RedactingLogFilter())
+
+# Per-invocation stage timings, emitted as one CloudWatch Embedded Metric Format line
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'ServerAlerts')
+
+_metrics_local = threading.local()
+
+
+class InvocationMetrics:
+    """
+    Stage durations and counters collected during one invocation
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations = {}
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    def add_duration(self, name, ms):
+        with self._lock:
+            self.durations[name] = self.durations.get(name, 0.0) + ms
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + n
+
+    def to_emf(self, context=None, status_code=None):
+        total_ms = (time.perf_counter() - self.started) * 1000
+        record = {
+            'FunctionName': getattr(context, 'function_name', 'local'),
+            'RequestId': getattr(context, 'aws_request_id', None),
+            'StatusCode': status_code,
+            'invocation_ms': round(total_ms, 2)
+        }
+        definitions = [{'Name': 'invocation_ms', 'Unit': 'Milliseconds'}]
+        for name, ms in sorted(self.durations.items()):
+            record[f'{name}_ms'] = round(ms, 2)
+            definitions.append({'Name': f'{name}_ms', 'Unit': 'Milliseconds'})
+        for name, value in sorted(self.counts.items()):
+            record[name] = value
+            definitions.append({'Name': name, 'Unit': 'Count'})
+        record['_aws'] = {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': METRICS_NAMESPACE,
+                'Dimensions': [['FunctionName']],
+                'Metrics': definitions
+            }]
+        }
+        return record
+
+
+def current_metrics():
+    return getattr(_metrics_local, 'metrics', None)
+
+
+class span:
+    """
+    Time a block into the current invocation's metrics, a no-op when metrics are off
+
+        with span('contacts'):
+            ...
+    """
+    __slots__ = ('name', 'metrics', 'start')
+
+    def __init__(self, name):
+        self.name = name
+        self.metrics = current_metrics()
+
+    def __enter__(self):
+        if self.metrics is not None:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.metrics is not None:
+            self.metrics.add_duration(self.name, (time.perf_counter() - self.start) * 1000)
+        return False
+
+
+def count_metric(name, n=1):
+    metrics = current_metrics()
+    if metrics is not None:
+        metrics.count(name, n)
+
+
+def current_deadline():
+    return getattr(_metrics_local, 'deadline', None)
+
+
+def deadline_remaining(default=None):
+    """
+    Seconds left in the current invocation's budget, or default when there is no deadline
+    """
+    deadline = current_deadline()
+    if deadline is None:
+        return default
+    return max(0.0, deadline - time.monotonic())
+
+
+def bind_metrics(fn):
+    """
+    Carry the current invocation's metrics and deadline into a worker thread
+    """
+    metrics, deadline = current_metrics(), current_deadline()
+    if metrics is None and deadline is None:
+        return fn
+
+    def bound(*args, **kwargs):
+        previous = current_metrics(), current_deadline()
+        _metrics_local.metrics, _metrics_local.deadline = metrics, deadline
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _metrics_local.metrics, _metrics_local.deadline = previous
+    return bound
+
+
 def lambda_handler(event, context):
     """
     Main Lambda handler for server down alerts
     Triggered by CloudWatch alarm via SNS
     """
+    return run_invocation(event, context)[0]
+
+
+def run_invocation(event, context, emit_metrics=True):
+    """
+    Handle one event with its own metrics and the context's deadline, returns (response, metrics)
+    Long-running callers set emit_metrics=False and aggregate the metrics themselves
+    """
+    # Every network call made during this invocation is bounded by the Lambda's remaining time
+    budget = remaining_time_seconds(context)
+    _metrics_local.deadline = None if budget is None else time.monotonic() + budget
+    metrics = InvocationMetrics() if METRICS_ENABLED else None
+    _metrics_local.metrics = metrics
+    response = None
+    try:
+        response = handle_event(event, context)
+        return response, metrics
+    finally:
+        _metrics_local.metrics = None
+        _metrics_local.deadline = None
+        if metrics is not None and emit_metrics:
+            status_code = response.get('statusCode') if isinstance(response, dict) else None
+            # EMF has to be written to stdout as a bare JSON line to be picked up by CloudWatch
+            print(json.dumps(metrics.to_emf(context, status_code)))
+
+
+def handle_event(event, context):
+    """
+    Route an incoming event: escalation tick, Twilio callback, acknowledgement report or CloudWatch alarms
+    """
     try:
-        logger.info(f"Received event: {json.dumps(event)}")
+        log_payload("Received event", event)
+        
+        # Scheduled tick that places secondary calls whose escalation time has passed
+        if event.get('action') == 'escalation_tick' or event.get('source') == 'aws.events':
+            return run_escalation_tick(context)
+        
+        # Twilio posting back the keypress from the <Gather> of a call
+        callback = parse_twilio_callback(event)
+        if callback is not None:
+            if not verify_twilio_signature(event):
+                logger.warning(f"Rejecting Twilio callback for {callback['CallSid']} with a missing or invalid signature")
+                count_metric('callbacks_rejected')
+                return {'statusCode': 403, 'body': 'Invalid signature'}
+            if is_status_callback(callback):
+                return handle_call_status(callback)
+            return handle_call_acknowledgement(callback)
+        
+        # Calls a previous invocation ran out of time for, delivered by the SQS retry queue
+        retries = parse_retry_records(event)
+        if retries is not None:
+            return run_call_retries(retries, context)
+        
+        # Mean time-to-acknowledge, optionally for one team or server
+        if event.get('action') == 'ack_report':
+            report = acknowledgement_report(event.get('team'), event.get('server'), event.get('since'))
+            return {'statusCode': 200, 'body': json.dumps({'report': report})}
         
-        # Parse the SNS message from CloudWatch alarm
-        alarm_data = parse_alarm_event(event)
-        if not alarm_data:
+        # Parse every SNS/SQS record of the delivery
+        with span('parse'):
+            alarms = parse_alarm_events(event)
+        count_metric('alarms_received', len(alarms))
+        if not alarms:
             logger.error("Could not parse alarm data from event")
             return {'statusCode': 400, 'body': 'Invalid event format'}
         
-        logger.info(f"Processing alarm for server: {alarm_data['server_name']}")
+        # Collapse duplicate alarms so each server is handled at most once, critical servers first
+        to_dispatch = sorted(deduplicate_alarms(alarms), key=lambda a: not is_critical_server(a['server_name']))
+        logger.info(f"Received {len(alarms)} alarms, dispatching {len(to_dispatch)}")
         
-        # Get contact information from Google Sheets API
-        contacts = get_contacts_from_sheets(alarm_data['server_name'])
-        if not contacts:
-            logger.warning(f"No contacts found for server: {alarm_data['server_name']}")
-            return {'statusCode': 200, 'body': 'No contacts configured'}
+        summaries = [process_alarm(alarm_data, context) for alarm_data in to_dispatch]
+        suppressed = sum(1 for summary in summaries if summary.get('suppression') == 'suppressed')
+        cleared = sum(1 for summary in summaries if summary.get('suppression') == 'cleared')
         
-        # Process server alert and make actual calls
-        alert_results = process_server_alert_with_calls(contacts, alarm_data)
+        records_received = len(unwrap_event(event).get('Records') or [event])
+        body = {
+            'message': 'Server alert processed successfully',
+            'records_received': records_received,
+            'invalid_records': records_received - len(alarms),
+            'deduplicated': len(alarms) - len(to_dispatch),
+            'suppressed': suppressed,
+            'cleared': cleared,
+            'dispatched': len(to_dispatch) - suppressed - cleared
+        }
+        if len(summaries) == 1:
+            # Single alarm: keep the flat response shape
+            body.update(summaries[0])
+        else:
+            body['alerts'] = summaries
         
-        # Log results
-        logger.info(f"Alert processing results: {alert_results}")
+        logger.info("HTTP request timings: %s", LazyPayload(get_http_timings(clear=True)))
         
-        return {
-            'statusCode': 200,
-            'body': json.dumps({
-                'message': 'Server alert processed successfully',
-                'server': alarm_data['server_name'],
-                'team': alert_results.get('team', 'Unknown'),
-                'contacts_found': len(contacts),
-                'calls_initiated': alert_results.get('calls_initiated', 0),
-                'escalation_time': alert_results.get('escalation_time', 5),
-                'timestamp': alarm_data['timestamp']
-            })
-        }
+        return {'statusCode': 200, 'body': json.dumps(body)}
         
     except Exception as e:
         logger.error(f"Error in lambda_handler: {str(e)}")
         return {'statusCode': 500, 'body': f'Error: {str(e)}'}
 
-def parse_alarm_event(event):
+
+def process_alarm(alarm_data, context=None):
     """
-    Parse CloudWatch alarm data from SNS event
+    Look up contacts for one alarm and page them, returning a summary for the response
     """
+    alarm_data = resolve_server_name(alarm_data)
+    logger.info(f"Processing alarm for server: {alarm_data['server_name']}")
+    
+    # Don't page again for a flapping alarm, and close the incident on OK
+    paged_at = time.time()
+    with span('suppression'):
+        suppression = check_alert_suppression(alarm_data, paged_at)
+    if suppression != 'page':
+        count_metric(f'alarms_{suppression}')
+        return {
+            'server': alarm_data['server_name'],
+            'message': 'Incident cleared' if suppression == 'cleared' else 'Repeated alarm suppressed',
+            'suppression': suppression,
+            'calls_initiated': 0,
+            'timestamp': alarm_data['timestamp']
+        }
+
+    # The cooldown only holds once somebody was reached, a failed page leaves the next alarm free to try again
+    summary = None
     try:
-        # If test event uses "event" wrapper, unwrap it
-        if 'event' in event:
-            event = event['event']
+        summary = page_contacts(alarm_data, context)
+    finally:
+        if summary is None or not alert_reached_someone(summary):
+            release_alert_suppression(alarm_data, paged_at)
+    return summary
+
+
+def page_contacts(alarm_data, context=None):
+    """
+    Call and notify the contacts of one alarm's server, returning the summary for the response
+    """
+    # Get contact information from Google Sheets API
+    contacts = get_contacts_from_sheets(alarm_data['server_name'])
+    if not contacts:
+        logger.warning(f"No contacts found for server: {alarm_data['server_name']}")
+        return {
+            'server': alarm_data['server_name'],
+            'message': 'No contacts configured',
+            'contacts_found': 0,
+            'calls_initiated': 0,
+            'timestamp': alarm_data['timestamp']
+        }
+    
+    # Texts, chat and email go out while the phones are still ringing
+    pending_notifications = start_notifications(contacts, alarm_data)
+    
+    # Process server alert and make actual calls
+    alert_results = process_server_alert_with_calls(contacts, alarm_data, context)
+    
+    # Log results
+    logger.info("Alert processing results: %s of %s calls initiated for %s",
+                alert_results['calls_initiated'], len(alert_results['call_results']), alarm_data['server_name'])
+    
+    summary = {
+        'server': alarm_data['server_name'],
+        'team': alert_results.get('team', 'Unknown'),
+        'contacts_found': len(contacts),
+        'calls_initiated': alert_results.get('calls_initiated', 0),
+        'calls_deduplicated': alert_results.get('calls_deduplicated', 0),
+        'calls_queued': alert_results.get('calls_queued', 0),
+        'escalation_time': alert_results.get('escalation_time', 5),
+        'escalations_scheduled': alert_results.get('escalations_scheduled', 0),
+        'timestamp': alarm_data['timestamp'],
+        'contact_cache': get_contact_cache_stats(alarm_data['server_name'])
+    }
+    if pending_notifications:
+        summary['channels'] = collect_notifications(pending_notifications)
+    return summary
+
+
+def alert_reached_someone(summary):
+    """
+    Whether a page got through: a call was placed (now, earlier for the same alert, or queued
+    for a durable retry) or a notification channel delivered
+    """
+    if summary.get('calls_initiated') or summary.get('calls_deduplicated') or summary.get('calls_queued'):
+        return True
+    return any(result.get('success') for result in (summary.get('channels') or {}).values())
+
+
+def resolve_server_name(alarm_data):
+    """
+    Settle a multi-word server name against the contact sheet
+    "db primary" stays whole when the sheet has it, otherwise the first word is taken,
+    as in "web-01 CPU utilization high". Returns alarm_data, or a copy with the new name
+    """
+    server_name = alarm_data['server_name']
+    if len(server_name.split()) < 2 or get_contacts_from_sheets(server_name):
+        return alarm_data
+    guess = alarm_name_parser.first_word(server_name)
+    logger.info("No contacts for '%s', using its first word '%s' as the server name", server_name, guess)
+    count_metric('alarm_names_guessed')
+    return dict(alarm_data, server_name=guess)
+
+
+def deduplicate_alarms(alarms):
+    """
+    Drop repeats of the state an incident is already in, keeping the batch order so
+    OK -> ALARM is handled the same as when the two arrive in separate invocations
+    """
+    last_state = {}
+    kept = []
+    for alarm_data in alarms:
+        key = incident_key(alarm_data)
+        if last_state.get(key) != alarm_data['new_state']:
+            last_state[key] = alarm_data['new_state']
+            kept.append(alarm_data)
+    return kept
 
-        if 'Records' in event and len(event['Records']) > 0:
-            sns_message = json.loads(event['Records'][0]['Sns']['Message'])
+
+# A server (or with ALARM_DEDUP_SCOPE=alarm, one alarm of a server) paged less than this many
+# seconds ago is not paged again, even if the alarm went OK in between
+ALARM_DEDUP_WINDOW = int(os.environ.get('ALARM_DEDUP_WINDOW', '300'))
+ALARM_DEDUP_SCOPE = os.environ.get('ALARM_DEDUP_SCOPE', 'server').lower()
+# 'memory' (per warm container), 'sqlite', 'dynamodb' or 'none'
+ALERT_SUPPRESSION_BACKEND = os.environ.get('ALERT_SUPPRESSION_BACKEND', 'memory').lower()
+ALERT_SUPPRESSION_DB_PATH = os.environ.get('ALERT_SUPPRESSION_DB_PATH', '/tmp/alert_suppression.db')
+ALERT_SUPPRESSION_TABLE = os.environ.get('ALERT_SUPPRESSION_TABLE', 'server-alert-incidents')
+
+
+class MemorySuppressionStore:
+    """
+    Open incidents kept in a dict, shared by invocations of the same warm container
+    """
+
+    def __init__(self):
+        self._incidents = {}  # key -> last_paged_at
+        self._lock = threading.Lock()
+
+    def try_open(self, key, now, cooldown):
+        """
+        Record a page for key unless one was recorded less than cooldown seconds ago
+        Returns True if the caller should page
+        """
+        with self._lock:
+            last_paged_at = self._incidents.get(key)
+            if last_paged_at is not None and now - last_paged_at < cooldown:
+                return False
+            self._incidents[key] = now
+            return True
+
+    def release(self, key, paged_at):
+        """
+        Take back the page recorded at paged_at because nobody was reached, so the next alarm pages
+        A later page recorded by someone else is left alone
+        """
+        with self._lock:
+            if self._incidents.get(key) == paged_at:
+                del self._incidents[key]
+
+
+class SqliteSuppressionStore:
+    """
+    Open incidents kept in SQLite, for local runs and tests
+    """
+
+    def __init__(self, path=ALERT_SUPPRESSION_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        import sqlite3  # only needed for the SQLite backend, kept off the cold-start path
+        self._conn = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS incidents (incident_key TEXT PRIMARY KEY, last_paged_at REAL NOT NULL)")
+
+    def try_open(self, key, now, cooldown):
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO incidents (incident_key, last_paged_at) VALUES (?, ?)"
+                " ON CONFLICT (incident_key) DO UPDATE SET last_paged_at = excluded.last_paged_at"
+                " WHERE incidents.last_paged_at <= ?",
+                (key, now, now - cooldown))
+            return cursor.rowcount > 0
+
+    def release(self, key, paged_at):
+        with self._lock:
+            self._conn.execute("DELETE FROM incidents WHERE incident_key = ? AND last_paged_at = ?", (key, paged_at))
+
+
+class DynamoDBSuppressionStore:
+    """
+    Open incidents kept in a DynamoDB table with a string partition key 'incident_key'
+    Conditional writes keep concurrent Lambda invocations from paging twice
+    """
+
+    def __init__(self, table_name=ALERT_SUPPRESSION_TABLE, client=None):
+        if client is None:
+            import boto3  # available in the Lambda runtime, only needed for this backend
+            client = boto3.client('dynamodb')
+        self.table_name = table_name
+        self._client = client
+
+    def try_open(self, key, now, cooldown):
+        try:
+            self._client.put_item(
+                TableName=self.table_name,
+                Item={
+                    'incident_key': {'S': key},
+                    'last_paged_at': {'N': str(now)},
+                    'expires_at': {'N': str(int(now + max(cooldown, 86400)))}  # for DynamoDB TTL
+                },
+                ConditionExpression='attribute_not_exists(incident_key) OR last_paged_at <= :cutoff',
+                ExpressionAttributeValues={':cutoff': {'N': str(now - cooldown)}}
+            )
+            return True
+        except self._client.exceptions.ConditionalCheckFailedException:
+            return False
+
+    def release(self, key, paged_at):
+        try:
+            self._client.delete_item(
+                TableName=self.table_name,
+                Key={'incident_key': {'S': key}},
+                ConditionExpression='last_paged_at = :paged_at',
+                ExpressionAttributeValues={':paged_at': {'N': str(paged_at)}}
+            )
+        except self._client.exceptions.ConditionalCheckFailedException:
+            pass
+
+
+_suppression_store = None
+
+
+def get_suppression_store():
+    global _suppression_store
+    if _suppression_store is None and ALERT_SUPPRESSION_BACKEND != 'none':
+        if ALERT_SUPPRESSION_BACKEND == 'sqlite':
+            _suppression_store = SqliteSuppressionStore()
+        elif ALERT_SUPPRESSION_BACKEND == 'dynamodb':
+            _suppression_store = DynamoDBSuppressionStore()
         else:
-            sns_message = event
+            _suppression_store = MemorySuppressionStore()
+    return _suppression_store
+
+
+def set_suppression_store(store):
+    """
+    Plug in a different suppression backend (or None to go back to ALERT_SUPPRESSION_BACKEND)
+    """
+    global _suppression_store
+    _suppression_store = store
+
+
+def incident_key(alarm_data):
+    """
+    What one page covers: the whole server by default, or each of its alarms with ALARM_DEDUP_SCOPE=alarm
+    """
+    if ALARM_DEDUP_SCOPE == 'alarm':
+        return f"{server_key(alarm_data['server_name'])}|{alarm_data['alarm_name']}"
+    return server_key(alarm_data['server_name'])
+
+
+def check_alert_suppression(alarm_data, now=None):
+    """
+    Decide whether an alarm should page: 'page', 'suppressed' (paged inside the cooldown,
+    including an ALARM -> OK -> ALARM flap) or 'cleared' (an OK transition, which pages nobody)
+    A 'page' is recorded at now, see release_alert_suppression when nobody could be reached
+    """
+    if alarm_data['new_state'] == 'OK':
+        # The cooldown outlives the OK, so a flapping alarm does not page again
+        logger.info(f"Alarm '{alarm_data['alarm_name']}' is OK, incident resolved")
+        return 'cleared'
+
+    store = get_suppression_store()
+    if store is None:
+        return 'page'
+    key = incident_key(alarm_data)
+    now = time.time() if now is None else now
+
+    if store.try_open(key, now, ALARM_DEDUP_WINDOW):
+        return 'page'
+    logger.info(f"Suppressing repeated alarm '{alarm_data['alarm_name']}' for server '{alarm_data['server_name']}'")
+    return 'suppressed'
+
+
+def release_alert_suppression(alarm_data, paged_at):
+    """
+    Undo the page check_alert_suppression recorded at paged_at, so the next alarm is not suppressed
+    """
+    store = get_suppression_store()
+    if store is not None:
+        store.release(incident_key(alarm_data), paged_at)
+        logger.warning(f"Nobody was paged for server '{alarm_data['server_name']}', the next alarm will page again")
+
+
+def unwrap_event(event):
+    """
+    If test event uses "event" wrapper, unwrap it
+    """
+    if isinstance(event, dict) and 'event' in event:
+        return event['event']
+    return event
+
+
+def parse_alarm_events(event):
+    """
+    Parse CloudWatch alarm data from every record of an SNS or SQS event
+    """
+    event = unwrap_event(event)
+    if not isinstance(event, dict):
+        logger.error(f"Unexpected event type: {type(event)}")
+        return []
+
+    if not event.get('Records'):
+        alarm_data = parse_alarm_message(event)
+        return [alarm_data] if alarm_data else []
+
+    alarms = []
+    for i, record in enumerate(event['Records']):
+        try:
+            if 'Sns' in record:
+                sns_message = json.loads(record['Sns']['Message'])
+            else:
+                # SQS record, either raw alarm JSON or an SNS envelope
+                sns_message = json.loads(record['body'])
+                if 'Message' in sns_message and 'AlarmName' not in sns_message:
+                    sns_message = json.loads(sns_message['Message'])
+        except Exception as e:
+            logger.error(f"Error parsing record {i} of alarm event: {str(e)}")
+            continue
+        alarm_data = parse_alarm_message(sns_message)
+        if alarm_data:
+            alarms.append(alarm_data)
+    return alarms
+
+
+def parse_alarm_event(event):
+    """
+    Parse CloudWatch alarm data from SNS event
+    Only the first record is returned, use parse_alarm_events for batches
+    """
+    alarms = parse_alarm_events(event)
+    return alarms[0] if alarms else None
 
+
+def parse_alarm_message(sns_message):
+    """
+    Build alarm data from a decoded CloudWatch alarm message
+    """
+    try:
         # Extract server name
         server_name = extract_server_name(sns_message.get('AlarmName', ''))
 
@@ -92,213 +725,1474 @@ def parse_alarm_event(event):
         return None
 
 
-def extract_server_name(alarm_name):
+def server_key(server_name):
     """
-    Extracts the server name from CloudWatch alarm names.
-    Handles flexible formats like:
-        - "sns-test Server Down"
-        - "SERVER is down"
+    Normalize a server name for case-insensitive lookups
     """
-    if not alarm_name or not isinstance(alarm_name, str):
-        return "unknown-server"
+    return str(server_name or '').strip().casefold()
 
-    name = alarm_name.strip()
 
-    # Convert to lowercase for consistent matching
-    lower_name = name.lower()
+# Alarm-name parsing rules, as JSON in ALARM_NAME_RULES or a JSON file at ALARM_NAME_RULES_FILE:
+#   {"prefixes": ["server:"], "suffixes": [" is down"], "aliases": {"db primary": "db-primary-01"},
+#    "teams": [{"team": "dba", "pattern": "^rds-(?P<server>[a-z0-9-]+)-cpu"}], "first_word_fallback": false}
+# A multi-word name is kept whole and checked against the contact sheet, its first word is only
+# used when the sheet has no such server (see resolve_server_name). first_word_fallback=true
+# takes the first word right away, without looking at the sheet.
+DEFAULT_ALARM_NAME_RULES = {
+    'prefixes': ["server:", "alarm:", "alert:"],
+    'suffixes': [" is down", " server down", "-down", "-alarm", "-alert"],
+    'aliases': {},
+    'teams': [],
+    'first_word_fallback': False
+}
 
-    # Remove common prefixes
-    prefixes_to_remove = ["server:", "alarm:", "alert:"]
-    for prefix in prefixes_to_remove:
-        if lower_name.startswith(prefix):
-            name = name[len(prefix):].strip()
-            lower_name = name.lower()
-            break
 
-    # Remove common suffixes or extra words
-    suffixes_to_remove = [" is down", " server down", "-down", "-alarm", "-alert"]
-    for suffix in suffixes_to_remove:
-        if lower_name.endswith(suffix):
-            name = name[: -len(suffix)].strip()
-            lower_name = name.lower()
-            break
+class AlarmNameParser:
+    """
+    Alarm-name rules compiled into a single regex
+    Team patterns are tried first in order, then the generic prefix/suffix stripping.
+    Aliases map the extracted name (case-insensitive) to a canonical server ID.
+    """
 
-    # In case there's extra words like "is down" in the middle, take first word if needed
-    # Optional: split by spaces and take first token (only if name looks long)
-    if len(name.split()) > 1:
-        # Take the first word that likely represents server name
-        name = name.split()[0].strip()
+    def __init__(self, rules=None):
+        rules = dict(DEFAULT_ALARM_NAME_RULES, **(rules or {}))
+        self.rules = rules
+        self.aliases = {server_key(name): canonical for name, canonical in rules['aliases'].items()}
+        self.first_word_fallback = rules['first_word_fallback']
 
-    # Fallback
-    if len(name) < 2:
-        return "unknown-server"
+        alternatives = []
+        self._groups = []
+        for i, team_rule in enumerate(rules['teams']):
+            if '(?P<server>' not in team_rule['pattern']:
+                raise ValueError(f"Alarm name pattern for team {team_rule.get('team')} has no (?P<server>...) group")
+            alternatives.append(f"(?:{team_rule['pattern'].replace('(?P<server>', f'(?P<team{i}>')})")
+            self._groups.append((f'team{i}', team_rule.get('team')))
 
-    return name
+        prefixes = '|'.join(re.escape(p) for p in sorted(rules['prefixes'], key=len, reverse=True))
+        suffixes = '|'.join(re.escape(s) for s in sorted(rules['suffixes'], key=len, reverse=True))
+        generic = r'(?P<generic>.*?)'
+        if prefixes:
+            generic = rf'(?:{prefixes})?\s*' + generic
+        if suffixes:
+            generic += rf'\s*(?:{suffixes})?'
+        alternatives.append(generic + r'\s*$')
+        self._groups.append(('generic', None))
+        self.pattern = re.compile('|'.join(alternatives), re.IGNORECASE | re.DOTALL)
 
-def get_contacts_from_sheets(server_name):
-    """
-    Fetch contact information from Google Sheets via Apps Script Web API
-    """
-    try:
-        # Google Apps Script Web App URL
-        api_url = "https://script.google.com/macros/s/AKfycbzEmmqeoUyRjNGQYferubel0azlRBJIA2fsWijhbqC-WMpz-Llwoxxh75lKGHOZUFcJ/exec"
-        
-        # Build full URL with query parameters
-        params = urllib.parse.urlencode({'server_name': server_name})
-        full_url = f"{api_url}?{params}"
-        
-        logger.info(f"Fetching contacts from Google Sheets API: {full_url}")
-        
-        # Make the HTTP request with timeout
-        req = urllib.request.Request(full_url)
-        req.add_header('User-Agent', 'AWS Lambda Server Monitor')
-        
-        try:
-            with urllib.request.urlopen(req, timeout=10) as response:
-                if response.status != 200:
-                    logger.error(f"HTTP {response.status} error: {response.reason}")
-                    return []
-                data = response.read().decode('utf-8')
-        except urllib.error.URLError as e:
-            logger.error(f"Network error while connecting to Google Sheets API: {str(e)}")
-            return []
-        except urllib.error.HTTPError as e:
-            logger.error(f"HTTP error while connecting to Google Sheets API: {e.code} {e.reason}")
-            return []
+    def parse(self, alarm_name):
+        """
+        Returns (server_name, team) where team is set if a team-specific rule matched
+        """
+        if not alarm_name or not isinstance(alarm_name, str):
+            return "unknown-server", None
 
-        # Log raw response for debugging
-        logger.info(f"Raw response data: {data}")
+        match = self.pattern.match(alarm_name.strip())
+        name, team = '', None
+        for group, group_team in self._groups:
+            value = match.group(group)
+            if value is not None:
+                name, team = value.strip(), group_team
+                break
 
-        # Parse JSON response - handle edge cases
-        try:
-            parsed_response = json.loads(data)
-            logger.info(f"Parsed response type: {type(parsed_response)}, value: {parsed_response}")
+        canonical = self.aliases.get(server_key(name))
+        if canonical:
+            return canonical, team
 
-            # Handle different response types from Google Apps Script
-            if isinstance(parsed_response, int):
-                logger.warning(f"Google Sheets API returned integer: {parsed_response} (possibly an error code)")
-                return []
-            
-            elif isinstance(parsed_response, str):
-                logger.warning(f"Google Sheets API returned string: {parsed_response}")
-                return []
-            
-            elif isinstance(parsed_response, dict):
-                # Single record returned
-                if 'error' in parsed_response:
-                    logger.error(f"Google Sheets API returned error: {parsed_response['error']}")
-                    return []
-                records = [parsed_response]
-                
-            elif isinstance(parsed_response, list):
-                # Multiple records returned
-                records = parsed_response
-                
-            else:
-                logger.error(f"Unexpected response type from API: {type(parsed_response)} - value: {parsed_response}")
-                return []
+        # In case there's extra words like "is down" in the middle, take the first word.
+        # This is a guess ("db primary" becomes "db"), so it is logged for an alias or team rule to replace.
+        if team is None and self.first_word_fallback and len(name.split()) > 1:
+            name = self.first_word(name)
+            logger.warning("Alarm name '%s' has several words, using '%s' as the server name "
+                           "(add an alias or team rule if that is wrong)", alarm_name, name)
+            count_metric('alarm_names_guessed')
 
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON decode error from Google Sheets API response: {str(e)} - Raw data: {data}")
-            return []
-        except Exception as e:
-            logger.error(f"Unexpected error parsing JSON response: {str(e)} - Raw data: {data}")
-            return []
-
-        # Validate that we have a list of dictionaries
-        if not isinstance(records, list):
-            logger.error(f"Records is not a list after processing: {type(records)}")
-            return []
-
-        # Ensure all items in the list are dictionaries
-        for i, record in enumerate(records):
-            if not isinstance(record, dict):
-                logger.warning(f"Record at index {i} is not a dict: {record} (type: {type(record)})")
-                # Remove invalid records
-                records = [r for r in records if isinstance(r, dict)]
-                break
+        # Fallback
+        if len(name) < 2:
+            return "unknown-server", team
+        return name, team
 
-        contacts = []
-        for i, record in enumerate(records):
-            if not isinstance(record, dict):
-                logger.warning(f"Skipping non-dict record at index {i}: {record} (type: {type(record)})")
-                continue
+    def first_word(self, server_name):
+        """
+        The first word of a multi-word server name, through the aliases
+        """
+        first = server_name.split()[0]
+        return self.aliases.get(server_key(first), first)
 
-            # Match server name (case-insensitive)
-            record_server_name = record.get('Server Name', '').strip()
-            if record_server_name.lower() == server_name.strip().lower():
-                escalation_time = 5
-                if record.get('Escalation Time (mins)'):
-                    try:
-                        escalation_time = max(1, int(record.get('Escalation Time (mins)')))
-                    except (ValueError, TypeError):
-                        logger.warning(f"Invalid escalation time for {server_name}, using default 5 minutes")
-                
-                contact_info = {
-                    'server_name': server_name,
-                    'team': record.get('Team', 'Unknown'),
-                    'primary_contact': record.get('Primary Contact', ''),
-                    'primary_phone': clean_phone_number(record.get('Phone Number', '')),
-                    'secondary_contact': record.get('Secondary Contact', ''),
-                    'secondary_phone': clean_phone_number(record.get('Secondary Phone', '')),
-                    'escalation_time': escalation_time
-                }
-
-                if contact_info['primary_contact'] and contact_info['primary_phone']:
-                    contacts.append(contact_info)
-                    logger.info(f"Added contact for server '{server_name}': {contact_info['primary_contact']}")
-                else:
-                    logger.warning(f"Skipping incomplete contact record for server '{server_name}': missing primary contact or phone")
+    @classmethod
+    def from_env(cls):
+        rules_json = os.environ.get('ALARM_NAME_RULES')
+        rules_file = os.environ.get('ALARM_NAME_RULES_FILE')
+        if rules_file:
+            with open(rules_file) as f:
+                return cls(json.load(f))
+        return cls(json.loads(rules_json) if rules_json else None)
 
-        logger.info(f"Found {len(contacts)} valid contact records for server: {server_name}")
-        return contacts
 
-    except Exception as e:
-        logger.error(f"Unexpected error fetching contacts from Google Sheets: {str(e)}")
-        return []
+alarm_name_parser = AlarmNameParser.from_env()
 
 
-def clean_phone_number(phone):
+def set_alarm_name_rules(rules):
     """
-    Clean and format phone number
+    Recompile the alarm-name rules and drop memoized results
     """
-    if not phone:
-        return None
-    
-    # Convert to string if it's a number
-    if isinstance(phone, (int, float)):
-        phone_str = str(int(phone))  # Convert to int first to remove decimals, then to string
-        logger.info(f"Converted numeric phone {phone} to string: {phone_str}")
-    else:
-        phone_str = str(phone).strip()
-    
-    # Remove all non-digit characters except +
-    cleaned = ''.join(char for char in phone_str if char.isdigit() or char == '+')
-    
-    if not cleaned:
-        return None
-    
-    # Add country code if missing
-    if not cleaned.startswith('+'):
-        digits = ''.join(filter(str.isdigit, cleaned))
-        if len(digits) == 10:
-            cleaned = '+91' + digits  # Assume India number based on your location
-        elif len(digits) == 11 and digits.startswith('1'):
-            cleaned = '+' + digits
-        else:
-            logger.warning(f"Unusual phone number format: {phone} -> {cleaned}")
-    
-    # Basic validation
-    digits_only = ''.join(filter(str.isdigit, cleaned))
-    if len(digits_only) < 10 or len(digits_only) > 15:
-        logger.warning(f"Invalid phone number length: {phone} -> {cleaned} (digits: {len(digits_only)})")
-        return None
-    
-    return cleaned if cleaned else None
+    global alarm_name_parser
+    alarm_name_parser = AlarmNameParser(rules)
+    extract_server_name.cache_clear()
 
-def process_server_alert_with_calls(contacts, alarm_data):
-    """
-    Process the server alert and make actual Twilio calls
+
+@functools.lru_cache(maxsize=4096)
+def extract_server_name(alarm_name):
+    """
+    Extracts the server name from CloudWatch alarm names.
+    Handles flexible formats like:
+        - "sns-test Server Down"
+        - "SERVER is down"
+    See AlarmNameParser for the configurable rules; results are memoized.
+    """
+    return alarm_name_parser.parse(alarm_name)[0]
+
+# Keep-alive HTTP(S) transport shared by the Sheets and Twilio clients
+HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', '3'))  # seconds for DNS + TCP + TLS
+HTTP_MAX_RETRIES = int(os.environ.get('HTTP_MAX_RETRIES', '2'))
+HTTP_BACKOFF_BASE = float(os.environ.get('HTTP_BACKOFF_BASE', '0.2'))  # seconds, doubled per retry with full jitter
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', '8'))  # idle connections kept per host
+HTTP_USER_AGENT = 'AWS Lambda Server Monitor'
+
+_ssl_context = None  # created on the first HTTPS connection, loading CA certificates is slow
+_connection_pool = {}  # (scheme, host, port) -> idle connections, kept across warm invocations
+_connection_pool_lock = threading.Lock()
+_http_timings = collections.deque(maxlen=200)
+
+
+class TransportError(Exception):
+    """
+    Raised when a request could not be completed after all retries
+    """
+
+
+class DeadlineExceeded(TransportError):
+    """
+    Raised when the invocation's time ran out before the request was sent
+    """
+
+
+class HttpResponse:
+    """
+    An HTTP response, fully read unless it was requested with stream=True
+    A streamed body is None and must be consumed with iter_chunks() or dropped with close()
+    """
+
+    def __init__(self, status, reason, headers, body, url, stream=None, release=None):
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+        self.url = url
+        self._stream = stream
+        self._release = release
+
+    def text(self):
+        return self.body.decode('utf-8')
+
+    def iter_chunks(self, size=65536):
+        """
+        Yield the body in chunks, the connection goes back to the pool once it is fully read
+        """
+        if self._stream is None:
+            if self.body:
+                yield self.body
+            return
+        stream, self._stream = self._stream, None
+        complete = False
+        try:
+            while True:
+                chunk = stream.read(size)
+                if not chunk:
+                    complete = True
+                    return
+                yield chunk
+        finally:
+            self._release(complete)
+
+    def close(self):
+        """
+        Drop an unread streamed body, closing its connection
+        """
+        if self._stream is not None:
+            self._stream = None
+            self._release(False)
+
+
+def http_request(method, url, body=None, headers=None, read_timeout=10, connect_timeout=None,
+                 retries=None, follow_redirects=True, stream=False):
+    """
+    Send a request over a pooled keep-alive connection, retrying failures with jittered backoff
+    GETs are retried on network errors and 502/503/504. Other methods are only retried when
+    the request was never fully written, so a call is never created twice.
+    With stream=True the body of a 200 response is left unread, see HttpResponse.iter_chunks()
+    """
+    connect_timeout = HTTP_CONNECT_TIMEOUT if connect_timeout is None else connect_timeout
+    retries = HTTP_MAX_RETRIES if retries is None else retries
+    idempotent = method in ('GET', 'HEAD')
+
+    for redirect in range(6):
+        attempt = 0
+        while True:
+            # Never wait on the network past the invocation's deadline
+            remaining = deadline_remaining()
+            if remaining is not None and remaining <= 0:
+                raise DeadlineExceeded(f"{method} {urllib.parse.urlsplit(url).netloc} not sent: deadline exceeded")
+            try:
+                response = _send_once(method, url, body, headers or {},
+                                      connect_timeout if remaining is None else min(connect_timeout, remaining),
+                                      read_timeout if remaining is None else min(read_timeout, remaining),
+                                      attempt, stream)
+            except _NotSentError as e:
+                error, retryable = e.__cause__, True
+            except (OSError, http.client.HTTPException) as e:
+                error, retryable = e, idempotent
+            else:
+                if not (idempotent and response.status in (502, 503, 504)) or attempt >= retries:
+                    break
+                error, retryable = f"HTTP {response.status}", True
+
+            if not retryable or attempt >= retries:
+                raise TransportError(f"{method} {urllib.parse.urlsplit(url).netloc} failed: {error}")
+            delay = random.uniform(0, HTTP_BACKOFF_BASE * (2 ** attempt))
+            if delay >= deadline_remaining(float('inf')):
+                raise TransportError(f"{method} {urllib.parse.urlsplit(url).netloc} failed: {error} (no time left to retry)")
+            count_metric('http_retries')
+            logger.warning(f"Retrying {method} {urllib.parse.urlsplit(url).netloc} in {delay:.2f}s after: {error}")
+            time.sleep(delay)
+            attempt += 1
+
+        location = response.headers.get('location')
+        if not (follow_redirects and idempotent and location and response.status in (301, 302, 303, 307, 308)):
+            return response
+        url = urllib.parse.urljoin(url, location)
+
+    raise TransportError(f"Too many redirects for {method} {url}")
+
+
+class _NotSentError(Exception):
+    """
+    The request failed before it could have reached the server and is safe to retry
+    """
+
+
+def _send_once(method, url, body, headers, connect_timeout, read_timeout, attempt, stream=False):
+    parts = urllib.parse.urlsplit(url)
+    scheme = parts.scheme or 'https'
+    port = parts.port or (443 if scheme == 'https' else 80)
+    pool_key = (scheme, parts.hostname, port)
+    path = parts.path or '/'
+    if parts.query:
+        path = f"{path}?{parts.query}"
+
+    timing = {'method': method, 'host': parts.hostname, 'attempt': attempt,
+              'dns_ms': 0.0, 'connect_ms': 0.0, 'tls_ms': 0.0}
+    start = time.perf_counter()
+
+    conn = _checkout_connection(pool_key)
+    timing['reused'] = conn is not None
+    if conn is None:
+        try:
+            conn = _open_connection(scheme, parts.hostname, port, connect_timeout, read_timeout, timing)
+        except OSError as e:
+            raise _NotSentError() from e
+    else:
+        conn.sock.settimeout(read_timeout)
+
+    request_headers = {'User-Agent': HTTP_USER_AGENT, 'Connection': 'keep-alive'}
+    request_headers.update(headers)
+    try:
+        sent_at = time.perf_counter()
+        conn.request(method, path, body=body, headers=request_headers)
+    except (OSError, http.client.HTTPException) as e:
+        conn.close()
+        # The request was not fully written, a server that closed the reused connection never saw it
+        if timing['reused'] and isinstance(e, (BrokenPipeError, ConnectionResetError)):
+            raise _NotSentError() from e
+        raise
+    try:
+        response = conn.getresponse()
+        timing['ttfb_ms'] = round((time.perf_counter() - sent_at) * 1000, 1)
+        data = None if stream and response.status == 200 else response.read()
+    except (OSError, http.client.HTTPException):
+        # The whole request went out, the server may have acted on it even if no response came back
+        conn.close()
+        raise
+
+    release = None
+    if data is None:
+        # The caller reads the body, the connection is only reusable once it has all been read
+        release = functools.partial(_release_streamed_connection, pool_key, conn, response)
+    elif response.will_close:
+        conn.close()
+    else:
+        _checkin_connection(pool_key, conn)
+
+    timing['status'] = response.status
+    timing['total_ms'] = round((time.perf_counter() - start) * 1000, 1)
+    _http_timings.append(timing)
+
+    response_headers = {name.lower(): value for name, value in response.getheaders()}
+    return HttpResponse(response.status, response.reason, response_headers, data, url,
+                        stream=response if data is None else None, release=release)
+
+
+def _release_streamed_connection(pool_key, conn, response, complete):
+    if complete and not response.will_close:
+        _checkin_connection(pool_key, conn)
+    else:
+        conn.close()
+
+
+def _open_connection(scheme, host, port, connect_timeout, read_timeout, timing):
+    """
+    Open a connection step by step so DNS, TCP connect and TLS handshake can be timed separately
+    """
+    t0 = time.perf_counter()
+    addresses = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    t1 = time.perf_counter()
+    timing['dns_ms'] = round((t1 - t0) * 1000, 1)
+
+    sock = None
+    last_error = None
+    for family, socktype, proto, _, address in addresses:
+        sock = socket.socket(family, socktype, proto)
+        sock.settimeout(connect_timeout)
+        try:
+            sock.connect(address)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            break
+        except OSError as e:
+            sock.close()
+            sock, last_error = None, e
+    if sock is None:
+        raise last_error or OSError(f"Could not resolve {host}")
+    t2 = time.perf_counter()
+    timing['connect_ms'] = round((t2 - t1) * 1000, 1)
+
+    if scheme == 'https':
+        sock = _get_ssl_context().wrap_socket(sock, server_hostname=host)
+        timing['tls_ms'] = round((time.perf_counter() - t2) * 1000, 1)
+        conn = http.client.HTTPSConnection(host, port, timeout=read_timeout, context=_get_ssl_context())
+    else:
+        conn = http.client.HTTPConnection(host, port, timeout=read_timeout)
+    sock.settimeout(read_timeout)
+    conn.sock = sock
+    return conn
+
+
+def _get_ssl_context():
+    global _ssl_context
+    if _ssl_context is None:
+        _ssl_context = ssl.create_default_context()
+    return _ssl_context
+
+
+def _checkout_connection(pool_key):
+    while True:
+        with _connection_pool_lock:
+            idle = _connection_pool.get(pool_key)
+            conn = idle.pop() if idle else None
+        if conn is None or not _connection_dropped(conn):
+            return conn
+        conn.close()
+
+
+def _connection_dropped(conn):
+    """
+    Whether the server closed an idle connection, so a request is never written to a dead socket
+    An idle keep-alive socket has nothing to read until the server sends its FIN
+    """
+    try:
+        readable, _, _ = select.select([conn.sock], [], [], 0)
+    except (OSError, ValueError):
+        return True
+    return bool(readable)
+
+
+def _checkin_connection(pool_key, conn):
+    with _connection_pool_lock:
+        idle = _connection_pool.setdefault(pool_key, [])
+        if len(idle) < HTTP_POOL_SIZE:
+            idle.append(conn)
+            return
+    conn.close()
+
+
+def get_http_timings(clear=False):
+    """
+    Per-request timings (DNS/connect/TLS/TTFB/total in ms) of recent requests
+    """
+    timings = list(_http_timings)
+    if clear:
+        _http_timings.clear()
+    return timings
+
+
+def close_http_connections():
+    """
+    Close all pooled connections (useful for testing)
+    """
+    with _connection_pool_lock:
+        pools = list(_connection_pool.values())
+        _connection_pool.clear()
+    for idle in pools:
+        for conn in idle:
+            conn.close()
+
+
+class SheetsFetchError(Exception):
+    """
+    Raised when the Google Sheets API could not be reached or returned an unusable response
+    """
+
+
+# Warm-container contact directory, survives between invocations of the same container
+CONTACT_CACHE_TTL = int(os.environ.get('CONTACT_CACHE_TTL', '300'))  # seconds a snapshot is fresh
+CONTACT_CACHE_MAX_STALE = int(os.environ.get('CONTACT_CACHE_MAX_STALE', '86400'))  # seconds a stale snapshot may still be served
+
+SHEETS_API_URL = os.environ.get('SHEETS_API_URL', "https://script.google.com/macros/s/AKfycbzEmmqeoUyRjNGQYferubel0azlRBJIA2fsWijhbqC-WMpz-Llwoxxh75lKGHOZUFcJ/exec")
+TWILIO_API_BASE = os.environ.get('TWILIO_API_BASE', 'https://api.twilio.com')
+
+# 'server' fetches one server's rows per lookup, 'full' downloads the whole sheet once and indexes it
+CONTACT_SHEET_MODE = os.environ.get('CONTACT_SHEET_MODE', 'server').lower()
+FULL_SHEET_CACHE_KEY = '*'
+# Parse Sheets responses as they arrive instead of holding the raw body and a decoded copy
+CONTACT_SHEET_STREAMING = os.environ.get('CONTACT_SHEET_STREAMING', 'false').lower() == 'true'
+# The sheet keeps each server's rows together, so a one-server lookup can stop after its block
+CONTACT_SHEET_GROUPED = os.environ.get('CONTACT_SHEET_GROUPED', 'false').lower() == 'true'
+
+_contact_cache = {}
+_contact_cache_lock = threading.Lock()
+_contact_cache_refreshing = set()
+_contact_cache_loaders = {}  # key -> (loader, label), for refresh_contact_cache
+_contact_cache_stats = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'refresh_errors': 0, 'fallbacks': 0, 'snapshot_hits': 0}
+
+# On-disk copy of the contact cache. /tmp outlives the runtime process, e.g. a restart after a
+# timeout or crash, and a shared mount (EFS) can carry it across containers. '' disables it.
+CONTACT_SNAPSHOT_PATH = os.environ.get('CONTACT_SNAPSHOT_PATH', '/tmp/contacts.snapshot')
+CONTACT_SNAPSHOT_MAX_AGE = int(os.environ.get('CONTACT_SNAPSHOT_MAX_AGE', str(CONTACT_CACHE_MAX_STALE)))
+
+
+def get_contacts_from_sheets(server_name):
+    """
+    Return contacts for a server from the warm-container cache.
+    Fresh snapshots are served directly, stale ones are served while a background
+    refresh runs, and the last good snapshot is used if the Sheets API fails.
+    """
+    with span('contacts'):
+        if CONTACT_SHEET_MODE == 'full':
+            index = _get_cached(FULL_SHEET_CACHE_KEY, sync_contact_index, 'contact sheet')
+            return (index or {}).get(server_key(server_name), [])
+
+        contacts = _get_cached(server_key(server_name), lambda: fetch_contacts_from_sheets(server_name), f"server '{server_name}'")
+        return contacts or []
+
+
+def _record_cache_event(counter):
+    _contact_cache_stats[counter] += 1
+    count_metric(f'contact_cache_{counter}')
+
+
+def _get_cached(key, loader, label):
+    """
+    Serve a cache entry with TTL and stale-while-revalidate semantics, loading it on a miss
+    Returns None if nothing could be loaded and nothing was cached
+    """
+    now = time.time()
+
+    with _contact_cache_lock:
+        entry = _contact_cache.get(key)
+        _contact_cache_loaders[key] = (loader, label)
+    if entry is None:
+        entry = _seed_from_snapshot(key)
+
+    if entry:
+        age = now - entry['fetched_at']
+        if age < CONTACT_CACHE_TTL:
+            _record_cache_event('hits')
+            return entry['value']
+        if age < CONTACT_CACHE_MAX_STALE:
+            _record_cache_event('stale_hits')
+            _refresh_cache_async(key, loader, label)
+            return entry['value']
+
+    _record_cache_event('misses')
+    try:
+        value = loader()
+    except SheetsFetchError as e:
+        _record_cache_event('refresh_errors')
+        if entry:
+            _record_cache_event('fallbacks')
+            logger.warning(f"Serving last good contacts for {label} after Sheets API failure: {str(e)}")
+            return entry['value']
+        logger.error(f"No cached contacts available for {label}: {str(e)}")
+        return None
+
+    _store_cache_entry(key, value)
+    return value
+
+
+def _store_cache_entry(key, value):
+    with _contact_cache_lock:
+        _contact_cache[key] = {'value': value, 'fetched_at': time.time()}
+    if CONTACT_SNAPSHOT_PATH:
+        _save_contact_snapshot_async()
+
+
+def _seed_from_snapshot(key):
+    """
+    Fill a missing cache entry from the on-disk snapshot, returns the entry or None
+    """
+    snapshot = get_contact_snapshot()
+    if snapshot is None:
+        return None
+    if key == FULL_SHEET_CACHE_KEY:
+        if not snapshot.complete:
+            return None
+        # The snapshot itself answers lookups until the first refresh builds a ContactIndex
+        entry = {'value': snapshot, 'fetched_at': snapshot.created_at}
+    else:
+        found = snapshot.lookup(key)
+        if found is None:
+            return None
+        entry = {'value': found[1], 'fetched_at': found[0]}
+    with _contact_cache_lock:
+        entry = _contact_cache.setdefault(key, entry)
+    _record_cache_event('snapshot_hits')
+    return entry
+
+
+def _refresh_cache_async(key, loader, label):
+    """
+    Refresh a stale cache entry in the background, at most one refresh per key at a time
+    """
+    with _contact_cache_lock:
+        if key in _contact_cache_refreshing:
+            return
+        _contact_cache_refreshing.add(key)
+
+    def refresh():
+        try:
+            _store_cache_entry(key, loader())
+        except SheetsFetchError as e:
+            _contact_cache_stats['refresh_errors'] += 1
+            logger.warning(f"Background contact refresh failed for {label}: {str(e)}")
+        finally:
+            with _contact_cache_lock:
+                _contact_cache_refreshing.discard(key)
+
+    threading.Thread(target=refresh, daemon=True).start()
+
+
+def refresh_contact_cache(max_age=None):
+    """
+    Refresh every cache entry older than max_age seconds in the background, loading the
+    whole-sheet index if it is missing, so a long-running process never waits on Sheets
+    Returns the number of refreshes started
+    """
+    max_age = CONTACT_CACHE_TTL / 2 if max_age is None else max_age
+    now = time.time()
+    with _contact_cache_lock:
+        loaders = dict(_contact_cache_loaders)
+        ages = {key: now - entry['fetched_at'] for key, entry in _contact_cache.items()}
+    if CONTACT_SHEET_MODE == 'full':
+        loaders.setdefault(FULL_SHEET_CACHE_KEY, (sync_contact_index, 'contact sheet'))
+
+    started = 0
+    for key, (loader, label) in loaders.items():
+        if ages.get(key, float('inf')) >= max_age:
+            _refresh_cache_async(key, loader, label)
+            started += 1
+    return started
+
+
+def get_contact_cache_stats(server_name=None):
+    """
+    Cache counters for the handler response, with the snapshot age for server_name if given
+    """
+    stats = dict(_contact_cache_stats)
+    stats['mode'] = CONTACT_SHEET_MODE
+    if server_name:
+        key = FULL_SHEET_CACHE_KEY if CONTACT_SHEET_MODE == 'full' else server_key(server_name)
+        with _contact_cache_lock:
+            entry = _contact_cache.get(key)
+        stats['age_seconds'] = round(time.time() - entry['fetched_at'], 1) if entry else None
+    return stats
+
+
+def clear_contact_cache():
+    """
+    Drop all cached contacts (useful for testing)
+    """
+    global _contact_snapshot
+    with _contact_cache_lock:
+        _contact_cache.clear()
+        _contact_cache_loaders.clear()
+        _contact_snapshot = None
+    for counter in _contact_cache_stats:
+        _contact_cache_stats[counter] = 0
+
+
+def fetch_contacts_from_sheets(server_name):
+    """
+    Fetch contact information for one server from Google Sheets
+    Raises SheetsFetchError if the API could not be reached or returned an error
+    """
+    wanted = server_key(server_name)
+    source = get_contact_source()
+    iter_records = getattr(source, 'iter_records', None) if CONTACT_SHEET_STREAMING else None
+    if iter_records is not None:
+        # Rows are filtered as they are parsed, only this server's rows are ever kept
+        with span('sheets_stream'):
+            matching = _matching_records(iter_records(server_name), wanted)
+        with span('contacts_filter'):
+            contacts = [contact for _, contact in normalize_contact_rows(matching, server_name)]
+    else:
+        records = source.fetch_records(server_name)
+        with span('contacts_filter'):
+            # Match server name (case-insensitive)
+            matching = [record for record in records if server_key(record.get('Server Name', '')) == wanted]
+            contacts = [contact for _, contact in normalize_contact_rows(matching, server_name)]
+
+    logger.info(f"Found {len(contacts)} valid contact records for server: {server_name}")
+    return contacts
+
+
+def _matching_records(records, wanted):
+    """
+    Collect the rows for one server key from a stream of rows
+    """
+    matching = []
+    try:
+        for record in records:
+            if server_key(record.get('Server Name', '')) == wanted:
+                matching.append(record)
+            elif matching and CONTACT_SHEET_GROUPED:
+                # Past this server's block, the rest of the sheet is never downloaded
+                count_metric('sheets_stream_stopped_early')
+                break
+    finally:
+        if hasattr(records, 'close'):
+            records.close()
+    return matching
+
+
+def fetch_contact_index(index=None):
+    """
+    Download the contact sheet and index it by normalized server name
+    With an existing index only the rows changed since its version are fetched and
+    patched in; sources without change tracking always return the whole sheet.
+    Every row is normalized here so that lookups are plain dict reads
+    """
+    source = get_contact_source()
+    fetch_changes = getattr(source, 'fetch_changes', None)
+    if fetch_changes is None:
+        changes = {'full': True, 'records': source.fetch_records(), 'deleted': [], 'version': None, 'etag': None}
+    else:
+        # Rows keyed by position can't be matched to the row ids of a delta, ask for the whole sheet
+        version = index.version if index is not None and not index.positional else None
+        changes = fetch_changes(version, index.etag if index is not None else None)
+
+    with span('contacts_filter'):
+        if changes['full'] or index is None:
+            index = ContactIndex()
+            row_count = index.load(changes)
+            logger.info(f"Indexed {index.contact_count()} contacts for {len(index)} servers from {row_count} sheet rows")
+            return index
+
+        # Deltas are small, and are checked in full before the live index is touched
+        records = list(changes['records'])
+        if (index.positional and records) or any('_row' not in record for record in records):
+            # Changed rows can only be patched in by row id, start over from the whole sheet
+            logger.warning("Contact sheet changes without row ids, fetching the whole sheet")
+            return fetch_contact_index()
+
+        index.apply(records, changes['deleted'], changes['version'], changes['etag'])
+    logger.info(f"Patched {len(records)} changed and {len(changes['deleted'])} deleted sheet rows into the contact index")
+    return index
+
+
+def sync_contact_index():
+    """
+    Refresh the cached whole-sheet index incrementally, or build it on the first load
+    """
+    with _contact_cache_lock:
+        entry = _contact_cache.get(FULL_SHEET_CACHE_KEY)
+    index = entry['value'] if entry else None
+    # An index served from the on-disk snapshot has no version to sync from
+    return fetch_contact_index(index if isinstance(index, ContactIndex) else None)
+
+
+class ContactIndex:
+    """
+    Contacts by normalized server name, patched row by row as the sheet changes
+    Rows are identified by their '_row' id, or their position for whole-sheet downloads.
+    Positions are kept apart from row ids, and an index holding any is never patched
+    (positional is set), it is replaced by the next whole-sheet download.
+    """
+    LOAD_CHUNK_ROWS = 2000
+
+    def __init__(self):
+        self.version = None
+        self.etag = None
+        self.positional = False  # some rows are keyed by position, deltas can't be applied
+        self._rows = {}     # row id -> server key
+        self._servers = {}  # server key -> {row id: Contact}, in sheet order
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            rows = self._servers.get(key)
+            return list(rows.values()) if rows else default
+
+    def __len__(self):
+        return len(self._servers)
+
+    def contact_count(self):
+        return len(self._rows)
+
+    def items(self):
+        with self._lock:
+            return [(key, list(rows.values())) for key, rows in self._servers.items()]
+
+    def load(self, changes):
+        """
+        Fill an empty index from a whole-sheet snapshot, normalizing rows in chunks as they are read
+        so a streamed snapshot is never held as one list. Returns the number of sheet rows.
+        """
+        chunk, rows = [], 0
+        for record in changes['records']:
+            chunk.append(record)
+            if len(chunk) == self.LOAD_CHUNK_ROWS:
+                self.apply(chunk, offset=rows)
+                rows += len(chunk)
+                chunk = []
+        self.apply(chunk, offset=rows)
+        # A streamed snapshot only carries its version once it has been read to the end
+        self.version, self.etag = changes['version'], changes['etag']
+        return rows + len(chunk)
+
+    def apply(self, records, deleted=(), version=None, etag=None, offset=0):
+        """
+        Upsert changed rows and drop deleted ones, rows that no longer validate are dropped too
+        Rows without a '_row' id are identified by ('#', offset + their position in records)
+        """
+        row_ids = [record['_row'] if '_row' in record else ('#', offset + i) for i, record in enumerate(records)]
+        if any(isinstance(row_id, tuple) for row_id in row_ids):
+            self.positional = True
+        valid = {row_ids[i]: (key, contact) for i, key, contact in normalize_contact_rows(records, positions=True)}
+        with self._lock:
+            for row_id in itertools.chain(deleted, row_ids):
+                if row_id not in valid:
+                    self._remove(row_id)
+            for row_id, (key, contact) in valid.items():
+                if self._rows.get(row_id, key) != key:
+                    self._remove(row_id)
+                self._rows[row_id] = key
+                self._servers.setdefault(key, {})[row_id] = contact
+            self.version, self.etag = version, etag
+
+    def _remove(self, row_id):
+        key = self._rows.pop(row_id, None)
+        if key is not None:
+            rows = self._servers[key]
+            del rows[row_id]
+            if not rows:
+                del self._servers[key]
+
+
+class Contact:
+    """
+    A normalized contact sheet row
+    Supports contact['field'] access so it can be used wherever a contact dict was
+    """
+    __slots__ = ('server_name', 'team', 'primary_contact', 'primary_phone',
+                 'secondary_contact', 'secondary_phone', 'escalation_time')
+
+    def __init__(self, server_name, team, primary_contact, primary_phone,
+                 secondary_contact, secondary_phone, escalation_time):
+        self.server_name = server_name
+        self.team = team
+        self.primary_contact = primary_contact
+        self.primary_phone = primary_phone
+        self.secondary_contact = secondary_contact
+        self.secondary_phone = secondary_phone
+        self.escalation_time = escalation_time
+
+    def __getitem__(self, field):
+        try:
+            return getattr(self, field)
+        except AttributeError:
+            raise KeyError(field)
+
+    def get(self, field, default=None):
+        return getattr(self, field, default)
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    def __eq__(self, other):
+        return isinstance(other, Contact) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"Contact({self.to_dict()!r})"
+
+
+class ContactSnapshot:
+    """
+    Read-only contact directory memory-mapped from a file written by write_contact_snapshot()
+
+    Layout, little-endian: a header (magic, format, flags, created_at, key count, blob sizes and
+    a CRC32 of everything after it), then key offsets and value offsets (count + 1 uint32 each),
+    the sorted UTF-8 server keys and the JSON-encoded [fetched_at, [contact fields...]] values.
+    Lookups binary-search the key table in place, only the matching value is decoded.
+    """
+    MAGIC = b'CTSN'
+    FORMAT = 1
+    COMPLETE = 1  # flag: written from the whole sheet, a missing server has no contacts
+    HEADER = struct.Struct('<4sHHdIIII')
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if len(self._mm) < self.HEADER.size:
+                raise ValueError("truncated snapshot header")
+            magic, file_format, flags, self.created_at, self.count, keys_len, values_len, crc = \
+                self.HEADER.unpack_from(self._mm, 0)
+            self.complete = bool(flags & self.COMPLETE)
+            if magic != self.MAGIC or file_format != self.FORMAT:
+                raise ValueError("not a contact snapshot")
+            self._key_offsets = self.HEADER.size
+            self._value_offsets = self._key_offsets + 4 * (self.count + 1)
+            self._keys = self._value_offsets + 4 * (self.count + 1)
+            self._values = self._keys + keys_len
+            if self._values + values_len != len(self._mm):
+                raise ValueError("truncated snapshot")
+            with memoryview(self._mm) as view:
+                if zlib.crc32(view[self.HEADER.size:]) != crc:
+                    raise ValueError("checksum mismatch")
+        except (ValueError, struct.error) as e:
+            self._mm.close()
+            # Every unreadable file surfaces as ValueError
+            raise ValueError(str(e)) from e
+
+    def _offset(self, table, i):
+        return struct.unpack_from('<I', self._mm, table + 4 * i)[0]
+
+    def _key(self, i):
+        return self._mm[self._keys + self._offset(self._key_offsets, i):self._keys + self._offset(self._key_offsets, i + 1)]
+
+    def lookup(self, key):
+        """
+        (fetched_at, [Contact]) for a server key, or None if the snapshot doesn't have it
+        """
+        wanted = key.encode('utf-8')
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < wanted:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == self.count or self._key(lo) != wanted:
+            return None
+        return self._value(lo)
+
+    def _value(self, i):
+        start = self._values + self._offset(self._value_offsets, i)
+        fetched_at, rows = json.loads(self._mm[start:self._values + self._offset(self._value_offsets, i + 1)])
+        return fetched_at, [Contact(*fields) for fields in rows]
+
+    def get(self, key, default=None):
+        found = self.lookup(key)
+        return found[1] if found else default
+
+    def items(self):
+        for i in range(self.count):
+            fetched_at, contacts = self._value(i)
+            yield self._key(i).decode('utf-8'), fetched_at, contacts
+
+    def __len__(self):
+        return self.count
+
+
+def write_contact_snapshot(entries, path=None, complete=False, created_at=None):
+    """
+    Atomically write (server key, fetched_at, [Contact]) entries as a ContactSnapshot file
+    complete marks a snapshot of the whole sheet rather than of the servers looked up so far,
+    created_at is when its data was fetched
+    """
+    path = path or CONTACT_SNAPSHOT_PATH
+    items = sorted((key.encode('utf-8'), json.dumps([fetched_at, [[getattr(c, f) for f in Contact.__slots__] for c in contacts]],
+                                                    separators=(',', ':')).encode('utf-8'))
+                   for key, fetched_at, contacts in entries)
+    key_offsets, value_offsets = [0], [0]
+    for key, value in items:
+        key_offsets.append(key_offsets[-1] + len(key))
+        value_offsets.append(value_offsets[-1] + len(value))
+    body = b''.join([struct.pack(f'<{len(items) + 1}I', *key_offsets), struct.pack(f'<{len(items) + 1}I', *value_offsets)]
+                    + [key for key, _ in items] + [value for _, value in items])
+    header = ContactSnapshot.HEADER.pack(ContactSnapshot.MAGIC, ContactSnapshot.FORMAT,
+                                         ContactSnapshot.COMPLETE if complete else 0,
+                                         time.time() if created_at is None else created_at, len(items),
+                                         key_offsets[-1], value_offsets[-1], zlib.crc32(body))
+    # Readers only ever see a complete file
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(header)
+        f.write(body)
+    os.replace(tmp_path, path)
+    return len(items)
+
+
+_contact_snapshot = None
+_snapshot_save_lock = threading.Lock()
+_snapshot_save_pending = False
+
+
+def get_contact_snapshot():
+    """
+    The on-disk snapshot, opened on first use, or None if it is missing, corrupt or too old
+    """
+    global _contact_snapshot
+    if not CONTACT_SNAPSHOT_PATH:
+        return None
+    if _contact_snapshot is None:
+        snapshot = False
+        try:
+            snapshot = ContactSnapshot(CONTACT_SNAPSHOT_PATH)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            # A torn or foreign file must never fail the alert, move it aside so the next save replaces it
+            logger.warning(f"Ignoring contact snapshot {CONTACT_SNAPSHOT_PATH}: {str(e)}")
+            _quarantine_snapshot(CONTACT_SNAPSHOT_PATH)
+        if snapshot and time.time() - snapshot.created_at > CONTACT_SNAPSHOT_MAX_AGE:
+            logger.warning(f"Ignoring contact snapshot {CONTACT_SNAPSHOT_PATH}: older than {CONTACT_SNAPSHOT_MAX_AGE}s")
+            snapshot = False
+        _contact_snapshot = snapshot
+    return _contact_snapshot or None
+
+
+def _quarantine_snapshot(path):
+    try:
+        os.replace(path, f"{path}.bad")
+    except OSError as e:
+        logger.warning(f"Could not move aside contact snapshot {path}: {str(e)}")
+
+
+def save_contact_snapshot():
+    """
+    Write everything in the contact cache to CONTACT_SNAPSHOT_PATH
+    A whole-sheet index replaces the file, per-server entries are merged into it
+    """
+    global _contact_snapshot
+    with _contact_cache_lock:
+        entries = list(_contact_cache.items())
+    merged = {}
+    index = next((entry for _, entry in entries if isinstance(entry['value'], ContactIndex)), None)
+    if index is not None:
+        merged.update((server, (index['fetched_at'], contacts)) for server, contacts in index['value'].items())
+    else:
+        previous = get_contact_snapshot()
+        if previous is not None:
+            for key, fetched_at, contacts in previous.items():
+                merged[key] = (fetched_at, contacts)
+        for key, entry in entries:
+            if isinstance(entry['value'], list):
+                if entry['value']:
+                    merged[key] = (entry['fetched_at'], entry['value'])
+                else:
+                    merged.pop(key, None)
+    written = write_contact_snapshot(((key, fetched_at, contacts) for key, (fetched_at, contacts) in merged.items()),
+                                     complete=index is not None, created_at=index['fetched_at'] if index else None)
+    with _contact_cache_lock:
+        _contact_snapshot = None  # reopened on the next miss
+    return written
+
+
+def _save_contact_snapshot_async():
+    """
+    Save the snapshot off the alert path, coalescing saves requested while one is pending
+    """
+    global _snapshot_save_pending
+    with _snapshot_save_lock:
+        if _snapshot_save_pending:
+            return
+        _snapshot_save_pending = True
+
+    def save():
+        global _snapshot_save_pending
+        with _snapshot_save_lock:
+            _snapshot_save_pending = False
+        try:
+            save_contact_snapshot()
+        except OSError as e:
+            logger.warning(f"Could not save contact snapshot: {str(e)}")
+
+    threading.Thread(target=save, daemon=True).start()
+
+
+def normalize_contact_rows(records, server_name=None, positions=False):
+    """
+    Normalize sheet rows in one batch, returning (server key, Contact) pairs
+    Rows keep their own server name unless server_name is given. Problems are
+    counted and reported in a single warning instead of one log line per row.
+    With positions=True each pair is prefixed with the row's index in records.
+    """
+    problems = {}
+    examples = []
+
+    def problem(kind, row_server):
+        problems[kind] = problems.get(kind, 0) + 1
+        if len(examples) < 5:
+            examples.append(f"{row_server}: {kind}")
+
+    # All phone cells of the sheet are normalized together
+    phones = normalize_phones([cell for record in records
+                               for cell in (record.get('Phone Number', ''), record.get('Secondary Phone', ''))])
+
+    normalized = []
+    for i, record in enumerate(records):
+        row_server = server_name or str(record.get('Server Name', '')).strip()
+        if not row_server:
+            problem('missing_server_name', '?')
+            continue
+
+        (primary_phone, primary_issue), (secondary_phone, secondary_issue) = phones[2 * i], phones[2 * i + 1]
+        for issue in (primary_issue, secondary_issue):
+            if issue:
+                problem(f'{issue}_phone', row_server)
+
+        escalation_time = 5
+        raw_escalation = record.get('Escalation Time (mins)')
+        if raw_escalation:
+            try:
+                escalation_time = max(1, int(raw_escalation))
+            except (ValueError, TypeError):
+                problem('invalid_escalation_time', row_server)
+
+        primary_contact = record.get('Primary Contact', '')
+        if not (primary_contact and primary_phone):
+            problem('incomplete_primary', row_server)
+            continue
+
+        contact = Contact(
+            row_server, record.get('Team', 'Unknown'), primary_contact, primary_phone,
+            record.get('Secondary Contact', ''), secondary_phone, escalation_time
+        )
+        normalized.append((i, server_key(row_server), contact) if positions else (server_key(row_server), contact))
+
+    if problems:
+        logger.warning("Contact sheet: %d of %d rows usable, problems: %s (e.g. %s)",
+                       len(normalized), len(records), problems, '; '.join(examples))
+    return normalized
+
+
+def normalize_contact_record(record, server_name):
+    """
+    Convert a sheet row into a Contact, or None if the primary contact is incomplete
+    """
+    normalized = normalize_contact_rows([record], server_name)
+    return normalized[0][1] if normalized else None
+
+
+def fetch_sheet_records(server_name=None):
+    """
+    Fetch raw contact rows from Google Sheets via Apps Script Web API
+    Without a server_name the whole sheet is requested
+    Raises SheetsFetchError if the API could not be reached or returned an error
+    """
+    _, parsed_response = _request_sheet({'server_name': server_name} if server_name else None)
+    return _records_from_response(parsed_response)
+
+
+def fetch_sheet_changes(version=None, etag=None):
+    """
+    Fetch the rows changed since a version token, or the whole sheet without one
+
+    The Apps Script answers ?since=<version> with
+        {"version": "...", "changes": [rows with a '_row' id], "deleted": [row ids]}
+    or, when it can't produce a delta, {"version": "...", "rows": [every row]}. Deltas can only be
+    patched into a snapshot whose rows carry '_row' ids too; a snapshot with rows missing them
+    (or a plain list of rows, also accepted) is downloaded whole on every refresh. If-None-Match is sent so a 304 from an ETag-aware endpoint or
+    proxy costs nothing to process.
+    Returns a dict with full, records, deleted, version and etag
+    Raises SheetsFetchError if the API could not be reached or returned an error
+    """
+    params = {'since': version} if version is not None else None
+    headers = {'If-None-Match': etag} if etag else None
+    if CONTACT_SHEET_STREAMING:
+        return _stream_sheet_changes(params, headers, version, etag)
+    response, parsed_response = _request_sheet(params, headers)
+    etag = response.headers.get('etag', etag)
+
+    if response.status == 304:
+        return {'full': False, 'records': [], 'deleted': [], 'version': version, 'etag': etag}
+    if isinstance(parsed_response, dict) and ('rows' in parsed_response or 'changes' in parsed_response):
+        full = 'rows' in parsed_response
+        return {
+            'full': full,
+            'records': _records_from_response(parsed_response['rows' if full else 'changes']),
+            'deleted': list(parsed_response.get('deleted') or []),
+            'version': parsed_response.get('version'),
+            'etag': etag
+        }
+    return {'full': True, 'records': _records_from_response(parsed_response), 'deleted': [], 'version': None, 'etag': etag}
+
+
+def iter_sheet_records(server_name=None):
+    """
+    Stream contact rows from the Apps Script API, yielding each row as soon as it is parsed
+    Closing the generator early stops the download
+    Raises SheetsFetchError if the API could not be reached or returned an error
+    """
+    response = _open_sheet({'server_name': server_name} if server_name else None, stream=True)
+    return _iter_streamed_rows(response, JsonRowStream(response.iter_chunks()))
+
+
+def _stream_sheet_changes(params, headers, version, etag):
+    """
+    fetch_sheet_changes with CONTACT_SHEET_STREAMING: records is a generator, and version
+    and deleted are only filled in once it has been read to the end
+    """
+    response = _open_sheet(params, headers, stream=True)
+    changes = {'full': True, 'records': [], 'deleted': [], 'version': None, 'etag': response.headers.get('etag', etag)}
+    if response.status == 304:
+        changes.update(full=False, version=version)
+        return changes
+
+    rows = JsonRowStream(response.iter_chunks())
+    records = _iter_streamed_rows(response, rows)
+    # Parsing up to the first row tells a delta from a whole-sheet snapshot
+    first = next(records, None)
+    changes['full'] = rows.rows_key != 'changes'
+
+    def remaining():
+        if first is not None:
+            yield first
+        yield from records
+        meta = rows.value if rows.rows_key else {}
+        changes['version'] = meta.get('version')
+        changes['deleted'] = list(meta.get('deleted') or [])
+
+    changes['records'] = remaining()
+    return changes
+
+
+def _iter_streamed_rows(response, rows):
+    try:
+        yield from rows
+    except (json.JSONDecodeError, OSError, http.client.HTTPException) as e:
+        logger.error(f"Error while streaming the Google Sheets API response: {str(e)}")
+        raise SheetsFetchError(f"Stream error: {str(e)}")
+    finally:
+        response.close()
+    if rows.skipped:
+        logger.warning(f"Skipped {rows.skipped} rows that are not objects")
+    if rows.rows_key is None:
+        # Not a list of rows: an error object, a single record or a bare value
+        yield from _records_from_response(rows.value)
+
+
+def _request_sheet(params=None, headers=None):
+    """
+    GET the Apps Script endpoint and parse the JSON body
+    Returns (response, parsed body), the body is None for a 304
+    """
+    try:
+        response = _open_sheet(params, headers)
+        if response.status == 304:
+            return response, None
+        data = response.text()
+
+        # Log raw response for debugging
+        log_payload("Raw response data", data)
+
+        # Parse JSON response
+        try:
+            with span('sheets_parse'):
+                parsed_response = json.loads(data)
+        except json.JSONDecodeError as e:
+            logger.error("JSON decode error from Google Sheets API response: %s - Raw data: %s", e, cap(redact(data)))
+            raise SheetsFetchError(f"JSON decode error: {str(e)}")
+        logger.info("Parsed response type: %s", type(parsed_response).__name__)
+        return response, parsed_response
+
+    except SheetsFetchError:
+        raise
+    except Exception as e:
+        logger.error(f"Unexpected error fetching contacts from Google Sheets: {str(e)}")
+        raise SheetsFetchError(f"Unexpected error: {str(e)}")
+
+
+def _open_sheet(params=None, headers=None, stream=False):
+    """
+    Send the Apps Script GET and check the status, returns the response (a 304 is passed through)
+    """
+    try:
+        # Google Apps Script Web App URL
+        api_url = SHEETS_API_URL
+        
+        # Build full URL with query parameters
+        full_url = api_url
+        if params:
+            full_url = f"{api_url}?{urllib.parse.urlencode(params)}"
+        
+        logger.info(f"Fetching contacts from Google Sheets API: {full_url}")
+        
+        # Make the HTTP request with timeout
+        try:
+            with span('sheets_network'):
+                response = http_request('GET', full_url, headers=headers, read_timeout=10, stream=stream)
+        except TransportError as e:
+            logger.error(f"Network error while connecting to Google Sheets API: {str(e)}")
+            raise SheetsFetchError(f"Network error: {str(e)}")
+        
+        if response.status == 304:
+            logger.info("Contact sheet not modified")
+        elif response.status != 200:
+            logger.error(f"HTTP error while connecting to Google Sheets API: {response.status} {response.reason}")
+            raise SheetsFetchError(f"HTTP {response.status}: {response.reason}")
+        return response
+
+    except SheetsFetchError:
+        raise
+    except Exception as e:
+        logger.error(f"Unexpected error fetching contacts from Google Sheets: {str(e)}")
+        raise SheetsFetchError(f"Unexpected error: {str(e)}")
+
+
+def _records_from_response(parsed_response):
+    """
+    Turn a parsed Apps Script response into a list of row dicts
+    """
+    # Handle different response types from Google Apps Script
+    if isinstance(parsed_response, int):
+        logger.warning(f"Google Sheets API returned integer: {parsed_response} (possibly an error code)")
+        raise SheetsFetchError(f"Unexpected integer response: {parsed_response}")
+    
+    elif isinstance(parsed_response, str):
+        logger.warning(f"Google Sheets API returned string: {parsed_response}")
+        raise SheetsFetchError(f"Unexpected string response: {parsed_response}")
+    
+    elif isinstance(parsed_response, dict):
+        # Single record returned
+        if 'error' in parsed_response:
+            logger.error(f"Google Sheets API returned error: {parsed_response['error']}")
+            raise SheetsFetchError(f"API error: {parsed_response['error']}")
+        records = [parsed_response]
+        
+    elif isinstance(parsed_response, list):
+        # Multiple records returned
+        records = parsed_response
+        
+    else:
+        logger.error(f"Unexpected response type from API: {type(parsed_response)} - value: {parsed_response}")
+        raise SheetsFetchError(f"Unexpected response type: {type(parsed_response)}")
+
+    # Ensure all items in the list are dictionaries
+    for i, record in enumerate(records):
+        if not isinstance(record, dict):
+            logger.warning(f"Record at index {i} is not a dict: {record} (type: {type(record)})")
+            # Remove invalid records
+            records = [r for r in records if isinstance(r, dict)]
+            break
+
+    return records
+
+
+class JsonRowStream:
+    """
+    Incremental parser for an Apps Script response body given as byte chunks
+    A top-level array is yielded row by row; for an object only its 'rows' or 'changes'
+    array is streamed and the other fields are collected in .value. Rows that aren't
+    objects are skipped and counted. Only the row being parsed is held as text.
+    """
+    ROW_KEYS = ('rows', 'changes')
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self._decoder = json.JSONDecoder()
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+        self.rows_key = None  # '' for a top-level array, else the object key that was streamed
+        self.value = None
+        self.skipped = 0
+
+    def __iter__(self):
+        first = self._peek()
+        if first == '[':
+            self.rows_key = ''
+            yield from self._rows()
+        elif first == '{':
+            self.value = {}
+            self._pos += 1
+            while self._peek() != '}':
+                key = self._next_value()
+                self._expect(':')
+                if key in self.ROW_KEYS and self.rows_key is None and self._peek() == '[':
+                    self.rows_key = key
+                    yield from self._rows()
+                else:
+                    self.value[key] = self._next_value()
+                if self._peek() == ',':
+                    self._pos += 1
+                elif self._peek() != '}':
+                    raise json.JSONDecodeError("Expecting ',' delimiter", self._buf, self._pos)
+            self._pos += 1
+        else:
+            self.value = self._next_value()
+        self._finish()
+
+    def _finish(self):
+        """
+        Read the body to its end, so the streamed connection counts as fully read and is pooled again
+        Only whitespace may follow the top-level value
+        """
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in ' \t\r\n':
+                self._pos += 1
+            if self._pos < len(self._buf):
+                raise json.JSONDecodeError("Extra data", self._buf, self._pos)
+            if not self._fill():
+                return
+
+    def _fill(self):
+        if self._eof:
+            return False
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            self._eof = True
+            self._buf += self._utf8.decode(b'', final=True)
+            return False
+        self._buf += self._utf8.decode(chunk)
+        return True
+
+    def _peek(self):
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in ' \t\r\n':
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                raise json.JSONDecodeError("Unexpected end of data", self._buf, self._pos)
+
+    def _expect(self, char):
+        if self._peek() != char:
+            raise json.JSONDecodeError(f"Expecting '{char}'", self._buf, self._pos)
+        self._pos += 1
+
+    def _next_value(self):
+        self._peek()
+        if self._pos > 65536:
+            # Drop what has been parsed so the buffer stays about one chunk long
+            self._buf, self._pos = self._buf[self._pos:], 0
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # A number or literal cut off by the end of a chunk would decode as a shorter value
+            complete = isinstance(value, (dict, list, str)) or (end < len(self._buf) and self._buf[end] in ' \t\r\n,]}')
+            if complete or not self._fill():
+                self._pos = end
+                return value
+
+    def _rows(self):
+        self._expect('[')
+        if self._peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            row = self._next_value()
+            if isinstance(row, dict):
+                yield row
+            else:
+                self.skipped += 1
+            separator = self._peek()
+            self._pos += 1
+            if separator == ']':
+                return
+            if separator != ',':
+                raise json.JSONDecodeError("Expecting ',' delimiter", self._buf, self._pos - 1)
+
+
+_non_phone_chars = re.compile(r'[^0-9+\n]')
+
+
+def normalize_phones(phones):
+    """
+    Clean and format many phone numbers in one pass, returning (number or None, issue or None) for each
+    issue is 'unusual' for numbers kept as-is without a country code, 'invalid' for rejected ones.
+    All cells are joined and stripped with a single regex substitution.
+    """
+    texts = []
+    for phone in phones:
+        if not phone:
+            texts.append('')
+        elif isinstance(phone, (int, float)):
+            try:
+                texts.append(str(int(phone)))  # Convert to int first to remove decimals, then to string
+            except (ValueError, OverflowError):
+                texts.append('-')  # NaN/inf, reported as invalid below
+        else:
+            texts.append(str(phone).replace('\n', ' '))
+
+    results = []
+    # Remove all non-digit characters except +
+    for phone, cleaned in zip(phones, _non_phone_chars.sub('', '\n'.join(texts)).split('\n')):
+        if not cleaned:
+            results.append((None, 'invalid' if phone else None))
+            continue
+        digit_count = len(cleaned) - cleaned.count('+')
+        # Basic validation
+        if digit_count < 10 or digit_count > 15:
+            results.append((None, 'invalid'))
+        elif cleaned[0] == '+':
+            results.append((cleaned, None))
+        # Add country code if missing
+        elif digit_count == 10:
+            results.append(('+91' + cleaned.replace('+', ''), None))  # Assume India number based on your location
+        elif digit_count == 11 and cleaned[0] == '1':
+            results.append(('+' + cleaned.replace('+', ''), None))
+        else:
+            results.append((cleaned, 'unusual'))
+    return results
+
+
+def normalize_phone(phone):
+    """
+    Clean and format one phone number, see normalize_phones
+    """
+    return normalize_phones([phone])[0]
+
+
+def clean_phone_number(phone):
+    """
+    Clean and format phone number
+    """
+    cleaned, issue = normalize_phone(phone)
+    if issue == 'unusual':
+        logger.warning("Unusual phone number format: %s -> %s", mask_phone(phone), mask_phone(cleaned))
+    elif issue == 'invalid':
+        logger.warning("Invalid phone number: %s", mask_phone(phone))
+    return cleaned
+
+def process_server_alert_with_calls(contacts, alarm_data, context=None):
+    """
+    Process the server alert and make actual Twilio calls
+    Calls are placed one after another, or all at once when CALL_DISPATCH_MODE=concurrent
     """
     results = {
         'server': alarm_data['server_name'],
@@ -308,66 +2202,944 @@ def process_server_alert_with_calls(contacts, alarm_data):
         'call_results': [],
         'alert_processed': True
     }
-    
-    if not contacts:
-        logger.warning(f"No contacts found for server: {alarm_data['server_name']}")
-        return results
-    
-    # Create the voice message
-    voice_message = create_call_message(alarm_data)
-    
-    for contact in contacts:
-        results['team'] = contact['team']
-        results['escalation_time'] = contact['escalation_time']
-        
-        logger.info("=== MAKING EMERGENCY CALLS ===")
-        logger.info(f"Server: {alarm_data['server_name']} (Team: {contact['team']})")
-        logger.info(f"Status: DOWN since {alarm_data['timestamp']}")
-        logger.info(f"Escalation time: {contact['escalation_time']} minutes")
-        
-        # Call primary contact immediately
-        if contact['primary_contact'] and contact['primary_phone']:
-            logger.info(f"📞 Calling Primary: {contact['primary_contact']} at {contact['primary_phone']}")
-            call_result = make_twilio_call(
-                to_number=contact['primary_phone'],
-                message=voice_message,
-                contact_name=contact['primary_contact'],
-                contact_type='Primary'
-            )
-            results['call_results'].append(call_result)
-            if call_result['success']:
-                results['calls_initiated'] += 1
-        
-        # Note: In a real implementation, you'd want to schedule the secondary call
-        # after escalation_time minutes using AWS Step Functions or similar
-        # For now, we'll just make the call immediately with a note
-        if contact['secondary_contact'] and contact['secondary_phone']:
-            logger.info(f"📞 Calling Secondary: {contact['secondary_contact']} at {contact['secondary_phone']}")
-            call_result = make_twilio_call(
-                to_number=contact['secondary_phone'],
-                message=voice_message,
-                contact_name=contact['secondary_contact'],
-                contact_type='Secondary'
-            )
-            results['call_results'].append(call_result)
-            if call_result['success']:
-                results['calls_initiated'] += 1
-        
-        logger.info("=== END EMERGENCY CALLS ===")
-    
-    return results
+    
+    if not contacts:
+        logger.warning(f"No contacts found for server: {alarm_data['server_name']}")
+        return results
+    
+    # Create the voice message
+    with span('create_message'):
+        voice_message = create_call_message(alarm_data)
+    
+    planned_calls = []
+    deferred_calls = []
+    for contact in contacts:
+        results['team'] = contact['team']
+        results['escalation_time'] = contact['escalation_time']
+        
+        logger.info("=== MAKING EMERGENCY CALLS ===")
+        logger.info(f"Server: {alarm_data['server_name']} (Team: {contact['team']})")
+        logger.info(f"Status: DOWN since {alarm_data['timestamp']}")
+        logger.info(f"Escalation time: {contact['escalation_time']} minutes")
+        
+        # Call primary contact immediately
+        primary_index = None
+        if contact['primary_contact'] and contact['primary_phone']:
+            logger.info("📞 Calling Primary: %s at %s", mask_name(contact['primary_contact']), contact['primary_phone'])
+            primary_index = len(planned_calls)
+            planned_calls.append({
+                'to_number': contact['primary_phone'],
+                'contact_name': contact['primary_contact'],
+                'contact_type': 'Primary'
+            })
+        
+        # With ESCALATION_MODE=scheduled the secondary is only called after escalation_time
+        # minutes if the primary hasn't acknowledged, otherwise it is called right away
+        if contact['secondary_contact'] and contact['secondary_phone']:
+            secondary_call = {
+                'to_number': contact['secondary_phone'],
+                'contact_name': contact['secondary_contact'],
+                'contact_type': 'Secondary'
+            }
+            if ESCALATION_MODE == 'scheduled' and primary_index is not None:
+                deferred_calls.append((primary_index, contact['escalation_time'], secondary_call))
+            else:
+                logger.info("📞 Calling Secondary: %s at %s", mask_name(contact['secondary_contact']), contact['secondary_phone'])
+                planned_calls.append(secondary_call)
+        
+        logger.info("=== END EMERGENCY CALLS ===")
+    
+    critical = is_critical_server(alarm_data['server_name'])
+    alert = {'alert_id': alert_id_for(alarm_data), 'server_name': alarm_data['server_name'], 'team': results['team']}
+    call_results = dispatch_calls(planned_calls, voice_message, context, critical, alert)
+    
+    if deferred_calls:
+        results['escalations_scheduled'] = 0
+        store = get_escalation_store()
+        for primary_index, escalation_time, secondary_call in deferred_calls:
+            primary_result = call_results[primary_index]
+            if primary_result.get('duplicate'):
+                # The invocation that placed the primary scheduled its escalation
+                continue
+            if primary_result.get('not_sent'):
+                # The primary goes to the retry queue, escalate along with it
+                logger.info("📞 Queueing Secondary: %s at %s", mask_name(secondary_call['contact_name']), secondary_call['to_number'])
+                call_results.append(not_sent_result(secondary_call))
+            elif primary_result['success']:
+                store.schedule(
+                    primary_call_sid=primary_result.get('call_sid', 'unknown'),
+                    server_name=alarm_data['server_name'],
+                    call=secondary_call,
+                    message=voice_message,
+                    due_at=time.time() + escalation_time * 60
+                )
+                results['escalations_scheduled'] += 1
+                logger.info("⏱️ Secondary %s scheduled in %s minutes", mask_name(secondary_call['contact_name']), escalation_time)
+            else:
+                # Primary couldn't be reached at all, escalate now
+                logger.info("📞 Calling Secondary: %s at %s", mask_name(secondary_call['contact_name']), secondary_call['to_number'])
+                call_results.extend(dispatch_calls([secondary_call], voice_message, context, critical, alert))
+    
+    results['call_results'] = call_results
+    results['calls_deduplicated'] = sum(1 for call_result in call_results if call_result.get('duplicate'))
+    results['calls_initiated'] = sum(1 for call_result in call_results if call_result['success'] and not call_result.get('duplicate'))
+    results['calls_queued'] = queue_undelivered_calls(call_results, alarm_data['server_name'], voice_message, alert)
+    return results
+
+
+# 'serial' dials one contact after another, 'concurrent' dials everyone at once from a thread pool
+CALL_DISPATCH_MODE = os.environ.get('CALL_DISPATCH_MODE', 'serial').lower()
+CALL_MAX_WORKERS = int(os.environ.get('CALL_MAX_WORKERS', '8'))
+CALL_TIMEOUT = 30  # seconds per Twilio request
+DEADLINE_SAFETY_MARGIN_MS = int(os.environ.get('DEADLINE_SAFETY_MARGIN_MS', '1500'))
+# Calls that can't start with at least this many seconds left go to the retry queue instead
+CALL_MIN_BUDGET = float(os.environ.get('CALL_MIN_BUDGET', '2'))
+# Queued calls are retried by the escalation tick, recorded under this marker instead of a call SID
+RETRY_QUEUE_SID = 'deadline-retry'
+# Where calls cut off by the deadline go:
+#   'sqs'   - a message on RETRY_QUEUE_URL, an SQS queue that triggers this function
+#   'store' - the escalation store, placed by the next escalation tick (the router ticks itself)
+#   'none'  - nowhere, they are reported as failed
+# /tmp does not outlive a Lambda container, so without a queue URL Lambda defaults to 'none'
+RETRY_QUEUE_URL = os.environ.get('RETRY_QUEUE_URL', '')
+RETRY_QUEUE_DELAY = int(os.environ.get('RETRY_QUEUE_DELAY', '0'))  # seconds, SQS allows up to 900
+RETRY_QUEUE_BACKEND = os.environ.get('RETRY_QUEUE_BACKEND', '').lower() or (
+    'sqs' if RETRY_QUEUE_URL else 'none' if os.environ.get('AWS_LAMBDA_FUNCTION_NAME') else 'store')
+
+
+def remaining_time_seconds(context, default=None):
+    """
+    Seconds left before the Lambda times out, minus a safety margin for returning the response
+    """
+    if context is None or not hasattr(context, 'get_remaining_time_in_millis'):
+        return default
+    return max(0.0, (context.get_remaining_time_in_millis() - DEADLINE_SAFETY_MARGIN_MS) / 1000.0)
+
+
+def primaries_first(planned_calls):
+    """
+    Indexes of planned_calls with primary contacts ahead of everyone else
+    """
+    return sorted(range(len(planned_calls)), key=lambda i: planned_calls[i]['contact_type'] != 'Primary')
+
+
+def acknowledged_result(call):
+    return {
+        'success': False,
+        'contact_name': call['contact_name'],
+        'contact_type': call['contact_type'],
+        'phone': call['to_number'],
+        'error': 'Alert already acknowledged',
+        'acknowledged': True
+    }
+
+
+def not_sent_result(call):
+    return {
+        'success': False,
+        'contact_name': call['contact_name'],
+        'contact_type': call['contact_type'],
+        'phone': call['to_number'],
+        'error': 'Deadline exceeded',
+        'not_sent': True
+    }
+
+
+def dispatch_calls(planned_calls, message, context=None, critical=False, alert=None):
+    """
+    Place planned calls, primaries first, within the invocation's deadline
+    Results come back in planned order; calls there was no time for are marked not_sent
+    With an alert (see alert_id_for) placed calls are tracked, and once anyone acknowledges it
+    the remaining calls are skipped
+    """
+    if CALL_DISPATCH_MODE == 'concurrent':
+        call_results = dispatch_calls_concurrently(planned_calls, message, context, critical, alert)
+        for call_result in call_results:
+            track_call(alert, call_result)
+        return call_results
+
+    call_results = [None] * len(planned_calls)
+    for i in primaries_first(planned_calls):
+        call = planned_calls[i]
+        remaining = deadline_remaining()
+        if remaining is not None and remaining < CALL_MIN_BUDGET:
+            logger.error("❌ Deadline reached before calling %s (%s)", mask_name(call['contact_name']), call['contact_type'])
+            call_results[i] = not_sent_result(call)
+        elif alert_acknowledged(alert):
+            logger.info("✅ Alert already acknowledged, not calling %s (%s)", mask_name(call['contact_name']), call['contact_type'])
+            call_results[i] = acknowledged_result(call)
+        else:
+            timeout = CALL_TIMEOUT if remaining is None else min(CALL_TIMEOUT, remaining)
+            call_results[i] = place_call(message=message, timeout=timeout,
+                                         priority=call_priority(call['contact_type'], critical),
+                                         idempotency_key=alert['alert_id'] if alert else None, **call)
+            track_call(alert, call_results[i])
+    return call_results
+
+
+def queue_undelivered_calls(call_results, server_name, message, alert=None):
+    """
+    Hand calls that were never sent to the retry queue (see RETRY_QUEUE_BACKEND)
+    Returns how many were queued; with no durable queue they are reported as failed instead
+    """
+    undelivered = [r for r in call_results if r.get('not_sent')]
+    if not undelivered:
+        return 0
+    calls = [{'to_number': r['phone'], 'contact_name': r['contact_name'], 'contact_type': r['contact_type']}
+             for r in undelivered]
+
+    if RETRY_QUEUE_BACKEND == 'sqs':
+        try:
+            get_retry_queue().send(server_name, calls, message, alert)
+        except Exception as e:
+            logger.error(f"❌ Could not queue {len(calls)} undelivered calls for {server_name}: {str(e)}")
+            return _drop_undelivered_calls(undelivered, server_name)
+    elif RETRY_QUEUE_BACKEND == 'store':
+        store = get_escalation_store()
+        # Retries are keyed by their alert so an acknowledgement can cancel them
+        retry_sid = f"{RETRY_QUEUE_SID}:{alert['alert_id']}" if alert else RETRY_QUEUE_SID
+        for call in calls:
+            store.schedule(primary_call_sid=retry_sid, server_name=server_name, call=call, message=message,
+                           due_at=time.time())
+    else:
+        return _drop_undelivered_calls(undelivered, server_name)
+
+    for call_result in undelivered:
+        call_result['error'] = f"{call_result['error']}, queued for retry"
+        call_result['queued'] = True
+    count_metric('calls_queued', len(undelivered))
+    logger.warning(f"⏳ Queued {len(undelivered)} undelivered calls for {server_name} for retry")
+    return len(undelivered)
+
+
+def _drop_undelivered_calls(undelivered, server_name):
+    for call_result in undelivered:
+        call_result['error'] = f"{call_result['error']}, not retried"
+    count_metric('calls_dropped', len(undelivered))
+    logger.error(f"❌ {len(undelivered)} calls for {server_name} were never placed and no retry queue is configured")
+    return 0
+
+
+class SqsRetryQueue:
+    """
+    Undelivered calls sent as one SQS message per alert, delivered back to lambda_handler
+    by the queue's event source mapping and placed by run_call_retries()
+    """
+
+    def __init__(self, queue_url=RETRY_QUEUE_URL, client=None):
+        if client is None:
+            import boto3  # available in the Lambda runtime, only needed for this backend
+            client = boto3.client('sqs')
+        self.queue_url = queue_url
+        self._client = client
+
+    def send(self, server_name, calls, message, alert=None):
+        body = {'retry_calls': calls, 'server_name': server_name, 'message': message,
+                'alert_id': alert['alert_id'] if alert else None, 'team': alert.get('team') if alert else None}
+        self._client.send_message(QueueUrl=self.queue_url, MessageBody=json.dumps(body),
+                                  DelaySeconds=max(0, min(900, RETRY_QUEUE_DELAY)))
+
+
+_retry_queue = None
+
+
+def get_retry_queue():
+    global _retry_queue
+    if _retry_queue is None:
+        _retry_queue = SqsRetryQueue()
+    return _retry_queue
+
+
+def set_retry_queue(queue):
+    """
+    Plug in a different retry queue (or None to go back to SQS at RETRY_QUEUE_URL)
+    """
+    global _retry_queue
+    _retry_queue = queue
+
+
+def parse_retry_records(event):
+    """
+    The retry messages of an SQS delivery from the retry queue, or None for any other event
+    """
+    event = unwrap_event(event)
+    if not isinstance(event, dict):
+        return None
+    retries = []
+    for record in event.get('Records') or []:
+        body = record.get('body')
+        if isinstance(body, str) and '"retry_calls"' in body:
+            try:
+                retries.append(json.loads(body))
+            except ValueError:
+                logger.error("Skipping unreadable retry message")
+    return retries or None
+
+
+def run_call_retries(retries, context=None):
+    """
+    Place calls handed over by the retry queue, unless their alert was acknowledged meanwhile
+    Calls that run out of time again go back to the queue
+    """
+    call_results, queued = [], 0
+    for retry in retries:
+        alert = {'alert_id': retry['alert_id'], 'server_name': retry['server_name'], 'team': retry.get('team') or 'Unknown'} \
+            if retry.get('alert_id') else None
+        if alert_acknowledged(alert):
+            logger.info(f"✅ Alert for {retry['server_name']} acknowledged, dropping {len(retry['retry_calls'])} queued calls")
+            continue
+        results = dispatch_calls(retry['retry_calls'], retry['message'], context, is_critical_server(retry['server_name']), alert)
+        queued += queue_undelivered_calls(results, retry['server_name'], retry['message'], alert)
+        call_results.extend(results)
+    return {
+        'statusCode': 200,
+        'body': json.dumps({
+            'message': 'Queued calls retried',
+            'retried': len(call_results),
+            'calls_initiated': sum(1 for call_result in call_results if call_result['success'] and not call_result.get('duplicate')),
+            'calls_queued': queued,
+            'call_results': call_results
+        })
+    }
+
+
+def dispatch_calls_concurrently(planned_calls, message, context=None, critical=False, alert=None):
+    """
+    Place all calls in parallel, primary contacts first, within the Lambda's remaining time
+    Calls that never started with CALL_MIN_BUDGET left are marked not_sent, ones still in flight
+    at the deadline as failed
+    """
+    if not planned_calls:
+        return []
+
+    budget = deadline_remaining(remaining_time_seconds(context))
+
+    # Submit primaries before secondaries so they get the first free workers
+    order = primaries_first(planned_calls)
+
+    import concurrent.futures  # only needed in concurrent mode, kept off the cold-start path
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(CALL_MAX_WORKERS, len(planned_calls))))
+    try:
+        futures = {}
+        for i in order:
+            remaining = deadline_remaining()
+            if remaining is not None and remaining < CALL_MIN_BUDGET:
+                break
+            futures[i] = executor.submit(bind_metrics(_place_call_in_budget), planned_calls[i], message,
+                                         call_priority(planned_calls[i]['contact_type'], critical),
+                                         alert['alert_id'] if alert else None)
+        concurrent.futures.wait(futures.values(), timeout=budget)
+    finally:
+        # Don't block on calls that overran the deadline
+        executor.shutdown(wait=False)
+
+    call_results = []
+    for i, call in enumerate(planned_calls):
+        future = futures.get(i)
+        if future is None:
+            logger.error("❌ Deadline reached before calling %s (%s)", mask_name(call['contact_name']), call['contact_type'])
+            call_results.append(not_sent_result(call))
+        elif future.done():
+            call_results.append(future.result())
+        elif future.cancel():
+            # Never reached a worker, safe to retry later
+            logger.error("❌ Deadline reached before calling %s (%s)", mask_name(call['contact_name']), call['contact_type'])
+            call_results.append(not_sent_result(call))
+        else:
+            logger.error("❌ Deadline reached before call to %s (%s) completed", mask_name(call['contact_name']), call['contact_type'])
+            call_results.append({
+                'success': False,
+                'contact_name': call['contact_name'],
+                'contact_type': call['contact_type'],
+                'phone': call['to_number'],
+                'error': 'Deadline exceeded'
+            })
+    return call_results
+
+def _place_call_in_budget(call, message, priority, idempotency_key):
+    """
+    place_call for a worker, unless the call would start with less than CALL_MIN_BUDGET left
+    """
+    remaining = deadline_remaining()
+    if remaining is not None and remaining < CALL_MIN_BUDGET:
+        logger.error("❌ Deadline reached before calling %s (%s)", mask_name(call['contact_name']), call['contact_type'])
+        return not_sent_result(call)
+    timeout = CALL_TIMEOUT if remaining is None else min(CALL_TIMEOUT, remaining)
+    return place_call(message=message, timeout=timeout, priority=priority, idempotency_key=idempotency_key, **call)
+
+
+# 'immediate' calls secondaries straight away, 'scheduled' waits escalation_time minutes for an acknowledgement
+ESCALATION_MODE = os.environ.get('ESCALATION_MODE', 'immediate').lower()
+ESCALATION_DB_PATH = os.environ.get('ESCALATION_DB_PATH', '/tmp/escalations.db')
+ESCALATION_TICK_BATCH = int(os.environ.get('ESCALATION_TICK_BATCH', '50'))
+# Seconds an escalation may stay 'dispatching' before a tick that crashed is assumed and it is claimed again,
+# at least the function timeout so a running tick keeps its claims
+ESCALATION_LEASE = int(os.environ.get('ESCALATION_LEASE', '900'))
+
+# /tmp is neither shared between Lambda containers nor kept when one is recycled, so pending escalations
+# there would silently never be placed. On Lambda, 'scheduled' needs ESCALATION_DB_PATH on a shared
+# file system such as EFS, otherwise secondaries are called right away.
+if (ESCALATION_MODE == 'scheduled' and os.environ.get('AWS_LAMBDA_FUNCTION_NAME')
+        and os.path.abspath(ESCALATION_DB_PATH).startswith('/tmp/')):
+    logger.warning(f"ESCALATION_MODE=scheduled needs ESCALATION_DB_PATH on shared storage, not {ESCALATION_DB_PATH};"
+                   " calling secondaries immediately")
+    ESCALATION_MODE = 'immediate'
+
+
+class SqliteEscalationStore:
+    """
+    Pending secondary calls kept in SQLite, so escalations survive between invocations
+    Any object with the same methods can be plugged in with set_escalation_store()
+    """
+
+    def __init__(self, path=ESCALATION_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        import sqlite3  # only needed for the SQLite backend, kept off the cold-start path
+        self._conn = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS escalations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                primary_call_sid TEXT NOT NULL,
+                server_name TEXT NOT NULL,
+                to_number TEXT NOT NULL,
+                contact_name TEXT NOT NULL,
+                contact_type TEXT NOT NULL,
+                message TEXT NOT NULL,
+                due_at REAL NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                updated_at REAL NOT NULL
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_escalations_due ON escalations (status, due_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_escalations_sid ON escalations (primary_call_sid)")
+
+    def schedule(self, primary_call_sid, server_name, call, message, due_at):
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO escalations (primary_call_sid, server_name, to_number, contact_name, contact_type,"
+                " message, due_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (primary_call_sid, server_name, call['to_number'], call['contact_name'], call['contact_type'],
+                 message, due_at, time.time()))
+            return cursor.lastrowid
+
+    def cancel(self, primary_call_sid):
+        """
+        Cancel pending escalations of an acknowledged call, returns how many were cancelled
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE escalations SET status = 'cancelled', updated_at = ? WHERE primary_call_sid = ? AND status = 'pending'",
+                (time.time(), primary_call_sid))
+            return cursor.rowcount
+
+    def claim_due(self, now=None, limit=ESCALATION_TICK_BATCH):
+        """
+        Atomically move due escalations to 'dispatching' so overlapping ticks never dial twice
+        Escalations left 'dispatching' for longer than ESCALATION_LEASE by a tick that died are claimed again
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT id, primary_call_sid, server_name, to_number, contact_name, contact_type, message"
+                    " FROM escalations WHERE (status = 'pending' AND due_at <= ?)"
+                    " OR (status = 'dispatching' AND updated_at <= ?) ORDER BY due_at LIMIT ?",
+                    (now, now - ESCALATION_LEASE, limit)).fetchall()
+                self._conn.executemany(
+                    "UPDATE escalations SET status = 'dispatching', updated_at = ? WHERE id = ?",
+                    [(now, row[0]) for row in rows])
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        keys = ('id', 'primary_call_sid', 'server_name', 'to_number', 'contact_name', 'contact_type', 'message')
+        return [dict(zip(keys, row)) for row in rows]
+
+    def mark(self, escalation_id, status):
+        with self._lock:
+            self._conn.execute("UPDATE escalations SET status = ?, updated_at = ? WHERE id = ?",
+                               (status, time.time(), escalation_id))
+
+    def pending_count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM escalations WHERE status = 'pending'").fetchone()[0]
+
+
+_escalation_store = None
+
+
+def get_escalation_store():
+    global _escalation_store
+    if _escalation_store is None:
+        _escalation_store = SqliteEscalationStore()
+    return _escalation_store
+
+
+def set_escalation_store(store):
+    """
+    Plug in a different escalation backend (or None to go back to the SQLite default)
+    """
+    global _escalation_store
+    _escalation_store = store
+
+
+def run_escalation_tick(context=None):
+    """
+    Place every secondary call whose escalation time has passed
+    Safe to run from overlapping invocations, e.g. an EventBridge schedule every minute
+    """
+    store = get_escalation_store()
+    due = []
+    for escalation in store.claim_due():
+        # Someone may have acknowledged the alert since this escalation was scheduled
+        alert = escalation_alert(escalation)
+        if alert_acknowledged(alert):
+            store.mark(escalation['id'], 'cancelled')
+            count_metric('escalations_acknowledged')
+        else:
+            due.append((escalation, alert))
+    if not due:
+        return {'statusCode': 200, 'body': json.dumps({'message': 'No escalations due', 'dispatched': 0})}
+
+    logger.info(f"Escalating {len(due)} unacknowledged alerts")
+    calls = [{'to_number': e['to_number'], 'contact_name': e['contact_name'], 'contact_type': e['contact_type']} for e, _ in due]
+    if CALL_DISPATCH_MODE == 'concurrent' and len(set(e['message'] for e, _ in due)) == 1:
+        call_results = dispatch_calls_concurrently(calls, due[0][0]['message'], context)
+        for (_, alert), call_result in zip(due, call_results):
+            track_call(alert, call_result)
+    else:
+        call_results = []
+        for (e, alert), call in zip(due, calls):
+            call_results.extend(dispatch_calls([call], e['message'], context, alert=alert))
+
+    for (escalation, _), call_result in zip(due, call_results):
+        if call_result.get('not_sent'):
+            # Out of time again, leave it for the next tick
+            store.mark(escalation['id'], 'pending')
+        elif call_result.get('acknowledged'):
+            store.mark(escalation['id'], 'cancelled')
+        else:
+            store.mark(escalation['id'], 'dispatched' if call_result['success'] else 'failed')
+
+    return {
+        'statusCode': 200,
+        'body': json.dumps({
+            'message': 'Escalations processed',
+            'dispatched': len(due),
+            'calls_initiated': sum(1 for call_result in call_results if call_result['success'] and not call_result.get('duplicate')),
+            'call_results': call_results
+        })
+    }
+
+
+def _callback_body(event):
+    body = event.get('body') if isinstance(event, dict) else None
+    if not body or not isinstance(body, str):
+        return None
+    if event.get('isBase64Encoded'):
+        body = base64.b64decode(body).decode('utf-8')
+    return body
+
+
+def parse_twilio_callback(event):
+    """
+    Return the form fields of a Twilio webhook delivered through API Gateway, or None for other events
+    """
+    body = _callback_body(event)
+    if body is None:
+        return None
+    fields = dict(urllib.parse.parse_qsl(body))
+    return fields if 'CallSid' in fields else None
+
+
+# Reject callbacks that Twilio didn't sign with our auth token, only turn off for local testing
+TWILIO_VALIDATE_SIGNATURE = os.environ.get('TWILIO_VALIDATE_SIGNATURE', 'true').lower() == 'true'
+
+
+def twilio_signature(url, params, auth_token):
+    """
+    X-Twilio-Signature: base64 HMAC-SHA1 of the URL followed by every POST parameter's name and value, sorted
+    """
+    payload = url + ''.join(name + value for name, value in sorted(params))
+    return base64.b64encode(hmac.new(auth_token.encode('utf-8'), payload.encode('utf-8'), hashlib.sha1).digest()).decode('ascii')
+
+
+def callback_urls(event):
+    """
+    URLs Twilio may have signed: the configured callback URLs and the one the request was received on
+    """
+    urls = [os.environ.get('TWILIO_ACK_URL', ''), os.environ.get('TWILIO_STATUS_CALLBACK_URL', '')]
+    headers = {str(name).lower(): value for name, value in (event.get('headers') or {}).items()}
+    host = headers.get('host')
+    path = (event.get('requestContext') or {}).get('path') or event.get('rawPath') or event.get('path')
+    if host and path:
+        query = event.get('rawQueryString') or urllib.parse.urlencode(event.get('queryStringParameters') or {})
+        urls.append(f"{headers.get('x-forwarded-proto', 'https')}://{host}{path}" + (f"?{query}" if query else ''))
+    return [url for url in urls if url]
+
+
+def verify_twilio_signature(event):
+    """
+    True if the callback carries a valid X-Twilio-Signature for one of callback_urls()
+    """
+    if not TWILIO_VALIDATE_SIGNATURE:
+        return True
+    auth_token = os.environ.get('TWILIO_AUTH_TOKEN')
+    headers = {str(name).lower(): value for name, value in (event.get('headers') or {}).items()}
+    signature = headers.get('x-twilio-signature')
+    if not auth_token or not signature:
+        return False
+    params = urllib.parse.parse_qsl(_callback_body(event) or '', keep_blank_values=True)
+    return any(hmac.compare_digest(twilio_signature(url, params, auth_token), signature) for url in callback_urls(event))
+
+
+def is_status_callback(fields):
+    """
+    Twilio marks call progress webhooks, everything else is the <Gather> action
+    """
+    return fields.get('CallbackSource') == 'call-progress-events' or ('SequenceNumber' in fields and 'Digits' not in fields)
+
+
+def handle_call_acknowledgement(fields):
+    """
+    A key pressed during the <Gather> acknowledges the alert: every pending escalation
+    and queued retry of the alert is cancelled, and calls not yet placed are skipped
+    """
+    call_sid = fields['CallSid']
+    cancelled = 0
+    if fields.get('Digits'):
+        escalations = get_escalation_store()
+        cancelled = escalations.cancel(call_sid)
+        alert = get_call_store().acknowledge(call_sid, time.time()) if call_tracking_enabled() else None
+        if alert is not None:
+            for sid in alert['call_sids']:
+                if sid != call_sid:
+                    cancelled += escalations.cancel(sid)
+            cancelled += escalations.cancel(f"{RETRY_QUEUE_SID}:{alert['alert_id']}")
+        count_metric('calls_acknowledged')
+        logger.info(f"✅ Call {call_sid} acknowledged, cancelled {cancelled} pending escalations")
+        reply = 'Thank you. Alert confirmed. Goodbye.'
+    else:
+        reply = 'No response received. Please check your servers immediately. Goodbye.'
+
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'text/xml'},
+        'body': f'<?xml version="1.0" encoding="UTF-8"?><Response><Say voice="alice" rate="slow">{reply}</Say></Response>'
+    }
+
+def handle_call_status(fields):
+    """
+    Record a Twilio status callback (answered, completed, busy, no-answer...) for the call
+    """
+    call_sid = fields['CallSid']
+    status = fields.get('CallStatus', 'unknown')
+    if call_tracking_enabled():
+        duration = fields.get('CallDuration')
+        known = get_call_store().update_status(call_sid, status, time.time(),
+                                               int(duration) if duration and duration.isdigit() else None)
+        if not known:
+            logger.warning(f"Status '{status}' for untracked call {call_sid}")
+    count_metric(f"call_status_{status.replace('-', '_')}")
+    logger.info(f"Call {call_sid} is {status}")
+    return {'statusCode': 204, 'body': ''}
+
+
+# Per-call status and acknowledgements, so paging stops once someone acknowledges and
+# time-to-acknowledge can be reported per team and server
+CALL_TRACKING_DB_PATH = os.environ.get('CALL_TRACKING_DB_PATH', '/tmp/call_tracking.db')
+CALL_STATUS_EVENTS = ('answered', 'completed')
+CALL_FINAL_STATUSES = frozenset(('completed', 'busy', 'failed', 'no-answer', 'canceled'))
+
+
+def status_callback_url():
+    """
+    Where Twilio posts call progress, the acknowledgement endpoint handles both unless set apart
+    """
+    return os.environ.get('TWILIO_STATUS_CALLBACK_URL') or os.environ.get('TWILIO_ACK_URL', '')
+
+
+def call_tracking_enabled():
+    """
+    Calls are tracked once Twilio can call back, or when a store was plugged in
+    """
+    return _call_store is not None or bool(status_callback_url())
+
+
+def alert_id_for(alarm_data):
+    """
+    Every call placed for one alarm shares this id, an acknowledgement on any of them covers all
+    """
+    return f"{server_key(alarm_data['server_name'])}@{alarm_data['timestamp']}"
+
+
+class SqliteCallStore:
+    """
+    Placed calls indexed by call_sid, with their latest status and acknowledgement
+    Any object with the same methods can be plugged in with set_call_store()
+    """
+
+    def __init__(self, path=CALL_TRACKING_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        import sqlite3  # only needed once calls are tracked, kept off the cold-start path
+        self._conn = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS calls (
+                call_sid TEXT PRIMARY KEY,
+                alert_id TEXT NOT NULL,
+                server_name TEXT NOT NULL,
+                team TEXT NOT NULL,
+                contact_name TEXT NOT NULL,
+                contact_type TEXT NOT NULL,
+                to_number TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'initiated',
+                placed_at REAL NOT NULL,
+                answered_at REAL,
+                completed_at REAL,
+                duration INTEGER,
+                acknowledged_at REAL
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_calls_alert ON calls (alert_id, acknowledged_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_calls_placed ON calls (placed_at, team, server_name)")
+
+    def record(self, call_sid, alert, call_result, placed_at):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO calls (call_sid, alert_id, server_name, team, contact_name, contact_type,"
+                " to_number, placed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (call_sid, alert['alert_id'], alert['server_name'], alert.get('team') or 'Unknown',
+                 call_result['contact_name'], call_result['contact_type'], call_result['phone'], placed_at))
+
+    def update_status(self, call_sid, status, at, duration=None):
+        """
+        Returns False if the call is unknown
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE calls SET status = ?,"
+                " answered_at = CASE WHEN ? = 'in-progress' THEN COALESCE(answered_at, ?) ELSE answered_at END,"
+                " completed_at = CASE WHEN ? THEN COALESCE(completed_at, ?) ELSE completed_at END,"
+                " duration = COALESCE(?, duration) WHERE call_sid = ?",
+                (status, status, at, status in CALL_FINAL_STATUSES, at, duration, call_sid))
+            return cursor.rowcount > 0
+
+    def acknowledge(self, call_sid, at):
+        """
+        Mark the call acknowledged (first keypress wins) and return its alert, or None if the call is unknown
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE calls SET acknowledged_at = COALESCE(acknowledged_at, ?), answered_at = COALESCE(answered_at, ?)"
+                " WHERE call_sid = ?", (at, at, call_sid))
+            if not cursor.rowcount:
+                return None
+            alert_id = self._conn.execute("SELECT alert_id FROM calls WHERE call_sid = ?", (call_sid,)).fetchone()[0]
+        return self.find_alert(alert_id)
+
+    def is_acknowledged(self, alert_id):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM calls WHERE alert_id = ? AND acknowledged_at IS NOT NULL LIMIT 1", (alert_id,)).fetchone() is not None
+
+    def find_alert(self, alert_id=None, call_sid=None):
+        """
+        The alert a call belongs to, with the sids of all its calls, or None if nothing was tracked for it
+        """
+        with self._lock:
+            if alert_id is None:
+                row = self._conn.execute("SELECT alert_id FROM calls WHERE call_sid = ?", (call_sid,)).fetchone()
+                if row is None:
+                    return None
+                alert_id = row[0]
+            rows = self._conn.execute(
+                "SELECT call_sid, server_name, team FROM calls WHERE alert_id = ? ORDER BY placed_at", (alert_id,)).fetchall()
+        if not rows:
+            return None
+        return {'alert_id': alert_id, 'server_name': rows[0][1], 'team': rows[0][2], 'call_sids': [row[0] for row in rows]}
+
+    def ack_stats(self, team=None, server_name=None, since=None):
+        """
+        Per team and server: alerts paged, how many were acknowledged and the mean seconds
+        from the first call of an alert to its first acknowledgement
+        """
+        where, params = ["placed_at >= ?"], [since or 0]
+        if team:
+            where.append("team = ?")
+            params.append(team)
+        if server_name:
+            where.append("server_name = ?")
+            params.append(server_name)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT team, server_name, COUNT(*), COUNT(acknowledged_at), AVG(acknowledged_at - first_placed_at),"
+                " MAX(acknowledged_at - first_placed_at)"
+                " FROM (SELECT alert_id, MIN(team) AS team, MIN(server_name) AS server_name,"
+                "       MIN(placed_at) AS first_placed_at, MIN(acknowledged_at) AS acknowledged_at"
+                "       FROM calls WHERE " + " AND ".join(where) + " GROUP BY alert_id)"
+                " GROUP BY team, server_name ORDER BY team, server_name", params).fetchall()
+        return [{
+            'team': row[0],
+            'server': row[1],
+            'alerts': row[2],
+            'acknowledged': row[3],
+            'mean_time_to_acknowledge_seconds': None if row[4] is None else round(row[4], 1),
+            'max_time_to_acknowledge_seconds': None if row[5] is None else round(row[5], 1)
+        } for row in rows]
+
+
+_call_store = None
+
+
+def get_call_store():
+    global _call_store
+    if _call_store is None:
+        _call_store = SqliteCallStore()
+    return _call_store
+
+
+def set_call_store(store):
+    """
+    Plug in a different call tracking backend (or None to go back to the SQLite default)
+    """
+    global _call_store
+    _call_store = store
+
+
+def track_call(alert, call_result):
+    """
+    Remember a placed call under its alert, so callbacks can find it
+    """
+    if alert is None or not call_result.get('success') or call_result.get('duplicate') or not call_tracking_enabled():
+        return
+    call_sid = call_result.get('call_sid')
+    if call_sid and call_sid != 'unknown':
+        get_call_store().record(call_sid, alert, call_result, time.time())
+
+
+def alert_acknowledged(alert):
+    return alert is not None and call_tracking_enabled() and get_call_store().is_acknowledged(alert['alert_id'])
+
+
+def escalation_alert(escalation):
+    """
+    The tracked alert an escalation or queued retry belongs to, or None
+    """
+    if not call_tracking_enabled():
+        return None
+    sid = escalation['primary_call_sid']
+    if sid.startswith(f"{RETRY_QUEUE_SID}:"):
+        alert_id = sid[len(RETRY_QUEUE_SID) + 1:]
+        # Every call of the alert may have been queued, so nothing tracked yet
+        return get_call_store().find_alert(alert_id) or {'alert_id': alert_id, 'server_name': escalation['server_name'], 'team': 'Unknown'}
+    return get_call_store().find_alert(call_sid=sid)
+
+
+def acknowledgement_report(team=None, server_name=None, since=None):
+    """
+    Mean time-to-acknowledge per team and server for alerts paged since the given epoch seconds
+    """
+    return get_call_store().ack_stats(team, server_name, since)
+
+
+# TwiML voice settings, the template is compiled once per container
+TWIML_VOICE = os.environ.get('TWIML_VOICE', 'alice')
+TWIML_LANGUAGE = os.environ.get('TWIML_LANGUAGE', 'en-US')
+TWIML_RATE = os.environ.get('TWIML_RATE', 'slow')
+TWIML_REPEAT = max(1, int(os.environ.get('TWIML_REPEAT', '2')))  # times the alert message is read out
+
+
+def compile_twiml_template(voice=TWIML_VOICE, language=TWIML_LANGUAGE, rate=TWIML_RATE, repeat=TWIML_REPEAT):
+    """
+    Build the alert call TwiML with $message and $gather_action placeholders
+    """
+    say = f'<Say voice="{xml_escape(voice, _XML_ATTR)}" rate="{xml_escape(rate, _XML_ATTR)}" language="{xml_escape(language, _XML_ATTR)}">'
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>', '<Response>']
+    for i in range(repeat):
+        if i:
+            lines.append(f'    {say}I will repeat this message.</Say>')
+            lines.append('    <Pause length="1"/>')
+        lines.append(f'    {say}$message</Say>')
+        lines.append('    <Pause length="3"/>' if i == 0 and repeat > 1 else '    <Pause length="2"/>')
+    lines += [
+        f'    {say}Press any key to confirm you received this alert.</Say>',
+        '    <Gather input="dtmf" timeout="15" numDigits="1"$gather_action>',
+        f'        <Say voice="{xml_escape(voice, _XML_ATTR)}" rate="{xml_escape(rate, _XML_ATTR)}">Thank you. Alert confirmed. Goodbye.</Say>',
+        '    </Gather>',
+        f'    <Say voice="{xml_escape(voice, _XML_ATTR)}" rate="{xml_escape(rate, _XML_ATTR)}">No response received. Please check your servers immediately. Goodbye.</Say>',
+        '</Response>'
+    ]
+    return string.Template('\n'.join(lines))
+
+
+_XML_ATTR = {'"': '&quot;'}
+
+TWIML_TEMPLATES = {
+    'alert': compile_twiml_template()
+}
+
+
+@functools.lru_cache(maxsize=256)
+def render_twiml(message, template='alert', ack_url=None):
+    """
+    Render a compiled TwiML template with XML-escaped values, memoized per (message, template)
+    """
+    ack_url = os.environ.get('TWILIO_ACK_URL', '') if ack_url is None else ack_url
+    # Send the keypress back to us so pending escalations can be cancelled
+    gather_action = f' action="{xml_escape(ack_url, _XML_ATTR)}" method="POST"' if ack_url else ''
+    return TWIML_TEMPLATES[template].substitute(message=xml_escape(message), gather_action=gather_action)
+
+
+@functools.lru_cache(maxsize=256)
+def encoded_call_fields(message, from_number, template='alert'):
+    """
+    The url-encoded call-creation fields shared by every recipient of an alert
+    """
+    fields = {'From': from_number, 'Twiml': render_twiml(message, template)}
+    status_url = status_callback_url()
+    if status_url:
+        # Answered and completed events feed the call tracking store
+        fields.update({'StatusCallback': status_url, 'StatusCallbackEvent': list(CALL_STATUS_EVENTS),
+                       'StatusCallbackMethod': 'POST'})
+    return urllib.parse.urlencode(fields, doseq=True)
+
+
+@functools.lru_cache(maxsize=1)
+def twilio_client_config():
+    """
+    Twilio credentials, Calls/Messages endpoints and request headers, built on first use
+    Returns None if credentials are missing (call twilio_client_config.cache_clear() after changing them)
+    """
+    account_sid = os.environ.get('TWILIO_ACCOUNT_SID')
+    auth_token = os.environ.get('TWILIO_AUTH_TOKEN')
+    from_number = os.environ.get('TWILIO_FROM_NUMBER')
+    if not all([account_sid, auth_token, from_number]):
+        return None
+
+    # Add authentication header
+    auth_b64 = base64.b64encode(f"{account_sid}:{auth_token}".encode('ascii')).decode('ascii')
+    return {
+        'from_number': from_number,
+        'calls_url': f"{TWILIO_API_BASE}/2010-04-01/Accounts/{account_sid}/Calls.json",
+        'messages_url': f"{TWILIO_API_BASE}/2010-04-01/Accounts/{account_sid}/Messages.json",
+        'headers': {
+            'Authorization': f'Basic {auth_b64}',
+            'Content-Type': 'application/x-www-form-urlencoded'
+        }
+    }
+
 
-def make_twilio_call(to_number, message, contact_name, contact_type):
+def make_twilio_call(to_number, message, contact_name, contact_type, timeout=CALL_TIMEOUT):
     """
     Make a call using Twilio API
     """
     try:
-        # Get Twilio credentials from environment variables
-        account_sid =  os.environ.get('TWILIO_ACCOUNT_SID')
-        auth_token =  os.environ.get('TWILIO_AUTH_TOKEN')
-        from_number = os.environ.get('TWILIO_FROM_NUMBER')
+        # Credentials, endpoint and auth header are read once per container
+        config = twilio_client_config()
         
-        if not all([account_sid, auth_token, from_number]):
+        if config is None:
             logger.error("Missing Twilio credentials in environment variables")
             return {
                 'success': False,
@@ -377,95 +3149,24 @@ def make_twilio_call(to_number, message, contact_name, contact_type):
                 'error': 'Missing Twilio credentials'
             }
         
-        # Twilio API endpoint
-        url = f"https://api.twilio.com/2010-04-01/Accounts/{account_sid}/Calls.json"
-        
-        # Create TwiML for text-to-speech with clearer settings
-        twiml = f"""<?xml version="1.0" encoding="UTF-8"?>
-<Response>
-    <Say voice="alice" rate="slow" language="en-US">{message}</Say>
-    <Pause length="3"/>
-    <Say voice="alice" rate="slow" language="en-US">I will repeat this message.</Say>
-    <Pause length="1"/>
-    <Say voice="alice" rate="slow" language="en-US">{message}</Say>
-    <Pause length="2"/>
-    <Say voice="alice" rate="slow" language="en-US">Press any key to confirm you received this alert.</Say>
-    <Gather input="dtmf" timeout="15" numDigits="1">
-        <Say voice="alice" rate="slow">Thank you. Alert confirmed. Goodbye.</Say>
-    </Gather>
-    <Say voice="alice" rate="slow">No response received. Please check your servers immediately. Goodbye.</Say>
-</Response>"""
-        
-        # Prepare the data for the POST request
-        data = {
-            'To': to_number,
-            'From': from_number,
-            'Twiml': twiml,
-            'StatusCallback': '',  # Optional: Add webhook URL for call status
-            'StatusCallbackEvent': 'completed',
-            'StatusCallbackMethod': 'POST'
-        }
-        
-        # Encode the data
-        encoded_data = urllib.parse.urlencode(data).encode('utf-8')
-        
-        # Create the request
-        request = urllib.request.Request(url, data=encoded_data, method='POST')
-        
-        # Add authentication header
-        auth_string = f"{account_sid}:{auth_token}"
-        auth_bytes = auth_string.encode('ascii')
-        auth_b64 = base64.b64encode(auth_bytes).decode('ascii')
-        request.add_header('Authorization', f'Basic {auth_b64}')
-        request.add_header('Content-Type', 'application/x-www-form-urlencoded')
-        request.add_header('User-Agent', 'AWS Lambda Server Monitor')
+        # TwiML and the shared form fields are rendered once per message and reused for every recipient
+        encoded_data = (urllib.parse.urlencode({'To': to_number}) + '&' + encoded_call_fields(message, config['from_number'])).encode('utf-8')
         
         # Make the request
         try:
-            with urllib.request.urlopen(request, timeout=30) as response:
-                response_data = response.read().decode('utf-8')
-                
-                if response.status == 201:  # Twilio returns 201 for successful call creation
-                    logger.info(f"✅ Call initiated successfully to {contact_name} ({contact_type}) at {to_number}")
-                    
-                    # Parse response to get call SID
-                    try:
-                        response_json = json.loads(response_data) if response_data.startswith('{') else {}
-                        call_sid = response_json.get('sid', 'unknown')
-                    except:
-                        call_sid = 'unknown'
-                    
-                    return {
-                        'success': True,
-                        'contact_name': contact_name,
-                        'contact_type': contact_type,
-                        'phone': to_number,
-                        'call_sid': call_sid,
-                        'message': 'Call initiated successfully'
-                    }
-                else:
-                    logger.error(f"❌ Twilio API error: HTTP {response.status} - {response_data}")
-                    return {
-                        'success': False,
-                        'contact_name': contact_name,
-                        'contact_type': contact_type,
-                        'phone': to_number,
-                        'error': f'HTTP {response.status}: {response_data}'
-                    }
-                    
-        except urllib.error.HTTPError as e:
-            error_response = e.read().decode('utf-8') if e.fp else str(e)
-            logger.error(f"❌ HTTP error calling {contact_name}: {e.code} {e.reason} - {error_response}")
+            response = http_request('POST', config['calls_url'], body=encoded_data, headers=config['headers'], read_timeout=timeout)
+        except DeadlineExceeded as e:
+            logger.error("❌ No time left to call %s: %s", mask_name(contact_name), e)
             return {
                 'success': False,
                 'contact_name': contact_name,
                 'contact_type': contact_type,
                 'phone': to_number,
-                'error': f'HTTP {e.code}: {error_response}'
+                'error': 'Deadline exceeded',
+                'not_sent': True
             }
-            
-        except urllib.error.URLError as e:
-            logger.error(f"❌ Network error calling {contact_name}: {str(e)}")
+        except TransportError as e:
+            logger.error("❌ Network error calling %s: %s", mask_name(contact_name), e)
             return {
                 'success': False,
                 'contact_name': contact_name,
@@ -473,9 +3174,50 @@ def make_twilio_call(to_number, message, contact_name, contact_type):
                 'phone': to_number,
                 'error': f'Network error: {str(e)}'
             }
+        
+        response_data = response.text()
+        if response.status == 201:  # Twilio returns 201 for successful call creation
+            logger.info("✅ Call initiated successfully to %s (%s) at %s", mask_name(contact_name), contact_type, to_number)
+            
+            # Parse response to get call SID
+            try:
+                response_json = json.loads(response_data) if response_data.startswith('{') else {}
+                call_sid = response_json.get('sid', 'unknown')
+            except:
+                call_sid = 'unknown'
+            
+            return {
+                'success': True,
+                'contact_name': contact_name,
+                'contact_type': contact_type,
+                'phone': to_number,
+                'call_sid': call_sid,
+                'message': 'Call initiated successfully'
+            }
+        
+        if response.status == 429:
+            # Throttled by Twilio, the call was not created and can be retried
+            logger.warning("⏳ Twilio throttled the call to %s", mask_name(contact_name))
+            return {
+                'success': False,
+                'contact_name': contact_name,
+                'contact_type': contact_type,
+                'phone': to_number,
+                'error': f'HTTP 429: {response_data}',
+                'retry_after': parse_retry_after(response.headers.get('retry-after'))
+            }
+        
+        logger.error("❌ HTTP error calling %s: %s %s - %s", mask_name(contact_name), response.status, response.reason, response_data)
+        return {
+            'success': False,
+            'contact_name': contact_name,
+            'contact_type': contact_type,
+            'phone': to_number,
+            'error': f'HTTP {response.status}: {response_data}'
+        }
             
     except Exception as e:
-        logger.error(f"❌ Unexpected error making call to {contact_name}: {str(e)}")
+        logger.error("❌ Unexpected error making call to %s: %s", mask_name(contact_name), e)
         return {
             'success': False,
             'contact_name': contact_name,
@@ -484,31 +3226,670 @@ def make_twilio_call(to_number, message, contact_name, contact_type):
             'error': f'Unexpected error: {str(e)}'
         }
 
-def create_call_message(alarm_data):
+# Providers: where contacts come from and how calls are placed.
+# 'sheets'/'twilio' talk to the live services, 'fake' uses the local stand-ins below.
+CONTACT_SOURCE = os.environ.get('CONTACT_SOURCE', 'sheets').lower()
+VOICE_DIALER = os.environ.get('VOICE_DIALER', 'twilio').lower()
+
+
+class SheetsContactSource:
     """
-    Create the voice message for emergency calls
+    Contact rows from the Google Sheets Apps Script API
     """
-    server_name = alarm_data['server_name']
-    timestamp_str = alarm_data['timestamp']
-    
-    # Parse timestamp to make it more readable
+
+    def fetch_records(self, server_name=None):
+        return fetch_sheet_records(server_name)
+
+    def fetch_changes(self, version=None, etag=None):
+        return fetch_sheet_changes(version, etag)
+
+    def iter_records(self, server_name=None):
+        return iter_sheet_records(server_name)
+
+
+class TwilioVoiceDialer:
+    """
+    Voice calls through the Twilio REST API
+    """
+
+    def place_call(self, to_number, message, contact_name, contact_type, timeout=CALL_TIMEOUT):
+        return make_twilio_call(to_number, message, contact_name, contact_type, timeout=timeout)
+
+
+class FakeLatency:
+    """
+    Latency, error and throttling behaviour shared by the local stand-ins
+    Latency is drawn uniformly from latency_ms=(low, high), rates are probabilities per request
+    """
+
+    def __init__(self, latency_ms=(0, 0), error_rate=0.0, throttle_rate=0.0, seed=None):
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def simulate(self):
+        """
+        Sleep for the simulated latency, then return None, 'error' or 'throttled'
+        """
+        with self._lock:
+            delay = self._random.uniform(*self.latency_ms) / 1000.0
+            roll = self._random.random()
+        time.sleep(delay)
+        if roll < self.throttle_rate:
+            return 'throttled'
+        if roll < self.throttle_rate + self.error_rate:
+            return 'error'
+        return None
+
+    @classmethod
+    def from_env(cls, prefix):
+        """
+        Build from <prefix>_LATENCY_MS ("low,high"), <prefix>_ERROR_RATE and <prefix>_THROTTLE_RATE
+        """
+        latency = [float(v) for v in os.environ.get(f'{prefix}_LATENCY_MS', '0,0').split(',')]
+        return cls(
+            latency_ms=(latency[0], latency[-1]),
+            error_rate=float(os.environ.get(f'{prefix}_ERROR_RATE', '0')),
+            throttle_rate=float(os.environ.get(f'{prefix}_THROTTLE_RATE', '0')),
+            seed=os.environ.get('FAKE_SEED')
+        )
+
+
+class FakeContactSource:
+    """
+    In-memory contact sheet for offline runs, with simulated API latency and failures
+    """
+
+    def __init__(self, records=None, behaviour=None):
+        self.records = generate_fake_contact_rows(int(os.environ.get('FAKE_CONTACT_ROWS', '100'))) if records is None else records
+        self.behaviour = behaviour or FakeLatency()
+        self.requests = 0
+        self.version = 0
+        self._changed_at = {}  # row position -> version it last changed in
+
+    def update_records(self, changes):
+        """
+        Edit the sheet as {row position: new row, or None to delete it}, tracked for fetch_changes
+        """
+        self.version += 1
+        for position, record in changes.items():
+            if position >= len(self.records):
+                self.records.extend([None] * (position + 1 - len(self.records)))
+            self.records[position] = record
+            self._changed_at[position] = self.version
+
+    def _simulate(self):
+        self.requests += 1
+        outcome = self.behaviour.simulate()
+        if outcome == 'throttled':
+            raise SheetsFetchError("HTTP 429: Too Many Requests")
+        if outcome == 'error':
+            raise SheetsFetchError("HTTP 500: Simulated failure")
+
+    def fetch_records(self, server_name=None):
+        self._simulate()
+        if server_name is None:
+            return [record for record in self.records if record is not None]
+        wanted = server_key(server_name)
+        return [record for record in self.records
+                if record is not None and server_key(record.get('Server Name', '')) == wanted]
+
+    def iter_records(self, server_name=None):
+        yield from self.fetch_records(server_name)
+
+    def fetch_changes(self, version=None, etag=None):
+        self._simulate()
+        if version is None:
+            rows = [dict(record, _row=i) for i, record in enumerate(self.records) if record is not None]
+            return {'full': True, 'records': rows, 'deleted': [], 'version': self.version, 'etag': None}
+        changed = [i for i, changed_at in self._changed_at.items() if changed_at > version]
+        return {
+            'full': False,
+            'records': [dict(self.records[i], _row=i) for i in changed if self.records[i] is not None],
+            'deleted': [i for i in changed if self.records[i] is None],
+            'version': self.version,
+            'etag': None
+        }
+
+
+class FakeVoiceDialer:
+    """
+    Records calls instead of placing them, with simulated Twilio latency, errors and 429s
+    Results have the same shape as make_twilio_call
+    """
+
+    def __init__(self, behaviour=None):
+        self.behaviour = behaviour or FakeLatency()
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def place_call(self, to_number, message, contact_name, contact_type, timeout=CALL_TIMEOUT):
+        outcome = self.behaviour.simulate()
+        result = {
+            'success': outcome is None,
+            'contact_name': contact_name,
+            'contact_type': contact_type,
+            'phone': to_number
+        }
+        if outcome == 'throttled':
+            result['error'] = 'HTTP 429: Too Many Requests'
+            result['retry_after'] = 1.0
+        elif outcome == 'error':
+            result['error'] = 'HTTP 500: Simulated failure'
+        with self._lock:
+            self.calls.append({'to_number': to_number, 'contact_name': contact_name,
+                               'contact_type': contact_type, 'outcome': outcome or 'initiated',
+                               'at': time.time()})
+            if outcome is None:
+                result['call_sid'] = f"CAFAKE{len(self.calls):08d}"
+                result['message'] = 'Call initiated successfully'
+        return result
+
+
+def generate_fake_contact_rows(count, servers_prefix='server'):
+    """
+    Synthetic contact sheet rows for servers named '<servers_prefix>-<n>'
+    """
+    return [{
+        'Server Name': f'{servers_prefix}-{i}',
+        'Team': f'team-{i % 10}',
+        'Primary Contact': f'Primary {i}',
+        'Phone Number': f'98{i:08d}',
+        'Secondary Contact': f'Secondary {i}',
+        'Secondary Phone': f'97{i:08d}',
+        'Escalation Time (mins)': (i % 15) + 1
+    } for i in range(count)]
+
+
+_contact_source = None
+_voice_dialer = None
+
+
+def get_contact_source():
+    global _contact_source
+    if _contact_source is None:
+        if CONTACT_SOURCE == 'fake':
+            _contact_source = FakeContactSource(behaviour=FakeLatency.from_env('FAKE_SHEETS'))
+        else:
+            _contact_source = SheetsContactSource()
+    return _contact_source
+
+
+def get_voice_dialer():
+    global _voice_dialer
+    if _voice_dialer is None:
+        if VOICE_DIALER == 'fake':
+            _voice_dialer = FakeVoiceDialer(behaviour=FakeLatency.from_env('FAKE_TWILIO'))
+        else:
+            _voice_dialer = TwilioVoiceDialer()
+    return _voice_dialer
+
+
+def set_providers(contact_source=None, voice_dialer=None):
+    """
+    Plug in a contact source and/or voice dialer (None goes back to the configured default)
+    """
+    global _contact_source, _voice_dialer
+    _contact_source = contact_source
+    _voice_dialer = voice_dialer
+
+
+# Outbound call pacing: a token bucket shared by every call placed from this container.
+# CALL_RATE_LIMIT is calls per second (0 = unlimited), Twilio's Retry-After always pauses the bucket.
+CALL_RATE_LIMIT = float(os.environ.get('CALL_RATE_LIMIT', '0'))
+CALL_RATE_BURST = float(os.environ.get('CALL_RATE_BURST', '0'))
+CALL_THROTTLE_RETRIES = int(os.environ.get('CALL_THROTTLE_RETRIES', '3'))
+# A call with the same number and message inside this window is never placed twice
+CALL_IDEMPOTENCY_TTL = int(os.environ.get('CALL_IDEMPOTENCY_TTL', '900'))
+# Servers matching this regex are paged ahead of everyone else
+CRITICAL_SERVER_PATTERN = os.environ.get('CRITICAL_SERVER_PATTERN', '')
+
+_critical_server_re = re.compile(CRITICAL_SERVER_PATTERN, re.IGNORECASE) if CRITICAL_SERVER_PATTERN else None
+
+
+def is_critical_server(server_name):
+    return _critical_server_re is not None and _critical_server_re.search(server_name or '') is not None
+
+
+def call_priority(contact_type, critical=False):
+    """
+    Lower goes first: critical primaries, critical secondaries, primaries, secondaries
+    """
+    return (0 if critical else 2) + (0 if contact_type == 'Primary' else 1)
+
+
+def parse_retry_after(value, default=1.0):
     try:
-        dt = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-        readable_time = dt.strftime('%B %d at %I:%M %p UTC')
-    except:
-        readable_time = timestamp_str
-    
-    message = f"""
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return default
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket that hands out tokens to waiters in priority order
+
+        if bucket.acquire(priority=0, timeout=5):
+            ...
+    """
+
+    def __init__(self, rate, burst=0):
+        self.rate = rate
+        self.capacity = max(1.0, burst or rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._cond = threading.Condition()
+        self._waiters = []
+        self._tickets = itertools.count()
+
+    def pause(self, seconds):
+        """
+        Hand out no tokens for the next seconds, e.g. after a 429 with Retry-After
+        """
+        with self._cond:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def _wait_time(self, now):
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.rate <= 0:
+            return 0.0
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def acquire(self, priority=0, timeout=None):
+        """
+        Wait for a token, returns False if none was available within timeout seconds
+        """
+        ticket = (priority, next(self._tickets))
+        give_up = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            heapq.heappush(self._waiters, ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = self._wait_time(now) if self._waiters[0] == ticket else None
+                    if wait == 0:
+                        if self.rate > 0:
+                            self.tokens -= 1
+                        return True
+                    if give_up is not None:
+                        if now >= give_up:
+                            return False
+                        wait = give_up - now if wait is None else min(wait, give_up - now)
+                    self._cond.wait(wait)
+            finally:
+                self._waiters.remove(ticket)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+
+
+_call_rate_limiter = None
+_call_ledger = {}  # (alert id or message, to_number) -> (expires_at, result, or None while the call is in flight)
+_call_ledger_lock = threading.Lock()
+
+
+def get_call_rate_limiter():
+    global _call_rate_limiter
+    if _call_rate_limiter is None:
+        _call_rate_limiter = TokenBucket(CALL_RATE_LIMIT, CALL_RATE_BURST)
+    return _call_rate_limiter
+
+
+def set_call_rate_limit(rate, burst=0):
+    """
+    Replace the container's call rate limiter, e.g. to match the Twilio account's calls per second
+    """
+    global _call_rate_limiter
+    _call_rate_limiter = TokenBucket(rate, burst)
+
+
+def _claim_call(key):
+    """
+    Reserve an idempotency key, returns the earlier call's entry if it is already taken
+    """
+    now = time.monotonic()
+    with _call_ledger_lock:
+        entry = _call_ledger.get(key)
+        if entry is not None and entry[0] > now:
+            return entry
+        if len(_call_ledger) >= 1024:
+            for stale in [k for k, (expires_at, _) in _call_ledger.items() if expires_at <= now]:
+                del _call_ledger[stale]
+        _call_ledger[key] = (now + CALL_TIMEOUT + CALL_IDEMPOTENCY_TTL, None)
+        return None
+
+
+def _release_call(key, result):
+    with _call_ledger_lock:
+        if result is not None and result['success']:
+            _call_ledger[key] = (time.monotonic() + CALL_IDEMPOTENCY_TTL, result)
+        else:
+            # Nobody was dialled, a retry must be allowed through
+            _call_ledger.pop(key, None)
+
+
+def clear_call_ledger():
+    with _call_ledger_lock:
+        _call_ledger.clear()
+
+
+def place_call(to_number, message, contact_name, contact_type, timeout=CALL_TIMEOUT, priority=None,
+               idempotency_key=None):
+    """
+    Place a voice call through the configured dialer, paced by the call rate limiter
+    429s are retried after Retry-After while time allows, and the same number is never
+    dialled twice for the same alert (idempotency_key, see alert_id_for), or for the same
+    message when there is no alert
+    A skipped repeat returns the earlier result marked duplicate=True
+    """
+    call = {'to_number': to_number, 'contact_name': contact_name, 'contact_type': contact_type}
+    key = (idempotency_key or message, to_number)
+    previous = _claim_call(key)
+    if previous is not None:
+        logger.warning("Skipping duplicate call to %s (%s)", mask_name(contact_name), contact_type)
+        count_metric('calls_deduplicated')
+        earlier = previous[1] or {'success': False, 'phone': to_number, 'error': 'Duplicate of a call in progress'}
+        return dict(earlier, contact_name=contact_name, contact_type=contact_type, duplicate=True)
+
+    limiter = get_call_rate_limiter()
+    priority = call_priority(contact_type) if priority is None else priority
+    result = None
+    try:
+        for attempt in range(CALL_THROTTLE_RETRIES + 1):
+            remaining = deadline_remaining()
+            if not limiter.acquire(priority, timeout=None if remaining is None else max(0.0, remaining - CALL_MIN_BUDGET)):
+                logger.error("❌ Deadline reached waiting to call %s (%s)", mask_name(contact_name), contact_type)
+                result = not_sent_result(call)
+                break
+            with span('twilio_calls'):
+                result = get_voice_dialer().place_call(to_number, message, contact_name, contact_type, timeout=timeout)
+            if 'retry_after' not in result:
+                break
+            # Throttled: nothing was created, hold back every caller and try again
+            count_metric('calls_throttled')
+            limiter.pause(result['retry_after'])
+        else:
+            result['not_sent'] = True
+    finally:
+        _release_call(key, result)
+
+    if result['success']:
+        count_metric('calls_initiated')
+    elif not result.get('not_sent'):
+        count_metric('calls_failed')
+    return result
+
+
+# Notification channels dispatched alongside the voice calls, e.g. NOTIFY_CHANNELS=sms,chat,email.
+# A channel is any object with a name, a timeout in seconds and send(alert, timeout) -> result dict.
+NOTIFY_CHANNELS = [name.strip().lower() for name in os.environ.get('NOTIFY_CHANNELS', '').split(',') if name.strip()]
+NOTIFY_MAX_WORKERS = int(os.environ.get('NOTIFY_MAX_WORKERS', '8'))
+
+
+class TwilioSmsChannel:
+    """
+    A text to every primary contact's phone through the Twilio Messages API
+    Secondaries are left to the escalation call, so they are not woken before it is due
+    """
+    name = 'sms'
+
+    def __init__(self, timeout=None):
+        self.timeout = float(os.environ.get('SMS_TIMEOUT', '5')) if timeout is None else timeout
+
+    def send(self, alert, timeout):
+        config = twilio_client_config()
+        if config is None:
+            return {'success': False, 'error': 'Missing Twilio credentials'}
+
+        phones = list(dict.fromkeys(contact['primary_phone'] for contact in alert['contacts'] if contact['primary_phone']))
+        sent, errors = 0, []
+        for i, phone in enumerate(phones):
+            body = urllib.parse.urlencode({'To': phone, 'From': config['from_number'], 'Body': alert['text']}).encode('utf-8')
+            try:
+                # Every text shares the channel's timeout, see send_notification
+                response = http_request('POST', config['messages_url'], body=body, headers=config['headers'],
+                                        read_timeout=deadline_remaining(timeout))
+            except DeadlineExceeded:
+                errors.append(f'{len(phones) - i} not sent: timed out')
+                break
+            except TransportError as e:
+                errors.append(str(e))
+                continue
+            if response.status == 201:
+                sent += 1
+            else:
+                errors.append(f'HTTP {response.status}')
+        result = {'success': sent > 0, 'sent': sent, 'recipients': len(phones)}
+        if errors:
+            result['error'] = '; '.join(errors[:3])
+        return result
+
+
+class ChatWebhookChannel:
+    """
+    A message posted to a chat incoming webhook (Slack, Mattermost, Teams and Google Chat all accept {"text": ...})
+    """
+    name = 'chat'
+
+    def __init__(self, url=None, timeout=None):
+        self.url = url or os.environ.get('CHAT_WEBHOOK_URL')
+        self.timeout = float(os.environ.get('CHAT_WEBHOOK_TIMEOUT', '3')) if timeout is None else timeout
+
+    def send(self, alert, timeout):
+        if not self.url:
+            return {'success': False, 'error': 'CHAT_WEBHOOK_URL is not set'}
+        response = http_request('POST', self.url, body=json.dumps({'text': alert['text']}).encode('utf-8'),
+                                headers={'Content-Type': 'application/json'}, read_timeout=timeout)
+        if 200 <= response.status < 300:
+            return {'success': True}
+        return {'success': False, 'error': f'HTTP {response.status}: {response.text()[:200]}'}
+
+
+class EmailRelayChannel:
+    """
+    An email to the alert distribution list through an SMTP relay
+    """
+    name = 'email'
+
+    def __init__(self, host=None, port=None, sender=None, recipients=None, timeout=None):
+        self.host = host or os.environ.get('EMAIL_RELAY_HOST')
+        self.port = port or int(os.environ.get('EMAIL_RELAY_PORT', '25'))
+        self.sender = sender or os.environ.get('EMAIL_FROM', 'alerts@localhost')
+        self.recipients = recipients or [r.strip() for r in os.environ.get('ALERT_EMAIL_TO', '').split(',') if r.strip()]
+        self.starttls = os.environ.get('EMAIL_RELAY_STARTTLS', 'false').lower() == 'true'
+        self.username = os.environ.get('EMAIL_RELAY_USERNAME')
+        self.password = os.environ.get('EMAIL_RELAY_PASSWORD')
+        self.timeout = float(os.environ.get('EMAIL_RELAY_TIMEOUT', '5')) if timeout is None else timeout
+
+    def send(self, alert, timeout):
+        if not (self.host and self.recipients):
+            return {'success': False, 'error': 'EMAIL_RELAY_HOST or ALERT_EMAIL_TO is not set'}
+        # Only needed when email is enabled, kept off the cold-start path
+        import smtplib
+        from email.message import EmailMessage
+
+        message = EmailMessage()
+        message['Subject'] = f"ALERT: {alert['server_name']} is down"
+        message['From'] = self.sender
+        message['To'] = ', '.join(self.recipients)
+        message.set_content(alert['text'] + '\n\nOn call:\n' + '\n'.join(
+            f"- {contact['primary_contact']} ({contact['team']}), secondary {contact['secondary_contact'] or 'none'}"
+            for contact in alert['contacts']))
+        with smtplib.SMTP(self.host, self.port, timeout=timeout) as smtp:
+            if self.starttls:
+                smtp.starttls(context=_get_ssl_context())
+            if self.username:
+                smtp.login(self.username, self.password or '')
+            smtp.send_message(message)
+        return {'success': True, 'recipients': len(self.recipients)}
+
+
+class FakeChannel:
+    """
+    Records notifications instead of sending them, with simulated latency and failures
+    """
+
+    def __init__(self, name='fake', behaviour=None, timeout=5.0):
+        self.name = name
+        self.behaviour = behaviour or FakeLatency()
+        self.timeout = timeout
+        self.sent = []
+        self._lock = threading.Lock()
+
+    def send(self, alert, timeout):
+        outcome = self.behaviour.simulate()
+        with self._lock:
+            self.sent.append({'server_name': alert['server_name'], 'text': alert['text'], 'at': time.time()})
+        if outcome is None:
+            return {'success': True}
+        return {'success': False, 'error': 'HTTP 429: Too Many Requests' if outcome == 'throttled' else 'Simulated failure'}
+
+
+NOTIFICATION_CHANNEL_TYPES = {
+    'sms': TwilioSmsChannel,
+    'chat': ChatWebhookChannel,
+    'email': EmailRelayChannel,
+    'fake': lambda: FakeChannel(behaviour=FakeLatency.from_env('FAKE_CHANNEL')),
+}
+
+_notification_channels = None
+_notification_executor = None
+
+
+def get_notification_channels():
+    global _notification_channels
+    if _notification_channels is None:
+        channels = []
+        for name in NOTIFY_CHANNELS:
+            if name in NOTIFICATION_CHANNEL_TYPES:
+                channels.append(NOTIFICATION_CHANNEL_TYPES[name]())
+            else:
+                logger.warning(f"Unknown notification channel '{name}' ignored")
+        _notification_channels = channels
+    return _notification_channels
+
+
+def set_notification_channels(channels=None):
+    """
+    Plug in a list of channels (None goes back to NOTIFY_CHANNELS)
+    """
+    global _notification_channels
+    _notification_channels = channels
+
+
+def start_notifications(contacts, alarm_data):
+    """
+    Send the alert on every configured channel in the background
+    Returns what collect_notifications() needs, empty when no channels are configured
+    """
+    channels = get_notification_channels()
+    if not channels:
+        return []
+
+    global _notification_executor
+    if _notification_executor is None:
+        import concurrent.futures  # only needed with channels configured, kept off the cold-start path
+        _notification_executor = concurrent.futures.ThreadPoolExecutor(max_workers=NOTIFY_MAX_WORKERS,
+                                                                       thread_name_prefix='notify')
+    alert = {
+        'server_name': alarm_data['server_name'],
+        'alarm_data': alarm_data,
+        'contacts': contacts,
+        'text': create_text_message(alarm_data, contacts)
+    }
+    return [(channel, time.perf_counter(), _notification_executor.submit(bind_metrics(send_notification), channel, alert))
+            for channel in channels]
+
+
+def send_notification(channel, alert):
+    """
+    Send on one channel within its timeout, returning its result with latency_ms
+    The timeout bounds the whole send, every request and retry the channel makes included
+    """
+    started = time.perf_counter()
+    timeout = max(0.1, min(channel.timeout, deadline_remaining(channel.timeout)))
+    previous = current_deadline()
+    _metrics_local.deadline = time.monotonic() + timeout
+    try:
+        with span(f'channel_{channel.name}'):
+            result = channel.send(alert, timeout)
+    except Exception as e:
+        result = {'success': False, 'error': str(e)}
+    finally:
+        _metrics_local.deadline = previous
+    result['latency_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    if result['success']:
+        count_metric(f'channel_{channel.name}_sent')
+    else:
+        count_metric(f'channel_{channel.name}_failed')
+        logger.error("❌ %s notification for %s failed: %s", channel.name, alert['server_name'], result.get('error'))
+    return result
+
+
+def collect_notifications(pending):
+    """
+    Wait for each channel up to its own timeout and return {channel name: result}
+    """
+    import concurrent.futures
+
+    results = {}
+    for channel, started, future in pending:
+        wait = channel.timeout - (time.perf_counter() - started)
+        try:
+            results[channel.name] = future.result(timeout=max(0.0, min(wait, deadline_remaining(wait))))
+        except concurrent.futures.TimeoutError:
+            count_metric(f'channel_{channel.name}_failed')
+            logger.error("❌ %s notification timed out after %ss", channel.name, channel.timeout)
+            results[channel.name] = {'success': False, 'error': 'Timed out',
+                                     'latency_ms': round((time.perf_counter() - started) * 1000, 1)}
+    return results
+
+CALL_MESSAGE_TEMPLATE = ' '.join("""
     URGENT: Server Alert from AWS CloudWatch.
     Server {server_name} is currently down and requires immediate attention.
     The alert was triggered on {readable_time}.
     Please check your monitoring dashboard and take appropriate action immediately.
     This is an automated emergency call from your server monitoring system.
+""".split())
+
+
+def create_call_message(alarm_data):
     """
-    
-    # Clean up the message - remove extra whitespace
-    message = ' '.join(message.split())
-    return message
+    Create the voice message for emergency calls
+    """
+    return _render_call_message(alarm_data['server_name'], alarm_data['timestamp'])
+
+
+@functools.lru_cache(maxsize=256)
+def _render_call_message(server_name, timestamp_str):
+    return CALL_MESSAGE_TEMPLATE.format(server_name=server_name, readable_time=readable_timestamp(timestamp_str))
+
+
+def readable_timestamp(timestamp_str):
+    # Parse timestamp to make it more readable
+    try:
+        dt = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
+        return dt.strftime('%B %d at %I:%M %p UTC')
+    except:
+        return timestamp_str
+
+
+TEXT_MESSAGE_TEMPLATE = "ALERT: {server_name} is DOWN since {readable_time} ({alarm_name}). Calling {on_call} now."
+
+
+def create_text_message(alarm_data, contacts):
+    """
+    Short alert text for SMS, chat and email
+    """
+    on_call = ', '.join(dict.fromkeys(contact['primary_contact'] for contact in contacts)) or 'the on-call team'
+    return TEXT_MESSAGE_TEMPLATE.format(server_name=alarm_data['server_name'],
+                                        readable_time=readable_timestamp(alarm_data['timestamp']),
+                                        alarm_name=alarm_data.get('alarm_name', 'unknown alarm'), on_call=on_call)
 
 # Keep the original function for backward compatibility and testing
 def process_server_alert(contacts, alarm_data):
@@ -546,7 +3927,7 @@ def process_server_alert(contacts, alarm_data):
                 'escalation_delay': 0
             }
             results['contacts_to_call'].append(contact_info)
-            logger.info(f"📞 Primary: {contact['primary_contact']} at {contact['primary_phone']}")
+            logger.info("📞 Primary: %s at %s", mask_name(contact['primary_contact']), contact['primary_phone'])
         
         if contact['secondary_contact'] and contact['secondary_phone']:
             contact_info = {
@@ -556,7 +3937,7 @@ def process_server_alert(contacts, alarm_data):
                 'escalation_delay': contact['escalation_time']
             }
             results['contacts_to_call'].append(contact_info)
-            logger.info(f"📞 Secondary: {contact['secondary_contact']} at {contact['secondary_phone']} (after {contact['escalation_time']} mins)")
+            logger.info("📞 Secondary: %s at %s (after %s mins)", mask_name(contact['secondary_contact']), contact['secondary_phone'], contact['escalation_time'])
         
         logger.info("=== END ALERT ===")
     
@@ -0,0 +1,104 @@
+"""
+Alarm-name parser regressions, checked against the corpus in alarm_names.tsv
+
+    python -m unittest discover tests
+"""
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+import lambda_function as lf
+
+CORPUS = os.path.join(os.path.dirname(__file__), 'alarm_names.tsv')
+
+
+def load_corpus(path=CORPUS):
+    """
+    [(alarm name, parsed server, resolved server)] from the tab-separated corpus, '#' lines are comments
+    """
+    entries = []
+    with open(path) as f:
+        for line in f:
+            if line.strip() and not line.startswith('#'):
+                alarm_name, parsed, *resolved = line.rstrip('\n').split('\t')
+                entries.append((alarm_name, parsed, resolved[0] if resolved else parsed))
+    return entries
+
+
+def contact_row(server_name):
+    return {'Server Name': server_name, 'Team': 'ops', 'Primary Contact': f'Primary {server_name}',
+            'Phone Number': '+919800000001', 'Secondary Contact': '', 'Secondary Phone': '',
+            'Escalation Time (mins)': 5}
+
+
+class AlarmNameCorpusTest(unittest.TestCase):
+
+    def setUp(self):
+        lf.set_alarm_name_rules(None)
+        self.snapshot_path, lf.CONTACT_SNAPSHOT_PATH = lf.CONTACT_SNAPSHOT_PATH, ''
+
+    def tearDown(self):
+        lf.CONTACT_SNAPSHOT_PATH = self.snapshot_path
+        lf.set_providers(None, None)
+        lf.clear_contact_cache()
+
+    def test_corpus(self):
+        parser = lf.AlarmNameParser()
+        for alarm_name, parsed, _ in load_corpus():
+            with self.subTest(alarm_name=alarm_name):
+                self.assertEqual(parser.parse(alarm_name)[0], parsed)
+
+    def test_memoized_lookup_matches_parser(self):
+        for alarm_name, parsed, _ in load_corpus():
+            with self.subTest(alarm_name=alarm_name):
+                self.assertEqual(lf.extract_server_name(alarm_name), parsed)
+
+    def test_resolved_against_contact_sheet(self):
+        corpus = load_corpus()
+        servers = {resolved for _, _, resolved in corpus if resolved != 'unknown-server'} | {'db'}
+        lf.set_providers(lf.FakeContactSource([contact_row(server) for server in sorted(servers)]), None)
+        lf.clear_contact_cache()
+        for alarm_name, parsed, resolved in corpus:
+            with self.subTest(alarm_name=alarm_name):
+                alarm_data = {'server_name': parsed, 'alarm_name': alarm_name}
+                self.assertEqual(lf.resolve_server_name(alarm_data)['server_name'], resolved)
+
+
+class AlarmNameRulesTest(unittest.TestCase):
+
+    def test_multi_word_name_kept_by_default(self):
+        self.assertEqual(lf.AlarmNameParser().parse('db primary is down'), ('db primary', None))
+
+    def test_first_word_fallback_is_opt_in_and_logged(self):
+        with self.assertLogs(level='WARNING') as logs:
+            self.assertEqual(lf.AlarmNameParser({'first_word_fallback': True}).parse('db primary'), ('db', None))
+        self.assertIn("using 'db'", logs.output[0])
+
+    def test_alias_beats_first_word_guess(self):
+        parser = lf.AlarmNameParser({'aliases': {'db primary': 'db-primary-01'}})
+        self.assertEqual(parser.parse('db primary is down'), ('db-primary-01', None))
+
+    def test_team_rule(self):
+        parser = lf.AlarmNameParser({'teams': [{'team': 'dba', 'pattern': '^rds-(?P<server>[a-z0-9-]+)-cpu'}]})
+        self.assertEqual(parser.parse('rds-orders-01-cpu high'), ('orders-01', 'dba'))
+        self.assertEqual(parser.parse('web-01-down'), ('web-01', None))
+
+    def test_rules_from_env_at_import(self):
+        env = dict(os.environ, METRICS_ENABLED='false',
+                   ALARM_NAME_RULES=json.dumps({'aliases': {'db primary': 'db-primary-01'}}))
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        result = subprocess.run([sys.executable, '-c', 'import lambda_function as lf; '
+                                 'print(lf.extract_server_name("db primary is down"))'],
+                                cwd=root, env=env, capture_output=True, text=True, timeout=60)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), 'db-primary-01')
+
+    def test_pattern_without_server_group_is_rejected(self):
+        with self.assertRaises(ValueError):
+            lf.AlarmNameParser({'teams': [{'team': 'dba', 'pattern': '^rds-'}]})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,192 @@
+"""
+Call pacing and deduplication: TokenBucket priority order, 429 retries and the per-alert call ledger
+
+    python -m unittest discover tests
+"""
+import os
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import lambda_function as lf
+
+CALL = {'to_number': '+919800000001', 'contact_name': 'Primary web-01', 'contact_type': 'Primary'}
+
+
+class ScriptedDialer:
+    """
+    Returns the given outcomes in turn ('ok', 'error' or a Retry-After in seconds), then 'ok'
+    """
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+
+    def place_call(self, to_number, message, contact_name, contact_type, timeout=lf.CALL_TIMEOUT):
+        self.calls.append((to_number, message))
+        outcome = self.outcomes.pop(0) if self.outcomes else 'ok'
+        result = {'success': outcome == 'ok', 'contact_name': contact_name, 'contact_type': contact_type,
+                  'phone': to_number}
+        if outcome == 'ok':
+            result['call_sid'] = f'CA{len(self.calls):032d}'
+        elif outcome == 'error':
+            result['error'] = 'HTTP 500: Simulated failure'
+        else:
+            result['error'] = 'HTTP 429: Too Many Requests'
+            result['retry_after'] = outcome
+        return result
+
+
+class DialerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        lf.clear_call_ledger()
+        lf.set_call_rate_limit(0)
+        lf.set_call_store(lf.SqliteCallStore(':memory:'))
+
+    def tearDown(self):
+        lf.clear_call_ledger()
+        lf.set_call_rate_limit(lf.CALL_RATE_LIMIT, lf.CALL_RATE_BURST)
+        lf.set_call_store(None)
+        lf.set_providers(None, None)
+
+    def use_dialer(self, *outcomes):
+        dialer = ScriptedDialer(*outcomes)
+        lf.set_providers(None, dialer)
+        return dialer
+
+
+class TokenBucketTest(unittest.TestCase):
+
+    def test_waiters_served_in_priority_order(self):
+        bucket = lf.TokenBucket(rate=20, burst=1)
+        bucket.pause(0.2)
+        order, lock = [], threading.Lock()
+
+        def take(priority):
+            self.assertTrue(bucket.acquire(priority, timeout=5))
+            with lock:
+                order.append(priority)
+
+        threads = [threading.Thread(target=take, args=(priority,)) for priority in (3, 1, 2, 0)]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.02)  # all of them are queued before the pause ends
+        for thread in threads:
+            thread.join()
+        self.assertEqual(order, [0, 1, 2, 3])
+
+    def test_acquire_times_out_without_tokens(self):
+        bucket = lf.TokenBucket(rate=1, burst=1)
+        self.assertTrue(bucket.acquire(timeout=0))
+        self.assertFalse(bucket.acquire(timeout=0.05))
+
+    def test_pause_holds_back_tokens(self):
+        bucket = lf.TokenBucket(rate=0)
+        bucket.pause(0.2)
+        started = time.monotonic()
+        self.assertTrue(bucket.acquire(timeout=1))
+        self.assertGreaterEqual(time.monotonic() - started, 0.18)
+
+    def test_call_priority(self):
+        priorities = [lf.call_priority('Primary', True), lf.call_priority('Secondary', True),
+                      lf.call_priority('Primary'), lf.call_priority('Secondary')]
+        self.assertEqual(priorities, sorted(priorities))
+        self.assertEqual(len(set(priorities)), 4)
+
+
+class ThrottleRetryTest(DialerTestCase):
+
+    def test_429_is_retried_after_retry_after(self):
+        dialer = self.use_dialer(0.1)
+        started = time.monotonic()
+        result = lf.place_call(message='m', **CALL)
+        self.assertTrue(result['success'])
+        self.assertEqual(len(dialer.calls), 2)
+        self.assertGreaterEqual(time.monotonic() - started, 0.09)
+
+    def test_gives_up_as_not_sent(self):
+        dialer = self.use_dialer(*[0.01] * 10)
+        with mock.patch.object(lf, 'CALL_THROTTLE_RETRIES', 2):
+            result = lf.place_call(message='m', **CALL)
+        self.assertFalse(result['success'])
+        self.assertTrue(result['not_sent'])
+        self.assertEqual(len(dialer.calls), 3)
+
+    def test_twilio_429_carries_retry_after(self):
+        class Throttled(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers['Content-Length']))
+                body = b'{"code": 20429, "message": "Too Many Requests"}'
+                self.send_response(429)
+                self.send_header('Retry-After', '7')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Throttled)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        env = {'TWILIO_ACCOUNT_SID': 'AC1', 'TWILIO_AUTH_TOKEN': 'token', 'TWILIO_FROM_NUMBER': '+15550000000'}
+        try:
+            with mock.patch.dict(os.environ, env), \
+                    mock.patch.object(lf, 'TWILIO_API_BASE', f'http://127.0.0.1:{server.server_address[1]}'):
+                lf.twilio_client_config.cache_clear()
+                result = lf.make_twilio_call(CALL['to_number'], 'm', CALL['contact_name'], CALL['contact_type'])
+        finally:
+            lf.twilio_client_config.cache_clear()
+            lf.close_http_connections()
+            server.shutdown()
+        self.assertFalse(result['success'])
+        self.assertEqual(result['retry_after'], 7.0)
+
+
+class CallLedgerTest(DialerTestCase):
+
+    def test_same_alert_and_number_dialled_once(self):
+        dialer = self.use_dialer()
+        first = lf.place_call(message='m', idempotency_key='web-01@t1', **CALL)
+        second = lf.place_call(message='m', idempotency_key='web-01@t1', **CALL)
+        self.assertTrue(first['success'])
+        self.assertTrue(second['duplicate'])
+        self.assertEqual(second['call_sid'], first['call_sid'])
+        self.assertEqual(len(dialer.calls), 1)
+
+    def test_different_alerts_with_the_same_message_both_dialled(self):
+        # Two alarms inside the same minute render the same voice message
+        dialer = self.use_dialer()
+        lf.place_call(message='m', idempotency_key='web-01@08:00:05', **CALL)
+        result = lf.place_call(message='m', idempotency_key='web-01@08:00:40', **CALL)
+        self.assertNotIn('duplicate', result)
+        self.assertEqual(len(dialer.calls), 2)
+
+    def test_failed_call_can_be_retried(self):
+        dialer = self.use_dialer('error')
+        self.assertFalse(lf.place_call(message='m', idempotency_key='web-01@t1', **CALL)['success'])
+        result = lf.place_call(message='m', idempotency_key='web-01@t1', **CALL)
+        self.assertTrue(result['success'])
+        self.assertNotIn('duplicate', result)
+        self.assertEqual(len(dialer.calls), 2)
+
+    def test_dispatch_keys_calls_on_the_alert(self):
+        dialer = self.use_dialer()
+        alert = {'alert_id': 'web-01@t1', 'server_name': 'web-01', 'team': 'ops'}
+        for mode in ('serial', 'concurrent'):
+            with self.subTest(mode=mode), mock.patch.object(lf, 'CALL_DISPATCH_MODE', mode):
+                lf.clear_call_ledger()
+                dialer.calls.clear()
+                first = lf.dispatch_calls([dict(CALL)], 'm', alert=alert)
+                repeat = lf.dispatch_calls([dict(CALL)], 'm', alert=alert)
+                self.assertTrue(first[0]['success'])
+                self.assertTrue(repeat[0]['duplicate'])
+                self.assertEqual(len(dialer.calls), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()